@@ -0,0 +1,96 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure loading a bulk income statement CSV file, compared to the number of
+requests a per-symbol refresh of the same statements would make.
+
+Usage:
+
+    uv run benchmarks/bench_bulk.py --symbols 100000 --years 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import sqlite3
+import tempfile
+import time
+
+import numpy
+import polars
+
+import stockdice.bulk
+import stockdice.db
+
+
+def write_income_csv(path, *, symbols: int, years: int, seed: int = 0):
+    """Write a file with every income column, like FMP's bulk files."""
+    rng = numpy.random.default_rng(seed)
+    db = sqlite3.connect(":memory:")
+    stockdice.db.create_income(db, reset=False)
+    column_types = stockdice.db.table_column_types(db, "income")
+    db.close()
+
+    rows = symbols * years
+    columns = {
+        "symbol": numpy.repeat([f"S{i:06d}" for i in range(symbols)], years),
+        "fiscalYear": numpy.tile(numpy.arange(2025 - years, 2025), symbols),
+        "period": numpy.full(rows, "FY"),
+    }
+    columns["date"] = [f"{year}-12-31" for year in columns["fiscalYear"]]
+    for name, column_type in column_types.items():
+        if name in columns or name == "last_updated_us":
+            continue
+        if column_type == "INTEGER":
+            columns[name] = rng.lognormal(17, 2, rows).astype(numpy.int64)
+        elif column_type == "REAL":
+            columns[name] = rng.normal(2, 1, rows).round(2)
+        else:
+            columns[name] = numpy.full(rows, "2025-02-28 16:30:00")
+    polars.DataFrame(columns).write_csv(path)
+
+
+def main(*, symbols: int, years: int, chunk_rows: int):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_path = pathlib.Path(tmpdir) / "income.csv"
+        write_income_csv(csv_path, symbols=symbols, years=years)
+        megabytes = csv_path.stat().st_size / 1e6
+
+        db = sqlite3.connect(pathlib.Path(tmpdir) / "stockdice.sqlite")
+        stockdice.db.migrate(db)
+
+        for name in ("empty table", "upsert existing"):
+            start = time.perf_counter()
+            rows = stockdice.bulk.ingest_csv(
+                db, "income", csv_path, now_us=0, chunk_rows=chunk_rows
+            )
+            seconds = time.perf_counter() - start
+            print(
+                f"{name:>16}: {seconds:6.2f} s, {rows / seconds:9.0f} rows/s, "
+                f"{megabytes / seconds:6.1f} MB/s"
+            )
+        db.close()
+
+    print(f"{'file size':>16}: {megabytes:6.1f} MB, {rows} rows")
+    print(f"{'requests':>16}: {years} bulk vs {symbols} per-symbol")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=100_000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--chunk-rows", type=int, default=stockdice.bulk.CHUNK_ROWS)
+    args = parser.parse_args()
+    main(symbols=args.symbols, years=args.years, chunk_rows=args.chunk_rows)
@@ -0,0 +1,111 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure time to the first roll in a freshly started web process.
+
+Without warm-up, the first request pays for loading the snapshot. With
+warm-up, the platform waits for /readyz, so users only see the roll itself.
+
+Usage:
+
+    uv run benchmarks/bench_cold_start.py --companies 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+import synthetic_db
+
+
+REPO_ROOT = pathlib.Path(__file__).parent.parent
+SERVER = """
+import json
+import pathlib
+import sys
+import time
+
+start = time.perf_counter()
+
+import stockdice.config
+
+stockdice.config.DB_REPLICA_PATH = pathlib.Path(sys.argv[1])
+stockdice.config.SNAPSHOT_CACHE_DIR = pathlib.Path(sys.argv[2])
+warm_up = sys.argv[3] == "1"
+
+import stockdice
+
+app = stockdice.create_app({"WARM_UP": warm_up})
+client = app.test_client()
+while client.get("/readyz").status_code != 200:
+    time.sleep(0.005)
+ready = time.perf_counter()
+
+response = client.get("/en/roll-market-cap/")
+assert response.status_code == 200, response.status_code
+done = time.perf_counter()
+print(json.dumps({"ready": ready - start, "first_roll": done - ready, "total": done - start}))
+"""
+
+
+def _cold_start(replica: pathlib.Path, cache_dir: pathlib.Path, *, warm_up: bool):
+    result = subprocess.run(
+        [sys.executable, "-c", SERVER, str(replica), str(cache_dir), str(int(warm_up))],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def _report(name: str, timings: dict):
+    print(
+        f"{name:>32}: ready {timings['ready'] * 1000:8.1f} ms, "
+        f"first roll {timings['first_roll'] * 1000:8.1f} ms, "
+        f"total {timings['total'] * 1000:8.1f} ms"
+    )
+
+
+def main(*, companies: int):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        replica = synthetic_db.create_synthetic_db(
+            tmpdir / "stockdice.sqlite", companies=companies
+        )
+
+        _report(
+            "no warm-up",
+            _cold_start(replica, tmpdir / "cache-1", warm_up=False),
+        )
+        _report(
+            "warm-up, empty disk cache",
+            _cold_start(replica, tmpdir / "cache-2", warm_up=True),
+        )
+        _report(
+            "warm-up, disk cache",
+            _cold_start(replica, tmpdir / "cache-2", warm_up=True),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=20_000)
+    args = parser.parse_args()
+    main(companies=args.companies)
@@ -0,0 +1,91 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure how long it takes to import stockdice and start the CLIs.
+
+Each measurement runs in a fresh interpreter with `python -X importtime`, so
+that nothing is already imported.
+
+Usage:
+
+    uv run benchmarks/bench_importtime.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+
+
+REPO_ROOT = pathlib.Path(__file__).parent.parent
+MODULES = ("stockdice", "stockdice.config", "stockdice.dice")
+CLI_ENTRY_POINTS = (
+    "cli/roll_stockdice.py",
+    "cli/simulate.py",
+    "cli/refresh_db.py",
+    "cli/initialize_db.py",
+)
+
+
+def _import_time_us(module: str) -> int:
+    """Cumulative import time of module, as reported by -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in reversed(result.stderr.splitlines()):
+        _, self_us, cumulative_us, name = (
+            [""] + [part.strip() for part in line.split("|")]
+        )[-4:]
+        if name == module:
+            return int(cumulative_us)
+    raise ValueError(f"No import time reported for {module}.")
+
+
+def _startup_time_s(entry_point: str) -> float:
+    """Wall time to print --help, which imports everything but does no work."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, entry_point, "--help"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def main(*, repeat: int):
+    for module in MODULES:
+        timings = [_import_time_us(module) / 1000 for _ in range(repeat)]
+        print(f"{'import ' + module:>32}: median {statistics.median(timings):8.1f} ms")
+
+    for entry_point in CLI_ENTRY_POINTS:
+        timings = [_startup_time_s(entry_point) * 1000 for _ in range(repeat)]
+        print(
+            f"{entry_point + ' --help':>32}: median {statistics.median(timings):8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(repeat=args.repeat)
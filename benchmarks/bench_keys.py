@@ -0,0 +1,167 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Refresh company profiles from a mock FMP server with several API keys.
+
+The mock server limits each key separately and responds with 429 when a key
+goes over its limit, so throughput should grow linearly with the number of
+keys.
+
+Usage:
+
+    uv run benchmarks/bench_keys.py --symbols 400 --keys 1 2 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import pathlib
+import sqlite3
+import tempfile
+import time
+
+import httpx
+
+import stockdice.company_profile
+import stockdice.config
+import stockdice.db
+import stockdice.ratelimits
+
+
+def _mock_transport(
+    *, latency_seconds: float, requests_per_minute: float, stats: collections.Counter
+) -> httpx.MockTransport:
+    # Responses include every field, even if empty.
+    with sqlite3.connect(":memory:") as db:
+        stockdice.db.create_all_tables(db, reset=False)
+        empty = dict.fromkeys(stockdice.db.table_column_types(db, "company_profile"))
+    del empty["last_updated_us"]
+    # Allow a little jitter, like a real server would.
+    min_seconds = 0.75 * 60.0 / requests_per_minute
+    last_request = {}
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        key = request.url.params["apikey"]
+        now = time.monotonic()
+        if now - last_request.get(key, -1e9) < min_seconds:
+            stats["429"] += 1
+            return httpx.Response(429)
+        last_request[key] = now
+        stats["200"] += 1
+
+        await asyncio.sleep(latency_seconds)
+        symbol = request.url.params["symbol"]
+        profile = {
+            **empty,
+            "symbol": symbol,
+            "price": 100.0,
+            "marketCap": 1_000_000_000,
+            "companyName": f"Company {symbol}",
+            "currency": "USD",
+            "isEtf": False,
+            "isFund": False,
+        }
+        return httpx.Response(200, content=json.dumps([profile]).encode())
+
+    return httpx.MockTransport(handle)
+
+
+def _bench(
+    *, keys: int, symbols: int, requests_per_minute: float, latency_seconds: float
+) -> tuple[float, collections.Counter]:
+    stats = collections.Counter()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stockdice.config._config = stockdice.config.Config(
+            {
+                "FMP_API_KEY": ",".join(f"key-{i}" for i in range(keys)),
+                "requests_per_minute": requests_per_minute,
+            }
+        )
+        stockdice.config.config.db_path = pathlib.Path(tmpdir) / "stockdice.sqlite"
+        stockdice.ratelimits.use_key_pool(None)
+
+        db = stockdice.config.config.db
+        stockdice.db.migrate(db)
+        db.executemany(
+            """
+            INSERT INTO symbol (symbol, company_name, trading_currency)
+            VALUES (?, ?, 'USD');
+            """,
+            [(f"S{i:06d}", f"Company {i}") for i in range(symbols)],
+        )
+        db.commit()
+
+        async def download():
+            async with httpx.AsyncClient(
+                transport=_mock_transport(
+                    latency_seconds=latency_seconds,
+                    requests_per_minute=requests_per_minute,
+                    stats=stats,
+                )
+            ) as client:
+                await stockdice.company_profile.download_all(
+                    max_age=datetime.timedelta(days=1), client=client
+                )
+
+        start = time.perf_counter()
+        asyncio.run(download())
+        seconds = time.perf_counter() - start
+
+        rows = db.execute("SELECT COUNT(*) FROM company_profile;").fetchone()[0]
+        assert rows == symbols, rows
+        db.close()
+    return seconds, stats
+
+
+def main(
+    *,
+    symbols: int,
+    keys: list[int],
+    requests_per_minute: float,
+    latency_seconds: float,
+):
+    print(
+        f"{symbols} symbols, {latency_seconds * 1000:.0f} ms latency, "
+        f"{requests_per_minute / 60:.0f} requests/s per key"
+    )
+    for count in keys:
+        seconds, stats = _bench(
+            keys=count,
+            symbols=symbols,
+            requests_per_minute=requests_per_minute,
+            latency_seconds=latency_seconds,
+        )
+        print(
+            f"{count:>3} keys: {seconds:6.2f} s, "
+            f"{symbols / seconds:6.1f} requests/s, {stats['429']} rate limited"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=400)
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests-per-minute", type=float, default=1_200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+    main(
+        symbols=args.symbols,
+        keys=args.keys,
+        requests_per_minute=args.requests_per_minute,
+        latency_seconds=args.latency_ms / 1000,
+    )
@@ -0,0 +1,101 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare reading the serving tables with the cursor and Arrow readers and
+loading the snapshot from the on-disk cache.
+
+Usage:
+
+    uv run benchmarks/bench_loader.py --companies 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import stockdice.db
+import stockdice.dice
+
+import synthetic_db
+
+
+def _time(fn, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _report(name: str, timings: list[float]):
+    print(
+        f"{name:>24}: median {statistics.median(timings) * 1000:8.1f} ms, "
+        f"min {min(timings) * 1000:8.1f} ms"
+    )
+
+
+def main(*, companies: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / "stockdice.sqlite"
+        synthetic_db.create_synthetic_db(path, companies=companies)
+
+        _report(
+            "cursor (untyped tables)",
+            _time(lambda: stockdice.dice._load_dfs(path, arrow=False), repeat),
+        )
+
+        with sqlite3.connect(path) as db:
+            stockdice.db.convert_all_to_strict(db)
+
+        _report(
+            "cursor (STRICT tables)",
+            _time(lambda: stockdice.dice._load_dfs(path, arrow=False), repeat),
+        )
+        _report(
+            "arrow (STRICT tables)",
+            _time(lambda: stockdice.dice._load_dfs(path, arrow=True), repeat),
+        )
+
+        cache_dir = pathlib.Path(tmpdir) / "snapshot_cache"
+        _report(
+            "snapshot (SQL)",
+            _time(
+                lambda: stockdice.dice.load_snapshot(
+                    path, cache_dir=cache_dir / str(time.perf_counter_ns())
+                ),
+                repeat,
+            ),
+        )
+        stockdice.dice.load_snapshot(path, cache_dir=cache_dir)
+        _report(
+            "snapshot (disk cache)",
+            _time(
+                lambda: stockdice.dice.load_snapshot(path, cache_dir=cache_dir),
+                repeat,
+            ),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(companies=args.companies, repeat=args.repeat)
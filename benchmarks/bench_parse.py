@@ -0,0 +1,181 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare parsing and writing statements in the downloader process with a
+pool of parser processes and a single writer process.
+
+Parsing scales with the number of parser processes, but there's only one
+writer, so the pool can go no faster than the writer. To show how
+throughput scales on machines with more cores than this one, also time each
+stage on its own and project throughput for each number of processes.
+
+Usage:
+
+    uv run benchmarks/bench_parse.py --symbols 5000 --processes 1 2 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import pathlib
+import random
+import sqlite3
+import tempfile
+import time
+
+import stockdice.db
+import stockdice.income
+import stockdice.pipeline
+
+
+def _responses(db, *, symbols: int, years: int, seed: int = 0) -> list[bytes]:
+    rng = random.Random(seed)
+    columns = stockdice.db.table_column_types(db, "income")
+    del columns["last_updated_us"]
+    responses = []
+    for i in range(symbols):
+        statements = []
+        for year in range(2025 - years, 2025):
+            # The API sends numbers as JSON numbers, but strings and empty
+            # values need coercing.
+            statement = {
+                column: rng.lognormvariate(18, 2) if kind != "TEXT" else ""
+                for column, kind in columns.items()
+            }
+            statement.update(
+                symbol=f"S{i:06d}",
+                fiscalYear=str(year),
+                period="FY",
+                date=f"{year}-12-31",
+                reportedCurrency="USD",
+            )
+            statements.append(statement)
+        responses.append(json.dumps(statements).encode())
+    return responses
+
+
+async def _download(sink, responses: list[bytes]):
+    await asyncio.gather(
+        *[
+            sink.parse_and_write(
+                parse=stockdice.income.parse_income,
+                write=stockdice.income.write_income,
+                table="income",
+                content=content,
+                symbol=f"S{i:06d}",
+                now_us=i,
+            )
+            for i, content in enumerate(responses)
+        ]
+    )
+
+
+def _run(path: pathlib.Path, responses: list[bytes], processes: int) -> float:
+    path.unlink(missing_ok=True)
+    db = sqlite3.connect(path)
+    stockdice.db.create_all_tables(db, reset=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.commit()
+
+    if processes == 0:
+        sink = contextlib.nullcontext(stockdice.pipeline.InProcessSink(db))
+    else:
+        sink = stockdice.pipeline.ProcessPoolSink(db, path, processes=processes)
+
+    start = time.perf_counter()
+    with sink as sink:
+        asyncio.run(_download(sink, responses))
+    seconds = time.perf_counter() - start
+
+    rows = db.execute("SELECT COUNT(*) FROM income;").fetchone()[0]
+    db.close()
+    assert rows == len(responses) * len(json.loads(responses[0]))
+    return seconds
+
+
+def _stage_seconds(path: pathlib.Path, responses: list[bytes]) -> tuple[float, float]:
+    """Time parsing all responses and writing all rows, separately."""
+    path.unlink(missing_ok=True)
+    db = sqlite3.connect(path)
+    stockdice.db.create_all_tables(db, reset=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.commit()
+    column_types = stockdice.db.table_column_types(db, "income")
+
+    start = time.perf_counter()
+    parsed = [
+        stockdice.income.parse_income(content, column_types=column_types)
+        for content in responses
+    ]
+    parse_seconds = time.perf_counter() - start
+
+    # Commit in batches, like the writer process.
+    start = time.perf_counter()
+    for i, rows in enumerate(parsed):
+        stockdice.income.write_income(db, rows, symbol=f"S{i:06d}", now_us=i)
+        if (i + 1) % stockdice.pipeline.WRITER_BATCH_SIZE == 0:
+            db.commit()
+    db.commit()
+    write_seconds = time.perf_counter() - start
+    db.close()
+    return parse_seconds, write_seconds
+
+
+def main(*, symbols: int, years: int, processes: list[int]):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / "stockdice.sqlite"
+        with sqlite3.connect(":memory:") as db:
+            stockdice.db.create_all_tables(db, reset=False)
+            responses = _responses(db, symbols=symbols, years=years)
+        megabytes = sum(len(content) for content in responses) / 1e6
+        print(f"{len(responses)} responses, {megabytes:.1f} MB of JSON")
+
+        print(f"Measured with {os.cpu_count()} CPUs:")
+        for count in [0, *processes]:
+            seconds = _run(path, responses, count)
+            name = "in process" if count == 0 else f"{count} parser processes"
+            print(
+                f"{name:>20}: {seconds:6.2f} s, "
+                f"{len(responses) / seconds:8.0f} responses/s"
+            )
+
+        parse_seconds, write_seconds = _stage_seconds(path, responses)
+        parse_rate = len(responses) / parse_seconds
+        write_rate = len(responses) / write_seconds
+        print(
+            f"Stages: parse {parse_rate:.0f} responses/s per process, "
+            f"write {write_rate:.0f} responses/s"
+        )
+        # Assumes a core per parser process plus one for the writer, and
+        # ignores the cost of sending rows between processes.
+        print("Projected with enough cores:")
+        print(
+            f"{'in process':>20}: {1 / (1 / parse_rate + 1 / write_rate):8.0f} responses/s"
+        )
+        for count in processes:
+            name = f"{count} parser processes"
+            print(f"{name:>20}: {min(count * parse_rate, write_rate):8.0f} responses/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=5_000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    main(symbols=args.symbols, years=args.years, processes=args.processes)
@@ -0,0 +1,82 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare single-roll latency with on-demand sampling and the roll pool.
+
+Usage:
+
+    uv run benchmarks/bench_roll.py --companies 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import numpy
+
+import stockdice.dice
+import stockdice.rollpool
+
+import synthetic_db
+
+
+def _latencies(fn, repeat: int) -> numpy.ndarray:
+    timings = numpy.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+    return timings
+
+
+def _report(name: str, timings: numpy.ndarray):
+    p50, p99 = numpy.percentile(timings, [50, 99]) * 1_000_000
+    print(f"{name:>32}: p50 {p50:8.1f} us, p99 {p99:8.1f} us")
+
+
+def main(*, companies: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / "stockdice.sqlite"
+        synthetic_db.create_synthetic_db(path, companies=companies)
+
+        # Load the snapshot once so that only sampling is measured.
+        stockdice.dice.current_snapshot(path)
+
+        for weights in (None, "marketCapUSD"):
+            rng = numpy.random.default_rng()
+
+            def on_demand():
+                snapshot = stockdice.dice.current_snapshot(path)
+                idx = stockdice.dice.sample_indices(snapshot, weights, 1, rng)
+                return snapshot.universe.row(int(idx[0]), named=True)
+
+            def pooled():
+                return stockdice.rollpool.roll_one(weights, replica_db_path=path)
+
+            # Warm up the pool.
+            pooled()
+
+            _report(f"on demand ({weights})", _latencies(on_demand, repeat))
+            _report(f"pool ({weights})", _latencies(pooled, repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=20_000)
+    args = parser.parse_args()
+    main(companies=args.companies, repeat=args.repeat)
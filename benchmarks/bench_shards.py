@@ -0,0 +1,194 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Refresh company profiles from a mock FMP server with several shards.
+
+Each shard is a separate process that owns a hash partition of the symbols,
+writes to its own database and draws from a shared request budget. Requests
+within a process are sent one at a time, so with server latency, throughput
+grows with the number of shards until it reaches the budget.
+
+Usage:
+
+    uv run benchmarks/bench_shards.py --symbols 300 --shards 1 2 4 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import pathlib
+import sqlite3
+import tempfile
+import time
+
+import httpx
+
+import stockdice.company_profile
+import stockdice.config
+import stockdice.db
+import stockdice.ratelimits
+import stockdice.shards
+
+
+def _symbols(count: int) -> list[str]:
+    return [f"S{i:06d}" for i in range(count)]
+
+
+def _mock_transport(latency_seconds: float) -> httpx.MockTransport:
+    # Responses include every field, even if empty.
+    with sqlite3.connect(":memory:") as db:
+        stockdice.db.create_all_tables(db, reset=False)
+        empty = dict.fromkeys(stockdice.db.table_column_types(db, "company_profile"))
+    del empty["last_updated_us"]
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency_seconds)
+        symbol = request.url.params["symbol"]
+        profile = {
+            **empty,
+            "symbol": symbol,
+            "price": 100.0,
+            "marketCap": 1_000_000_000,
+            "companyName": f"Company {symbol}",
+            "currency": "USD",
+            "isEtf": False,
+            "isFund": False,
+        }
+        return httpx.Response(200, content=json.dumps([profile]).encode())
+
+    return httpx.MockTransport(handle)
+
+
+def _run_shard(
+    directory: str,
+    shard: stockdice.shards.Shard,
+    symbols: int,
+    requests_per_minute: float,
+    latency_seconds: float,
+) -> pathlib.Path:
+    directory = pathlib.Path(directory)
+    stockdice.config._config = stockdice.config.Config(
+        {"FMP_API_KEY": "benchmark", "requests_per_minute": requests_per_minute}
+    )
+    path = directory / f"shard-{shard.index}-of-{shard.count}.sqlite"
+    stockdice.config.config.db_path = path
+
+    db = stockdice.config.config.db
+    stockdice.db.migrate(db)
+    db.executemany(
+        """
+        INSERT INTO symbol (symbol, company_name, trading_currency)
+        VALUES (?, ?, 'USD');
+        """,
+        [(symbol, symbol) for symbol in _symbols(symbols)],
+    )
+    db.commit()
+
+    stockdice.ratelimits.use_shared_budget(directory / "rate_budget.sqlite")
+
+    async def download():
+        async with httpx.AsyncClient(
+            transport=_mock_transport(latency_seconds)
+        ) as client:
+            await stockdice.company_profile.download_all(
+                max_age=datetime.timedelta(days=1), client=client, shard=shard
+            )
+
+    asyncio.run(download())
+    db.close()
+    return path
+
+
+def _bench(
+    *, count: int, symbols: int, requests_per_minute: float, latency_seconds: float
+):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=count, mp_context=context
+        ) as pool:
+            # Start the processes before timing.
+            list(pool.map(time.sleep, [0.0] * count))
+            start = time.perf_counter()
+            paths = list(
+                pool.map(
+                    _run_shard,
+                    *zip(
+                        *[
+                            (
+                                tmpdir,
+                                stockdice.shards.Shard(index, count),
+                                symbols,
+                                requests_per_minute,
+                                latency_seconds,
+                            )
+                            for index in range(count)
+                        ]
+                    ),
+                )
+            )
+            seconds = time.perf_counter() - start
+
+        main_path = pathlib.Path(tmpdir) / "main.sqlite"
+        with sqlite3.connect(main_path) as db:
+            stockdice.db.create_all_tables(db, reset=False)
+        for path in paths:
+            stockdice.shards.merge(main_path, path)
+        with sqlite3.connect(main_path) as db:
+            rows = db.execute("SELECT COUNT(*) FROM company_profile;").fetchone()[0]
+        assert rows == symbols, rows
+    return seconds
+
+
+def main(
+    *,
+    symbols: int,
+    shards: list[int],
+    requests_per_minute: float,
+    latency_seconds: float,
+):
+    print(
+        f"{symbols} symbols, {latency_seconds * 1000:.0f} ms latency, "
+        f"budget {requests_per_minute / 60:.0f} requests/s"
+    )
+    for count in shards:
+        seconds = _bench(
+            count=count,
+            symbols=symbols,
+            requests_per_minute=requests_per_minute,
+            latency_seconds=latency_seconds,
+        )
+        print(
+            f"{count:>3} shards: {seconds:6.2f} s, {symbols / seconds:6.1f} requests/s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests-per-minute", type=float, default=6_000)
+    parser.add_argument("--latency-ms", type=float, default=25)
+    args = parser.parse_args()
+    main(
+        symbols=args.symbols,
+        shards=args.shards,
+        requests_per_minute=args.requests_per_minute,
+        latency_seconds=args.latency_ms / 1000,
+    )
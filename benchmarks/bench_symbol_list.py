@@ -0,0 +1,138 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare the WAL bytes written by rewriting the whole symbol list with
+writing only the symbols that changed.
+
+Usage:
+
+    uv run benchmarks/bench_symbol_list.py --symbols 80000 --churn 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import random
+import sqlite3
+import tempfile
+import time
+
+import stockdice.db
+import stockdice.stocklist
+
+
+def _symbol_list(symbols: int) -> list[dict]:
+    return [
+        {
+            "symbol": f"S{i:06d}",
+            "companyName": f"Company {i}",
+            "tradingCurrency": "USD",
+            "reportingCurrency": "USD",
+        }
+        for i in range(symbols)
+    ]
+
+
+def _churn(symbol_list: list[dict], churn: int, rng: random.Random) -> list[dict]:
+    """Delist, list, and rename churn symbols each."""
+    symbol_list = [dict(item) for item in symbol_list]
+    for item in rng.sample(symbol_list, churn):
+        item["companyName"] += " Inc."
+    for item in rng.sample(symbol_list, churn):
+        symbol_list.remove(item)
+    start = len(symbol_list) * 10
+    symbol_list.extend(_symbol_list(start + churn)[start:])
+    return symbol_list
+
+
+def _rewrite_all(db, symbols: list[dict], *, now_us: int):
+    """How stockdice.stocklist.download_symbol_list used to write the list."""
+    db.executemany(
+        f"""INSERT INTO symbol
+        (symbol, company_name, trading_currency, reporting_currency, last_updated_us)
+        VALUES (:symbol, :companyName, :tradingCurrency, :reportingCurrency, {now_us})
+        ON CONFLICT(symbol) DO UPDATE
+        SET company_name=excluded.company_name,
+        trading_currency = excluded.trading_currency,
+        reporting_currency = excluded.reporting_currency,
+        last_updated_us = excluded.last_updated_us;
+        """,
+        symbols,
+    )
+    db.execute(f"DELETE FROM symbol WHERE last_updated_us <> {now_us};")
+    db.commit()
+
+
+def _wal_bytes(db, path: pathlib.Path, write) -> tuple[int, float]:
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    start = time.perf_counter()
+    write()
+    elapsed = time.perf_counter() - start
+    return pathlib.Path(f"{path}-wal").stat().st_size, elapsed
+
+
+def main(*, symbols: int, churn: int, passes: int, seed: int):
+    rng = random.Random(seed)
+    lists = [_symbol_list(symbols)]
+    for _ in range(passes):
+        lists.append(_churn(lists[-1], churn, rng))
+
+    writers = {
+        "rewrite all": lambda db, symbols, now_us: _rewrite_all(
+            db, symbols, now_us=now_us
+        ),
+        "diff": lambda db, symbols, now_us: stockdice.stocklist.update_symbol_list(
+            db, symbols, now_us=now_us
+        ),
+    }
+    for name, write in writers.items():
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pathlib.Path(tmpdir) / "stockdice.sqlite"
+            db = sqlite3.connect(path)
+            db.execute("PRAGMA journal_mode = WAL;")
+            # Don't checkpoint mid-pass, so the WAL holds the whole pass.
+            db.execute("PRAGMA wal_autocheckpoint = 0;")
+            stockdice.db.create_all_tables(db, reset=False)
+            write(db, lists[0], 0)
+
+            wal_bytes = []
+            seconds = []
+            for now_us, symbol_list in enumerate(lists[1:], start=1):
+                size, elapsed = _wal_bytes(
+                    db, path, lambda: write(db, symbol_list, now_us)
+                )
+                wal_bytes.append(size)
+                seconds.append(elapsed)
+            db.close()
+
+        print(
+            f"{name:>12}: {sum(wal_bytes) / len(wal_bytes) / 1e6:8.2f} MB WAL "
+            f"per pass, {sum(seconds) / len(seconds) * 1000:8.1f} ms per pass"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=80_000)
+    parser.add_argument(
+        "--churn",
+        type=int,
+        default=50,
+        help="Symbols listed, delisted, and renamed per pass, each.",
+    )
+    parser.add_argument("--passes", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(symbols=args.symbols, churn=args.churn, passes=args.passes, seed=args.seed)
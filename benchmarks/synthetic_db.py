@@ -0,0 +1,171 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Create a database with fake data that looks like a full refresh."""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import random
+import sqlite3
+
+import stockdice.db
+
+
+CURRENCIES = {
+    "USD": 1.0,
+    "EUR": 1.08,
+    "GBP": 1.27,
+    "JPY": 0.0067,
+    "CAD": 0.73,
+    "CNY": 0.14,
+}
+SECTORS = (
+    "Technology",
+    "Healthcare",
+    "Financial Services",
+    "Consumer Cyclical",
+    "Industrials",
+    "Energy",
+    "Utilities",
+    "Real Estate",
+    "Basic Materials",
+    "Communication Services",
+    "Consumer Defensive",
+)
+
+
+def create_synthetic_db(
+    path, *, companies: int = 20_000, years: int = 10, seed: int = 0
+) -> pathlib.Path:
+    path = pathlib.Path(path)
+    path.unlink(missing_ok=True)
+    rng = random.Random(seed)
+
+    db = sqlite3.connect(path)
+    stockdice.db.create_all_tables(db, reset=False)
+
+    db.executemany(
+        """
+        INSERT OR REPLACE INTO forex
+        (symbol, from_currency, to_currency, from_name, to_name, price)
+        VALUES (:symbol, :currency, 'USD', :currency, 'U.S. Dollar', :price);
+        """,
+        [
+            {"symbol": f"{currency}USD", "currency": currency, "price": price}
+            for currency, price in CURRENCIES.items()
+        ],
+    )
+
+    profiles = []
+    symbols = []
+    statements = []
+    for i in range(companies):
+        symbol = f"S{i:06d}"
+        currency = rng.choice(tuple(CURRENCIES))
+        is_etf = rng.random() < 0.1
+        symbols.append(
+            {
+                "symbol": symbol,
+                "companyName": f"Company {i}",
+                "tradingCurrency": currency,
+            }
+        )
+        profiles.append(
+            {
+                "symbol": symbol,
+                "price": rng.uniform(1, 500),
+                # Market caps are roughly log-normal.
+                "marketCap": int(rng.lognormvariate(20, 2)),
+                "companyName": f"Company {i}",
+                "currency": currency,
+                "sector": rng.choice(SECTORS),
+                "description": "A company that does things. " * 20,
+                "isEtf": is_etf,
+                "isFund": False,
+            }
+        )
+        for year in range(2025 - years, 2025):
+            statements.append(
+                {
+                    "symbol": symbol,
+                    "fiscalYear": year,
+                    "date": f"{year}-12-31",
+                    "filingDate": f"{year + 1}-02-28",
+                    "reportedCurrency": currency,
+                    "revenue": int(rng.lognormvariate(19, 2)),
+                    "netIncome": int(rng.lognormvariate(17, 2)),
+                    "totalAssets": int(rng.lognormvariate(20, 2)),
+                    "totalLiabilities": int(rng.lognormvariate(19, 2)),
+                }
+            )
+
+    db.executemany(
+        """
+        INSERT INTO symbol (symbol, company_name, trading_currency, reporting_currency)
+        VALUES (:symbol, :companyName, :tradingCurrency, :tradingCurrency);
+        """,
+        symbols,
+    )
+    db.executemany(
+        """
+        INSERT INTO company_profile (
+            symbol, price, marketCap, companyName, currency, sector, description,
+            isEtf, isFund
+        ) VALUES (
+            :symbol, :price, :marketCap, :companyName, :currency, :sector,
+            :description, :isEtf, :isFund
+        );
+        """,
+        profiles,
+    )
+    db.executemany(
+        """
+        INSERT INTO income (
+            symbol, fiscalYear, period, date, filingDate, reportedCurrency,
+            revenue, netIncome
+        ) VALUES (
+            :symbol, :fiscalYear, 'FY', :date, :filingDate, :reportedCurrency,
+            :revenue, :netIncome
+        );
+        """,
+        statements,
+    )
+    db.executemany(
+        """
+        INSERT INTO balance_sheet (
+            symbol, fiscalYear, period, date, filingDate, reportedCurrency,
+            totalAssets, totalLiabilities
+        ) VALUES (
+            :symbol, :fiscalYear, 'FY', :date, :filingDate, :reportedCurrency,
+            :totalAssets, :totalLiabilities
+        );
+        """,
+        statements,
+    )
+    db.commit()
+    db.execute("ANALYZE;")
+    db.commit()
+    db.close()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--companies", type=int, default=20_000)
+    parser.add_argument("--years", type=int, default=10)
+    args = parser.parse_args()
+    create_synthetic_db(args.path, companies=args.companies, years=args.years)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Load profiles or statements for all symbols from FMP's bulk CSV files.
+
+This takes a handful of requests, instead of a few per symbol like
+cli/refresh_db.py, so it's the fastest way to rebuild the database.
+"""
+
+import argparse
+import asyncio
+import datetime
+import logging
+import sys
+
+import httpx
+
+import stockdice.bulk
+import stockdice.config
+import stockdice.db
+import stockdice.timeutils
+
+
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+root.addHandler(handler)
+
+
+async def main(
+    *,
+    dataset: str,
+    files: list[str],
+    years: list[int],
+    directory,
+    chunk_rows: int,
+):
+    db = stockdice.config.config.db
+    stockdice.db.migrate(db)
+    table, _ = stockdice.bulk.DATASETS[dataset]
+
+    if not files:
+        # Bulk files need a long timeout, since they're tens of MB.
+        async with httpx.AsyncClient(timeout=httpx.Timeout(60.0)) as client:
+            files = await stockdice.bulk.download_files(
+                dataset, client=client, directory=directory, years=years
+            )
+
+    for path in files:
+        rows = stockdice.bulk.ingest_csv(
+            db,
+            table,
+            path,
+            now_us=stockdice.timeutils.now_in_microseconds(),
+            chunk_rows=chunk_rows,
+        )
+        logging.info(f"Loaded {rows} rows from {path} into {table}.")
+
+
+if __name__ == "__main__":
+    this_year = datetime.date.today().year
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dataset", choices=tuple(stockdice.bulk.DATASETS))
+    parser.add_argument(
+        "--file",
+        dest="files",
+        action="append",
+        default=[],
+        help="Load this CSV file instead of downloading. May be repeated.",
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+        default=list(range(this_year - 5, this_year)),
+        help="Fiscal years of statements to download.",
+    )
+    parser.add_argument(
+        "--directory",
+        default=stockdice.config.BULK_DIR,
+        help="Where to save downloaded files.",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=stockdice.bulk.CHUNK_ROWS,
+        help="Rows to parse and write in each transaction.",
+    )
+    args = parser.parse_args()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(
+        main(
+            dataset=args.dataset,
+            files=args.files,
+            years=args.years,
+            directory=args.directory,
+            chunk_rows=args.chunk_rows,
+        )
+    )
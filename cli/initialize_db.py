@@ -27,6 +27,18 @@ if __name__ == "__main__":
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        default=False,
+        help=(
+            "Convert tables to STRICT tables with canonical types, which "
+            "allows reading them directly into Arrow."
+        ),
+    )
     args = parser.parse_args()
 
-    stockdice.db.create_all_tables(stockdice.config.config.db, reset=args.reset)
+    db = stockdice.config.config.db
+    stockdice.db.create_all_tables(db, reset=args.reset)
+    if args.strict:
+        stockdice.db.convert_all_to_strict(db)
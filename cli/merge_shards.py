@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Merge the databases written by refresher shards into the main database."""
+
+import argparse
+import logging
+import sys
+
+import stockdice.config
+import stockdice.shards
+
+
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+root.addHandler(handler)
+
+
+def main(*, count: int):
+    for index in range(1, count):
+        path = stockdice.shards.db_path(stockdice.shards.Shard(index, count))
+        rows = stockdice.shards.merge(stockdice.config.DB_PATH, path)
+        logging.info(f"Merged {rows} rows from {path}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("count", type=int, help="Total number of shards.")
+    args = parser.parse_args()
+    main(count=args.count)
@@ -18,6 +18,7 @@
 
 import argparse
 import asyncio
+import contextlib
 import datetime
 import logging
 import sys
@@ -26,8 +27,12 @@ import httpx
 
 import stockdice.balance_sheet
 import stockdice.company_profile
+import stockdice.config
+import stockdice.db
 import stockdice.forex
 import stockdice.income
+import stockdice.pipeline
+import stockdice.shards
 import stockdice.stocklist
 import stockdice.timeutils
 
@@ -44,23 +49,85 @@ handler.setFormatter(formatter)
 root.addHandler(handler)
 
 
-async def main(*, max_age: datetime.timedelta = datetime.timedelta(days=1)):
+def _sink(processes: int):
+    db = stockdice.config.config.db
+    if processes <= 1:
+        return contextlib.nullcontext(stockdice.config.config.sink)
+    # Forex and the symbol list are small, so they're still written from
+    # this process. Forex ends its read transaction before each write, so it
+    # doesn't conflict with the writer process. See:
+    # stockdice.db.end_read_transaction.
+    return stockdice.pipeline.ProcessPoolSink(
+        db, stockdice.config.config.db_path, processes=processes
+    )
+
+
+async def main(
+    *,
+    max_age: datetime.timedelta = datetime.timedelta(days=1),
+    processes: int = 1,
+    shard: stockdice.shards.Shard | None = None,
+):
+    stockdice.db.migrate(stockdice.config.config.db)
+
     async with httpx.AsyncClient() as client:
         await stockdice.stocklist.download_symbol_list(client=client)
 
-        await asyncio.gather(
-            stockdice.forex.download_forex(max_age=max_age, client=client),
-            stockdice.company_profile.download_all(max_age=max_age, client=client),
-            stockdice.income.download_all(max_age=max_age, client=client),
-            stockdice.balance_sheet.download_all(max_age=max_age, client=client),
-        )
+        # Only one shard needs the data that isn't per symbol.
+        downloads = []
+        if shard is None or shard.index == 0:
+            downloads.append(
+                stockdice.forex.download_forex(max_age=max_age, client=client)
+            )
+
+        with _sink(processes) as sink:
+            await asyncio.gather(
+                *downloads,
+                stockdice.company_profile.download_all(
+                    max_age=max_age, client=client, sink=sink, shard=shard
+                ),
+                stockdice.income.download_all(
+                    max_age=max_age, client=client, sink=sink, shard=shard
+                ),
+                stockdice.balance_sheet.download_all(
+                    max_age=max_age, client=client, sink=sink, shard=shard
+                ),
+            )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--max-age", default="1d")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help=(
+            "Parse responses in this many worker processes and write them "
+            "from a separate writer process. By default, parse and write in "
+            "this process."
+        ),
+    )
+    parser.add_argument(
+        "--shard",
+        type=stockdice.shards.parse_shard,
+        help=(
+            "Only refresh the symbols in shard INDEX/COUNT, such as 1/4. "
+            "Shards other than 0 write to their own database; merge them "
+            "with cli/merge_shards.py."
+        ),
+    )
+    parser.add_argument(
+        "--rate-budget",
+        default=stockdice.config.RATE_BUDGET_PATH,
+        help="Database with the request budget shared by all shards.",
+    )
     args = parser.parse_args()
+    if args.shard is not None:
+        stockdice.shards.configure(args.shard, rate_budget_path=args.rate_budget)
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     max_age = stockdice.timeutils.parse_timedelta(args.max_age)
-    loop.run_until_complete(main(max_age=max_age))
+    loop.run_until_complete(
+        main(max_age=max_age, processes=args.processes, shard=args.shard)
+    )
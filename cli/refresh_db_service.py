@@ -14,13 +14,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Refreshes the DB constantly and creates backups to GCS every few minutes."""
+"""Refreshes the DB constantly and creates backups to GCS every few minutes.
+
+See stockdice.scheduler for how often each dataset is refreshed.
+"""
 
 from __future__ import annotations
 
 import argparse
 import asyncio
-import datetime
 import logging
 import sqlite3
 import sys
@@ -31,12 +33,10 @@ import httpx
 from google.cloud import storage
 
 import stockdice.config
-import stockdice.balance_sheet
-import stockdice.company_profile
-import stockdice.forex
-import stockdice.income
-import stockdice.stocklist
-import stockdice.trading_hours
+import stockdice.db
+import stockdice.manifest
+import stockdice.scheduler
+import stockdice.shards
 
 
 # TODO: Where should I be configuring logging?
@@ -50,13 +50,7 @@ formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 root.addHandler(handler)
 
-# It can take about 1 hour to refresh, so include a max age about that long so
-# we can save time if the task has to restart.
-MAX_AGE = datetime.timedelta(minutes=60)
-MAX_AGE_OUTSIDE_TRADING_HOURS = datetime.timedelta(days=1)
-
-
-def backup_db():
+def backup_db(*, shard_count: int = 1):
     db = sqlite3.connect(
         stockdice.config.DB_PATH,
         autocommit=False,
@@ -73,9 +67,13 @@ def backup_db():
     bucket_name = stockdice.config.config.bucket
     storage_client = storage.Client()
     bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(backup_path.name)
 
     while True:
+        # Include the latest data from the other refresher shards.
+        if shard_count > 1:
+            rows = stockdice.shards.merge_all(stockdice.config.DB_PATH, shard_count)
+            logging.info(f"Merged {rows} rows from other shards.")
+
         try:
             backup_path.unlink()
         except FileNotFoundError:
@@ -88,71 +86,60 @@ def backup_db():
             {repr(str((backup_path).absolute()))};
             """
         )
-        blob.upload_from_filename(backup_path)
+        # Update the statistics the query planner uses to choose indexes. Do
+        # this on the copy, since ANALYZE needs a write lock and the
+        # refresher is always writing to the live database.
+        stockdice.db.analyze(backup_path)
+        # Upload a content-addressed copy and then point the manifest at it,
+        # so web instances never see a partial upload.
+        manifest = stockdice.manifest.publish(bucket, backup_path)
+        logging.info(f"Published replica version {manifest['version']}.")
         time.sleep(stockdice.config.config.backup_interval_seconds)
 
 
-def backup_db_loop():
+def backup_db_loop(*, shard_count: int = 1):
     """Infinite loop in case backup fails."""
     while True:
         try:
-            backup_db()
+            backup_db(shard_count=shard_count)
         except Exception:
             logging.exception("Got exception in backup_db thread.")
+            # Don't spin if the error persists.
+            time.sleep(stockdice.config.config.backup_interval_seconds)
 
 
-async def download_all(*, client: httpx.AsyncClient):
-    await stockdice.stocklist.download_symbol_list(client=client)
-
-    if stockdice.trading_hours.is_new_york_regular_trading_hours():
-        max_age = MAX_AGE
-    else:
-        max_age = MAX_AGE_OUTSIDE_TRADING_HOURS
-
-    await asyncio.gather(
-        stockdice.forex.download_forex(max_age=max_age, client=client),
-        stockdice.company_profile.download_all(max_age=max_age, client=client),
-        stockdice.income.download_all(max_age=max_age, client=client),
-        stockdice.balance_sheet.download_all(max_age=max_age, client=client),
-    )
-
-
-async def download_market_data(*, client: httpx.AsyncClient):
-    """During market hours, just download data that changes more frequently."""
-    await stockdice.stocklist.download_symbol_list(client=client)
+async def main(*, shard: stockdice.shards.Shard | None = None):
+    stockdice.db.migrate(stockdice.config.config.db)
 
-    if stockdice.trading_hours.is_new_york_regular_trading_hours():
-        max_age = MAX_AGE
-    else:
-        max_age = MAX_AGE_OUTSIDE_TRADING_HOURS
-
-    await asyncio.gather(
-        stockdice.forex.download_forex(max_age=max_age, client=client),
-        stockdice.company_profile.download_all(max_age=max_age, client=client),
-    )
-
-
-async def main():
-    backup_thread = threading.Thread(target=backup_db, daemon=True)
-    backup_thread.start()
+    # Shard 0 merges the other shards' databases into the main one and
+    # publishes the backups.
+    if shard is None or shard.index == 0:
+        backup_thread = threading.Thread(
+            target=backup_db_loop,
+            kwargs={"shard_count": 1 if shard is None else shard.count},
+            daemon=True,
+        )
+        backup_thread.start()
 
     async with httpx.AsyncClient() as client:
-        while True:
-            # Prioritize market data during trading hours, since that changes
-            # much more quickly.
-            if stockdice.trading_hours.is_new_york_regular_trading_hours():
-                await download_market_data(client=client)
-            else:
-                await download_all(client=client)
-
-                sleep_seconds = stockdice.trading_hours.seconds_to_next_new_york_trading_hours()
-                logging.info(f"Outside of trading hours. Sleeping for {sleep_seconds / 60 / 60} hours.")
-                await asyncio.sleep(sleep_seconds)
+        await stockdice.scheduler.run(client=client, shard=shard)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--shard",
+        type=stockdice.shards.parse_shard,
+        help="Only refresh the symbols in shard INDEX/COUNT, such as 1/4.",
+    )
+    parser.add_argument(
+        "--rate-budget",
+        default=stockdice.config.RATE_BUDGET_PATH,
+        help="Database with the request budget shared by all shards.",
+    )
     args = parser.parse_args()
+    if args.shard is not None:
+        stockdice.shards.configure(args.shard, rate_budget_path=args.rate_budget)
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(main())
+    loop.run_until_complete(main(shard=args.shard))
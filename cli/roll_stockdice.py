@@ -17,28 +17,50 @@
 from __future__ import annotations
 
 import argparse
-import io
+import sys
+import time
 
 import stockdice.dice
+import stockdice.output
 
 
-def output_dataframe(result, output_path, format):
-    if format == "csv":
-        if output_path == "--":
-            with io.StringIO() as out:
-                result.write_csv(out)
-                print(out.getvalue())
-        else:
-            result.write_csv(output_path)
-    elif format == "text":
+def main(
+    *,
+    number_of_rolls,
+    output_path,
+    output_format,
+    chunk_size,
+    weights=None,
+    seed=None,
+    replace=True,
+):
+    if output_format == "text":
         if output_path != "--":
             raise ValueError("text output to file not supported")
-        print(result)
+        print(
+            stockdice.dice.roll(
+                n=number_of_rolls, weights=weights, seed=seed, replace=replace
+            )
+        )
+        return
 
-
-def main(*, number_of_rolls, output_path, output_format):
-    result = stockdice.dice.roll(n=number_of_rolls)
-    output_dataframe(result, output_path, output_format)
+    # Sample and write in chunks so that memory use doesn't grow with the
+    # number of rolls.
+    start = time.perf_counter()
+    chunks = stockdice.dice.roll_chunks(
+        n=number_of_rolls,
+        weights=weights,
+        seed=seed,
+        replace=replace,
+        chunk_size=chunk_size,
+    )
+    with stockdice.output.open_output(output_path) as output:
+        rows = stockdice.output.write_chunks(chunks, output, output_format)
+    seconds = time.perf_counter() - start
+    print(
+        f"Wrote {rows:,} rows in {seconds:.2f} s ({rows / seconds:,.0f} rows/sec).",
+        file=sys.stderr,
+    )
 
 
 if __name__ == "__main__":
@@ -48,16 +70,53 @@ if __name__ == "__main__":
     )
     parser.add_argument("-o", "--output", default="--", help="File path for output.")
     parser.add_argument(
-        "-f", "--format", default="text", choices=["text", "csv"], help="Output format."
+        "-f",
+        "--format",
+        default="text",
+        choices=["text", *stockdice.output.STREAMING_FORMATS],
+        help="Output format.",
     )
     parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=stockdice.dice.ROLL_CHUNK_SIZE,
+        help="Rolls to sample and write at a time, except for text output.",
+    )
+    weights_group = parser.add_mutually_exclusive_group()
+    weights_group.add_argument(
         "-w",
         "--weighted",
-        action="store_true",
-        default=False,
+        action="store_const",
+        dest="scheme",
+        const="marketCapUSD",
         help="Weight stocks by market capitalization instead of evenly.",
     )
+    weights_group.add_argument(
+        "-s",
+        "--scheme",
+        default=None,
+        choices=stockdice.dice.WEIGHT_COLUMNS,
+        help="Weight stocks by this column instead of evenly.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for reproducible rolls from the same database.",
+    )
+    parser.add_argument(
+        "--no-replace",
+        action="store_false",
+        dest="replace",
+        help="Choose each stock at most once.",
+    )
     args = parser.parse_args()
     main(
-        number_of_rolls=args.number, output_path=args.output, output_format=args.format
+        number_of_rolls=args.number,
+        output_path=args.output,
+        output_format=args.format,
+        chunk_size=args.chunk_size,
+        weights=args.scheme,
+        seed=args.seed,
+        replace=args.replace,
     )
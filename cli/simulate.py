@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright 2018 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+"""Estimate how many rolls it takes for a portfolio to track the index.
+
+Usage:
+
+    uv run cli/simulate.py -w marketCapUSD -k 10 20 50 100
+"""
+
+from __future__ import annotations
+
+import argparse
+
+import polars
+
+import stockdice.dice
+import stockdice.simulate
+
+
+def main(*, weights, ks, runs, seed, processes):
+    summaries = [
+        stockdice.simulate.simulate(
+            weights=weights, k=k, runs=runs, seed=seed, processes=processes
+        ).select(polars.lit(k).alias("k"), polars.all())
+        for k in ks
+    ]
+    with polars.Config(tbl_rows=-1, tbl_hide_dataframe_shape=True):
+        print(polars.concat(summaries))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="simulate.py")
+    parser.add_argument(
+        "-w",
+        "--weights",
+        default=None,
+        choices=stockdice.dice.WEIGHT_COLUMNS,
+        help="Weight rolls by this column instead of evenly.",
+    )
+    parser.add_argument(
+        "-k",
+        type=int,
+        nargs="+",
+        default=[10, 20, 50, 100],
+        help="Number of equal-dollar rolls in each portfolio.",
+    )
+    parser.add_argument(
+        "-r", "--runs", type=int, default=10_000, help="Portfolios to simulate."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=None,
+        help="Worker processes. By default, only large simulations use them.",
+    )
+    args = parser.parse_args()
+    main(
+        weights=args.weights,
+        ks=args.k,
+        runs=args.runs,
+        seed=args.seed,
+        processes=args.processes,
+    )
@@ -1,5 +1,5 @@
 #!/bin/bash
 
-uv export --format requirements-txt --locked --no-hashes > requirements.txt
+uv export --format requirements-txt --locked --no-hashes --extra arrow > requirements.txt
 
 gcloud run deploy stockdiceapp --source . --project stockdice-app --region us-central1 --service-account=web-prod@stockdice-app.iam.gserviceaccount.com
@@ -14,16 +14,22 @@
 
 import os
 
-import flask
 
-from stockdice import home
+def create_app(test_config=None):
+    # Imported here so that the CLIs don't pay for importing the web app.
+    import flask
 
+    from stockdice import api
+    from stockdice import health
+    from stockdice import home
+    from stockdice import warmup
 
-def create_app(test_config=None):
     # create and configure the app
     app = flask.Flask(__name__, instance_relative_config=True)
     app.config["SERVER_NAME"] = "www.stockdice.app"
     app.config["PREFERRED_URL_SCHEME"] = "https"
+    # Load the snapshot before the first request. See: stockdice.warmup.
+    app.config["WARM_UP"] = True
 
     if test_config is None:
         # load the instance config, if it exists, when not testing
@@ -38,6 +44,11 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    app.register_blueprint(health.bp)
     app.register_blueprint(home.bp)
+    app.register_blueprint(api.bp)
+
+    if app.config["WARM_UP"]:
+        warmup.start(app)
 
     return app
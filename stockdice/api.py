@@ -0,0 +1,76 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""JSON API."""
+
+from __future__ import annotations
+
+import flask
+
+import stockdice.dice
+import stockdice.simulate
+
+
+bp = flask.Blueprint("api", __name__, url_prefix="/api/v1")
+
+# Keep simulations from tying up a web worker for too long.
+MAX_SIMULATED_ROLLS = 10_000_000
+
+
+def _bad_request(message: str):
+    return flask.jsonify({"error": message}), 400
+
+
+@bp.route("/simulate")
+def simulate():
+    args = flask.request.args
+    weights = args.get("weights") or None
+    try:
+        k = int(args.get("k", 20))
+        runs = int(args.get("runs", 1_000))
+        seed = int(args.get("seed", 0))
+    except ValueError:
+        return _bad_request("k, runs, and seed must be integers.")
+
+    if weights is not None and weights not in stockdice.dice.WEIGHT_COLUMNS:
+        return _bad_request(
+            f"weights must be one of {', '.join(stockdice.dice.WEIGHT_COLUMNS)}."
+        )
+    if k < 1 or runs < 1:
+        return _bad_request("k and runs must be positive.")
+    if k * runs > MAX_SIMULATED_ROLLS:
+        return _bad_request(f"k * runs must be at most {MAX_SIMULATED_ROLLS}.")
+
+    # Results only change with the data, so clients and caches can revalidate
+    # without rerunning the simulation.
+    etag = stockdice.dice.snapshot_etag(
+        stockdice.dice.current_snapshot(), "simulate", weights, k, runs, seed
+    )
+    if etag in flask.request.if_none_match:
+        response = flask.Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    summary = stockdice.simulate.simulate(weights=weights, k=k, runs=runs, seed=seed)
+    response = flask.jsonify(
+        {
+            "weights": weights,
+            "k": k,
+            "runs": runs,
+            "seed": seed,
+            "metrics": summary.to_dicts(),
+        }
+    )
+    response.set_etag(etag)
+    return response
@@ -7,88 +7,90 @@ import logging
 import httpx
 
 import stockdice.company_profile
+import stockdice.db
+import stockdice.filings
+import stockdice.negative_cache
+import stockdice.pipeline
 import stockdice.ratelimits
+import stockdice.shards
 import stockdice.timeutils
 import stockdice.stocklist
 
 # https://site.financialmodelingprep.com/developer/docs/stable/balance-sheet-statement
 # https://www.investopedia.com/terms/b/balancesheet.asp
-FMP_BALANCE_SHEET = "https://financialmodelingprep.com/stable/balance-sheet-statement?symbol={symbol}&apikey={apikey}"
+FMP_BALANCE_SHEET = (
+    "https://financialmodelingprep.com/stable/balance-sheet-statement?symbol={symbol}"
+)
 
 
 @stockdice.ratelimits.retry_fmp
 async def download_balance_sheet(
-    *, client: httpx.AsyncClient, symbol: str, max_age: datetime.timedelta
+    *,
+    client: httpx.AsyncClient,
+    symbol: str,
+    max_age: datetime.timedelta,
+    sink: stockdice.pipeline.InProcessSink | None = None,
 ):
     db = stockdice.config.config.db
+    if sink is None:
+        sink = stockdice.config.config.sink
     now_us = stockdice.timeutils.now_in_microseconds()
-    last_updated = db.execute(
-        """
-        SELECT last_updated_us
-        FROM balance_sheet
-        WHERE symbol = :symbol
-        ORDER BY last_updated_us DESC
-        LIMIT 1;
-        """,
-        {"symbol": symbol},
-    ).fetchone()
-    if (
-        last_updated
-        and datetime.timedelta(microseconds=now_us - last_updated[0]) <= max_age
+    if stockdice.negative_cache.is_suppressed(
+        db, "balance_sheet", symbol=symbol, now_us=now_us
+    ):
+        logging.debug(f"No balance_sheet data last time, skipping {symbol}.")
+        return
+
+    if not stockdice.filings.is_statement_due(
+        db, table="balance_sheet", symbol=symbol, now_us=now_us, max_age=max_age
     ):
-        logging.debug(f"Data already fresh, skipping balance_sheet for {symbol}.")
+        logging.debug(f"No new filing expected, skipping balance_sheet for {symbol}.")
         return
 
     if stockdice.company_profile.is_fund_or_etf(symbol):
         logging.debug(f"{symbol} is a fund or ETF, skipping.")
-        db.execute(
-            f"""
-            INSERT INTO balance_sheet (
-                "symbol", "fiscalYear", "period", "last_updated_us"
-            ) VALUES (
-                :symbol, :fiscalYear, :period, :last_updated_us
-            ) ON CONFLICT (symbol, fiscalYear, period) DO UPDATE SET
-                "last_updated_us" = excluded."last_updated_us";
-            """,
-            {
-                "symbol": symbol,
-                "fiscalYear": None,
-                "period": None,
-                "last_updated_us": now_us,
-            },
-        )
-        db.commit()
+        sink.write(write_balance_sheet, [], symbol=symbol, now_us=now_us)
         return
 
-    url = FMP_BALANCE_SHEET.format(symbol=symbol, apikey=stockdice.config.FMP_API_KEY)
+    url = FMP_BALANCE_SHEET.format(symbol=symbol)
     resp = await stockdice.ratelimits.get(client, url)
-    resp_json = stockdice.ratelimits.check_status(resp)
+    stockdice.ratelimits.check_status_code(resp)
+    rows = await sink.parse_and_write(
+        parse=parse_balance_sheet,
+        write=write_balance_sheet,
+        table="balance_sheet",
+        content=resp.content,
+        symbol=symbol,
+        now_us=now_us,
+    )
 
     # Empty, but successfull response means we don't have the data available, so
     # let's skip it for now.
-    if not resp_json:
+    if not rows:
         logging.info(f"No balance_sheet data available for {symbol}.")
-        db.execute(
-            f"""
-            INSERT INTO balance_sheet (
-                "symbol", "fiscalYear", "period", "last_updated_us"
-            ) VALUES (
-                :symbol, :fiscalYear, :period, :last_updated_us
-            ) ON CONFLICT (symbol, fiscalYear, period) DO UPDATE SET
-                "last_updated_us" = excluded."last_updated_us";
-            """,
-            {
-                "symbol": symbol,
-                "fiscalYear": None,
-                "period": None,
-                "last_updated_us": now_us,
-            },
+
+
+def parse_balance_sheet(content: bytes, *, column_types: dict[str, str]):
+    resp_json = stockdice.ratelimits.parse_json(content)
+    if not resp_json:
+        return []
+
+    # Coerce values to the column types, as required by STRICT tables.
+    return stockdice.db.normalize_values(column_types, resp_json)
+
+
+def write_balance_sheet(db, rows: list[dict], *, symbol: str, now_us: int):
+    """Upsert parsed statements. Doesn't commit."""
+    if not rows:
+        stockdice.negative_cache.record_miss(
+            db, "balance_sheet", symbol=symbol, now_us=now_us
         )
-        db.commit()
         return
 
+    stockdice.negative_cache.record_hit(db, "balance_sheet", symbol=symbol)
+
     db.executemany(
-        f"""
+        """
         INSERT INTO balance_sheet (
             "date", "symbol", "reportedCurrency", "cik", "filingDate", "acceptedDate", "fiscalYear", "period",
             "cashAndCashEquivalents", "shortTermInvestments", "cashAndShortTermInvestments", "netReceivables",
@@ -118,7 +120,7 @@ async def download_balance_sheet(
             :treasuryStock, :preferredStock, :commonStock, :retainedEarnings, :additionalPaidInCapital,
             :accumulatedOtherComprehensiveIncomeLoss, :otherTotalStockholdersEquity, :totalStockholdersEquity,
             :totalEquity, :minorityInterest, :totalLiabilitiesAndTotalEquity, :totalInvestments,
-            :totalDebt, :netDebt, {now_us}
+            :totalDebt, :netDebt, :last_updated_us
         )
         ON CONFLICT(symbol, fiscalYear, period) DO UPDATE SET
             "date" = excluded."date",
@@ -180,15 +182,22 @@ async def download_balance_sheet(
             "netDebt" = excluded."netDebt",
             "last_updated_us" = excluded."last_updated_us";
         """,
-        resp_json,
+        [{**row, "last_updated_us": now_us} for row in rows],
     )
-    db.commit()
 
 
-async def download_all(*, max_age: datetime.timedelta, client: httpx.AsyncClient):
+async def download_all(
+    *,
+    max_age: datetime.timedelta,
+    client: httpx.AsyncClient,
+    sink: stockdice.pipeline.InProcessSink | None = None,
+    shard: stockdice.shards.Shard | None = None,
+):
     return await asyncio.gather(
         *[
-            download_balance_sheet(max_age=max_age, client=client, symbol=symbol)
-            for symbol in stockdice.stocklist.list_symbols()
+            download_balance_sheet(
+                max_age=max_age, client=client, symbol=symbol, sink=sink
+            )
+            for symbol in stockdice.stocklist.list_symbols(shard)
         ]
     )
@@ -0,0 +1,271 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Load profiles and statements for all symbols from FMP's bulk CSV files.
+
+A full refresh makes a few requests per symbol, so it takes tens of thousands
+of requests. The bulk endpoints return one CSV file per profile part or per
+fiscal year instead. Files are streamed to disk, then parsed in chunks and
+upserted through a staging table, so memory use doesn't grow with the file.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pathlib
+import sqlite3
+
+import httpx
+import polars
+
+import stockdice.db
+import stockdice.negative_cache
+import stockdice.ratelimits
+
+# https://site.financialmodelingprep.com/developer/docs/stable/profile-bulk
+FMP_PROFILE_BULK = "https://financialmodelingprep.com/stable/profile-bulk?part={part}"
+# https://site.financialmodelingprep.com/developer/docs/stable/income-statement-bulk
+FMP_INCOME_BULK = (
+    "https://financialmodelingprep.com/stable/income-statement-bulk"
+    "?year={year}&period=FY"
+)
+# https://site.financialmodelingprep.com/developer/docs/stable/balance-sheet-statement-bulk
+FMP_BALANCE_SHEET_BULK = (
+    "https://financialmodelingprep.com/stable/balance-sheet-statement-bulk"
+    "?year={year}&period=FY"
+)
+
+# Maps each dataset to its table and the URL of its bulk files.
+DATASETS = {
+    "profile": ("company_profile", FMP_PROFILE_BULK),
+    "income": ("income", FMP_INCOME_BULK),
+    "balance_sheet": ("balance_sheet", FMP_BALANCE_SHEET_BULK),
+}
+
+# Each chunk is one transaction, so the refresher and readers aren't blocked
+# for long.
+CHUNK_ROWS = 50_000
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Columns that record when we wrote a row, rather than values from FMP.
+_BOOKKEEPING_COLUMNS = frozenset(("last_updated_us", "quote_last_updated_us"))
+_STAGE_TABLE = "temp.bulk_stage"
+
+
+@stockdice.ratelimits.retry_fmp
+async def download_bulk(client: httpx.AsyncClient, url: str, path) -> int:
+    """Stream a bulk CSV file to path.
+
+    Returns:
+        The number of bytes written. Zero means there is no such file, such as
+        when requesting a profile part past the last one.
+    """
+    path = pathlib.Path(path)
+    partial_path = path.with_name(path.name + ".partial")
+    size = 0
+    async with stockdice.ratelimits.stream(client, url) as resp:
+        stockdice.ratelimits.check_status_code(resp)
+        chunks = resp.aiter_bytes(DOWNLOAD_CHUNK_BYTES)
+        first = await anext(chunks, b"")
+
+        # Errors, including rate limits, come back as JSON instead of CSV.
+        if first.lstrip()[:1] in (b"{", b"["):
+            content = first + b"".join([chunk async for chunk in chunks])
+            if not stockdice.ratelimits.parse_json(content):
+                return 0
+            raise ValueError(f"Expected CSV from {url}, got: {content[:200]!r}")
+
+        with open(partial_path, "wb") as file:
+            file.write(first)
+            size += len(first)
+            async for chunk in chunks:
+                file.write(chunk)
+                size += len(chunk)
+
+    if size == 0:
+        partial_path.unlink()
+        return 0
+
+    # Only replace the previous file once the download is complete.
+    os.replace(partial_path, path)
+    return size
+
+
+def _cast(name: str, column_type: str) -> polars.Expr:
+    """Coerce a string column to the column type, like stockdice.db._to_integer
+    and stockdice.db._to_real, but vectorized."""
+    text = polars.col(name).str.strip_chars()
+    if column_type == "INTEGER":
+        as_float = text.cast(polars.Float64, strict=False)
+        lowered = text.str.to_lowercase()
+        return (
+            polars.when(lowered == "true")
+            .then(1)
+            .when(lowered == "false")
+            .then(0)
+            .otherwise(
+                text.cast(polars.Int64, strict=False).fill_null(
+                    polars.when(as_float.is_finite())
+                    .then(as_float.round())
+                    .cast(polars.Int64, strict=False)
+                )
+            )
+            .alias(name)
+        )
+    if column_type == "REAL":
+        as_float = text.cast(polars.Float64, strict=False)
+        return polars.when(as_float.is_finite()).then(as_float).alias(name)
+    return polars.col(name)
+
+
+def _cast_chunk(chunk: polars.DataFrame, column_types: dict[str, str]):
+    # Most integer columns are plain integers, so try a simple cast first and
+    # only use the slower, more lenient one for columns where that failed.
+    integers = [name for name in chunk.columns if column_types[name] == "INTEGER"]
+    cast = chunk.select(
+        polars.col(name).cast(polars.Int64, strict=False)
+        if name in integers
+        else _cast(name, column_types[name])
+        for name in chunk.columns
+    )
+    failed = [
+        name for name in integers if cast[name].null_count() > chunk[name].null_count()
+    ]
+    if not failed:
+        return cast
+    return cast.with_columns(chunk.select(_cast(name, "INTEGER") for name in failed))
+
+
+def _primary_key(db: sqlite3.Connection, table: str) -> list[str]:
+    columns = db.execute(f"PRAGMA main.table_info({table});").fetchall()
+    return [column[1] for column in sorted(columns, key=lambda c: c[5]) if column[5]]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def ingest_csv(
+    db: sqlite3.Connection,
+    table: str,
+    path,
+    *,
+    now_us: int,
+    chunk_rows: int = CHUNK_ROWS,
+) -> int:
+    """Upsert the rows of a bulk CSV file into table.
+
+    Columns that aren't in the table are ignored. Rows without a complete
+    primary key are skipped. Symbols with data are cleared from the negative
+    cache, see stockdice.negative_cache.
+
+    Returns:
+        The number of rows read from the file.
+    """
+    column_types = stockdice.db.table_column_types(db, table)
+    primary_key = _primary_key(db, table)
+    header = polars.read_csv(path, n_rows=0, infer_schema=False).columns
+    names = [
+        name
+        for name in header
+        if name in column_types and name not in _BOOKKEEPING_COLUMNS
+    ]
+    missing = [name for name in primary_key if name not in names]
+    if missing:
+        raise ValueError(f"{path} is missing key columns for {table}: {missing}")
+
+    column_list = ", ".join(_quote(name) for name in names)
+    placeholders = ", ".join("?" for _ in names)
+    has_key = " AND ".join(f"{_quote(name)} IS NOT NULL" for name in primary_key)
+    updates = ",\n".join(
+        f"{_quote(name)} = excluded.{_quote(name)}"
+        for name in names + ["last_updated_us"]
+        if name not in primary_key
+    )
+
+    db.execute(f"DROP TABLE IF EXISTS {_STAGE_TABLE};")
+    db.execute(f"CREATE TABLE {_STAGE_TABLE} ({column_list});")
+
+    total_rows = 0
+    reader = polars.read_csv_batched(
+        path, columns=names, infer_schema_length=0, batch_size=chunk_rows
+    )
+    try:
+        while batches := reader.next_batches(1):
+            chunk = _cast_chunk(batches[0], column_types)
+            total_rows += chunk.height
+
+            db.execute(f"DELETE FROM {_STAGE_TABLE};")
+            db.executemany(
+                f"INSERT INTO {_STAGE_TABLE} ({column_list}) VALUES ({placeholders});",
+                chunk.iter_rows(),
+            )
+            db.execute(
+                f"""
+                INSERT INTO main.{table} ({column_list}, last_updated_us)
+                SELECT {column_list}, :now_us
+                FROM {_STAGE_TABLE}
+                WHERE {has_key}
+                ON CONFLICT ({", ".join(_quote(name) for name in primary_key)})
+                DO UPDATE SET
+                    {updates};
+                """,
+                {"now_us": now_us},
+            )
+            db.execute(
+                f"""
+                DELETE FROM main.{stockdice.negative_cache.missing_table(table)}
+                WHERE symbol IN (
+                    SELECT symbol FROM {_STAGE_TABLE} WHERE {has_key}
+                );
+                """
+            )
+            db.commit()
+            logging.debug(f"Loaded {total_rows} rows from {path} into {table}.")
+    finally:
+        db.execute(f"DROP TABLE IF EXISTS {_STAGE_TABLE};")
+
+    return total_rows
+
+
+async def download_files(
+    dataset: str, *, client: httpx.AsyncClient, directory, years=()
+) -> list[pathlib.Path]:
+    """Download the bulk files for dataset into directory.
+
+    Profiles are split into numbered parts, which are downloaded until FMP
+    returns an empty part. Statements are downloaded for each of years.
+    """
+    _, url = DATASETS[dataset]
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    if dataset == "profile":
+        part = 0
+        while True:
+            path = directory / f"{dataset}-part-{part}.csv"
+            if not await download_bulk(client, url.format(part=part), path):
+                break
+            paths.append(path)
+            part += 1
+    else:
+        for year in years:
+            path = directory / f"{dataset}-{year}.csv"
+            if await download_bulk(client, url.format(year=year), path):
+                paths.append(path)
+            else:
+                logging.info(f"No bulk {dataset} file for {year}.")
+    return paths
@@ -0,0 +1,129 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Combine requests for one symbol into requests for many symbols.
+
+Some FMP endpoints, such as batch-quote, accept a comma-separated list of
+symbols. Requests for single symbols that arrive within a short window are
+sent as one request, which costs the same against the rate limit as a request
+for a single symbol.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+import stockdice.ratelimits
+
+
+# https://site.financialmodelingprep.com/developer/docs/stable/batch-quote
+FMP_BATCH_QUOTE = (
+    "https://financialmodelingprep.com/stable/batch-quote?symbols={symbols}"
+)
+
+# Requests made in the same pass of the event loop, such as from
+# asyncio.gather, are always combined. Wait a little longer to catch requests
+# that follow closely.
+WINDOW_SECONDS = 0.05
+# Keep URLs well under common length limits.
+MAX_BATCH_SIZE = 100
+
+
+class Coalescer:
+    """Fetch one result per symbol, combining requests that arrive together.
+
+    Args:
+        url: URL template with a {symbols} field for the comma-separated list.
+        symbol_key: Field of each result that holds its symbol.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        symbol_key: str = "symbol",
+        window_seconds: float = WINDOW_SECONDS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+    ):
+        self._url = url
+        self._symbol_key = symbol_key
+        self._window_seconds = window_seconds
+        self._max_batch_size = max_batch_size
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.requests = 0
+
+    async def get(self, client: httpx.AsyncClient, symbol: str) -> dict | None:
+        """Fetch the result for symbol, or None if the response didn't have it."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(symbol, []).append(future)
+
+        if len(self._pending) >= self._max_batch_size:
+            self._flush(client)
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window_seconds, self._flush, client)
+        return await future
+
+    def _flush(self, client: httpx.AsyncClient):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = dict(list(self._pending.items())[: self._max_batch_size])
+        for symbol in batch:
+            del self._pending[symbol]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(
+                self._window_seconds, self._flush, client
+            )
+
+        # Keep a reference so the task isn't garbage collected while running.
+        task = asyncio.create_task(self._send(client, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(
+        self, client: httpx.AsyncClient, batch: dict[str, list[asyncio.Future]]
+    ):
+        try:
+            results = await self._fetch(client, list(batch))
+        except Exception as exp:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exp)
+            return
+
+        by_symbol = {
+            result.get(self._symbol_key): result
+            for result in results or ()
+            if isinstance(result, dict)
+        }
+        for symbol, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(by_symbol.get(symbol))
+
+    # Retry here, rather than in each caller, so that a rate limit error is
+    # only charged once and the batch stays together.
+    @stockdice.ratelimits.retry_fmp
+    async def _fetch(self, client: httpx.AsyncClient, symbols: list[str]):
+        self.requests += 1
+        url = self._url.format(symbols=",".join(symbols))
+        resp = await stockdice.ratelimits.get(client, url)
+        return stockdice.ratelimits.check_status(resp)
@@ -6,14 +6,16 @@ import logging
 
 import httpx
 
+import stockdice.db
+import stockdice.negative_cache
+import stockdice.pipeline
 import stockdice.ratelimits
+import stockdice.shards
 import stockdice.timeutils
 import stockdice.stocklist
 
 # https://site.financialmodelingprep.com/developer/docs/stable/profile-symbol
-FMP_COMPANY_PROFILE = (
-    "https://financialmodelingprep.com/stable/profile?symbol={symbol}&apikey={apikey}"
-)
+FMP_COMPANY_PROFILE = "https://financialmodelingprep.com/stable/profile?symbol={symbol}"
 
 
 _FLOAT_KEYS = {
@@ -44,7 +46,11 @@ def is_fund_or_etf(symbol: str):
 
 @stockdice.ratelimits.retry_fmp
 async def download_company_profile(
-    *, client: httpx.AsyncClient, symbol: str, max_age: datetime.timedelta
+    *,
+    client: httpx.AsyncClient,
+    symbol: str,
+    max_age: datetime.timedelta,
+    sink: stockdice.pipeline.InProcessSink | None = None,
 ):
     db = stockdice.config.config.db
     now_us = stockdice.timeutils.now_in_microseconds()
@@ -65,31 +71,41 @@ async def download_company_profile(
         logging.debug(f"Data already fresh, skipping company_profile for {symbol}.")
         return
 
+    if stockdice.negative_cache.is_suppressed(
+        db, "company_profile", symbol=symbol, now_us=now_us
+    ):
+        logging.debug(f"No company_profile data last time, skipping {symbol}.")
+        return
+
     if is_fund_or_etf(symbol):
         logging.debug(f"{symbol} is a fund or ETF, skipping.")
         return
 
-    url = FMP_COMPANY_PROFILE.format(symbol=symbol, apikey=stockdice.config.FMP_API_KEY)
+    url = FMP_COMPANY_PROFILE.format(symbol=symbol)
     resp = await stockdice.ratelimits.get(client, url)
-    resp_json = stockdice.ratelimits.check_status(resp)
+    stockdice.ratelimits.check_status_code(resp)
+
+    if sink is None:
+        sink = stockdice.config.config.sink
+    rows = await sink.parse_and_write(
+        parse=parse_company_profile,
+        write=write_company_profile,
+        table="company_profile",
+        content=resp.content,
+        symbol=symbol,
+        now_us=now_us,
+    )
 
     # Empty, but successfull response means we don't have the data available, so
     # let's skip it for now.
-    if not resp_json:
+    if not rows:
         logging.info(f"No company_profile data available for {symbol}.")
-        db.execute(
-            f"""
-            INSERT INTO company_profile (
-                "symbol", "last_updated_us"
-            ) VALUES (
-                :symbol, :last_updated_us
-            ) ON CONFLICT (symbol) DO UPDATE SET
-                "last_updated_us" = excluded."last_updated_us";
-            """,
-            {"symbol": symbol, "last_updated_us": now_us},
-        )
-        db.commit()
-        return
+
+
+def parse_company_profile(content: bytes, *, column_types: dict[str, str]):
+    resp_json = stockdice.ratelimits.parse_json(content)
+    if not resp_json:
+        return []
 
     # Avoid OverflowError for potentially large values. See:
     # https://github.com/bananajuicellc/overcastdata.com/issues/148
@@ -99,8 +115,22 @@ async def download_company_profile(
             if value:
                 profile[key] = float(value)
 
+    # Coerce values to the column types, as required by STRICT tables.
+    return stockdice.db.normalize_values(column_types, resp_json)
+
+
+def write_company_profile(db, rows: list[dict], *, symbol: str, now_us: int):
+    """Upsert parsed profiles. Doesn't commit."""
+    if not rows:
+        stockdice.negative_cache.record_miss(
+            db, "company_profile", symbol=symbol, now_us=now_us
+        )
+        return
+
+    stockdice.negative_cache.record_hit(db, "company_profile", symbol=symbol)
+
     db.executemany(
-        f"""
+        """
         INSERT INTO company_profile (
             symbol,
             price,
@@ -176,7 +206,7 @@ async def download_company_profile(
             :isActivelyTrading,
             :isAdr,
             :isFund,
-            {now_us}
+            :last_updated_us
         )
         ON CONFLICT(symbol) DO UPDATE SET
             price = :price,
@@ -214,17 +244,24 @@ async def download_company_profile(
             isActivelyTrading = :isActivelyTrading,
             isAdr = :isAdr,
             isFund = :isFund,
-            last_updated_us = {now_us};
+            last_updated_us = :last_updated_us;
         """,
-        resp_json,
+        [{**row, "last_updated_us": now_us} for row in rows],
     )
-    db.commit()
 
 
-async def download_all(*, max_age: datetime.timedelta, client: httpx.AsyncClient):
+async def download_all(
+    *,
+    max_age: datetime.timedelta,
+    client: httpx.AsyncClient,
+    sink: stockdice.pipeline.InProcessSink | None = None,
+    shard: stockdice.shards.Shard | None = None,
+):
     return await asyncio.gather(
         *[
-            download_company_profile(max_age=max_age, client=client, symbol=symbol)
-            for symbol in stockdice.stocklist.list_symbols()
+            download_company_profile(
+                max_age=max_age, client=client, symbol=symbol, sink=sink
+            )
+            for symbol in stockdice.stocklist.list_symbols(shard)
         ]
     )
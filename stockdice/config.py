@@ -12,33 +12,64 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""Configuration and secrets, loaded on first use.
+
+Importing this module doesn't touch the network. The google-cloud packages
+are imported and Secret Manager is called only when a value is first needed,
+for example via stockdice.config.config or stockdice.config.FMP_API_KEYS.
+"""
+
 from __future__ import annotations
 
+import logging
 import os
 import pathlib
 import sqlite3
 import tempfile
 import threading
 import time
+from typing import TYPE_CHECKING
 
-import google.auth
-from google.cloud import secretmanager_v1
-import google.cloud.storage
 import toml
 
+if TYPE_CHECKING:
+    import google.cloud.storage
+
 
 REPO_ROOT = pathlib.Path(__file__).parent.parent
 CONFIG_PATH = REPO_ROOT / "environment.toml"
 FMP_DIR = REPO_ROOT / "third_party" / "financialmodelingprep.com"
 DB_PATH = FMP_DIR / "stockdice.sqlite"
 DB_REPLICA_PATH = FMP_DIR / "stockdice_backup.sqlite"
+SNAPSHOT_CACHE_DIR = FMP_DIR / "snapshot_cache"
+BULK_DIR = FMP_DIR / "bulk"
+# Shared by refresher shards so that together they stay within the plan's
+# rate limit. See: stockdice.ratebudget.
+RATE_BUDGET_PATH = FMP_DIR / "rate_budget.sqlite"
+# Secrets are cached locally so that new processes, such as cold starts and
+# CLI runs, don't each have to wait for Secret Manager.
+SECRETS_CACHE_PATH = FMP_DIR / "secrets_cache.toml"
+SECRETS_CACHE_TTL_SECONDS = 60 * 60
+# How often web instances check for a new replica. Only the small manifest is
+# downloaded unless the replica changed. See: stockdice.manifest.
+MANIFEST_POLL_SECONDS = 30.0
+SECRET_KEYS = (
+    "bucket",
+    "backup_interval_seconds",
+    "FMP_API_KEY",
+    "requests_per_minute",
+)
 
 
 class Config:
     def __init__(self, config: dict):
         self._db = None
+        self._sink = None
+        self._db_path = None
         self._replica_db_path = None
         self._replica_db_refresh_time = time.monotonic()
+        self._replica_poll_seconds = MANIFEST_POLL_SECONDS
+        self._replica_version = None
         self._replica_db_lock = threading.Lock()
         self._storage_client = None
         self._config = config
@@ -50,24 +81,27 @@ class Config:
 
     @classmethod
     def create_from_gcp(cls, project_id: str | None = None):
+        config = read_secrets_cache(project_id)
+        if config is not None:
+            return cls(config)
+
+        import google.auth
+        from google.cloud import secretmanager_v1
+
         credentials, default_project_id = google.auth.default()
         project_id = project_id or default_project_id
 
         client = secretmanager_v1.SecretManagerServiceClient(credentials=credentials)
 
-        config = {
-            "bucket": None,
-            "backup_interval_seconds": None,
-            "FMP_API_KEY": None,
-            "requests_per_minute": None,
-        }
-        for key in config:
+        config = {}
+        for key in SECRET_KEYS:
             name = f"projects/{project_id}/secrets/{key}/versions/latest"
             response = client.access_secret_version(
                 name=name,
             )
             config[key] = response.payload.data.decode("utf-8")
 
+        write_secrets_cache(project_id, config)
         return cls(config)
 
     @property
@@ -80,10 +114,19 @@ class Config:
 
     @property
     def fmp_api_key(self) -> str:
-        return self._config["FMP_API_KEY"]
+        return self.fmp_api_keys[0]
+
+    @property
+    def fmp_api_keys(self) -> tuple[str, ...]:
+        """All API keys. FMP_API_KEY can be a list or comma-separated."""
+        keys = self._config["FMP_API_KEY"]
+        if isinstance(keys, str):
+            keys = keys.split(",")
+        return tuple(key.strip() for key in keys if key.strip())
 
     @property
     def requests_per_minute(self) -> float:
+        """Rate limit for each API key."""
         return float(self._config["requests_per_minute"])
 
     @property
@@ -92,33 +135,79 @@ class Config:
         if DB_REPLICA_PATH.exists():
             return DB_REPLICA_PATH
 
-        # TODO(tswast): Maybe some kind of lock to avoid downloading the
-        # database more than once in multi-threaded environments?
         with self._replica_db_lock:
             now = time.monotonic()
-            previous_path = self._replica_db_path
             if (
-                previous_path is None
-                or (now - self._replica_db_refresh_time) > self.backup_interval_seconds
+                self._replica_db_path is None
+                or (now - self._replica_db_refresh_time) > self._replica_poll_seconds
             ):
                 self._replica_db_refresh_time = now
+                self._refresh_replica()
 
-                if self._storage_client is None:
-                    self._storage_client = google.cloud.storage.Client()
+        return self._replica_db_path
 
-                self._replica_db_path = load_replica_from_gcs(
-                    self._storage_client, bucket_name=self.bucket
+    @property
+    def replica_version(self) -> str | None:
+        """SHA-256 of the replica, if it was published with a manifest."""
+        return self._replica_version
+
+    def _refresh_replica(self):
+        import stockdice.manifest
+
+        if self._storage_client is None:
+            import google.cloud.storage
+
+            self._storage_client = google.cloud.storage.Client()
+
+        bucket = self._storage_client.bucket(self.bucket)
+        previous_path = self._replica_db_path
+        manifest = stockdice.manifest.read_manifest(bucket)
+
+        if manifest is None:
+            # Published by an older refresher without a manifest.
+            self._replica_poll_seconds = self.backup_interval_seconds
+            self._replica_db_path = load_replica_from_gcs(
+                self._storage_client, bucket_name=self.bucket
+            )
+            self._replica_version = None
+        elif manifest["version"] == self._replica_version:
+            # Only the tiny manifest was downloaded.
+            return
+        else:
+            self._replica_poll_seconds = MANIFEST_POLL_SECONDS
+            try:
+                self._replica_db_path = stockdice.manifest.download_snapshot(
+                    bucket, manifest
                 )
+            except ValueError:
+                if previous_path is None:
+                    raise
+                logging.exception("Keeping the previous replica.")
+                return
+            self._replica_version = manifest["version"]
 
-                if previous_path is not None:
-                    pathlib.Path(previous_path).unlink(missing_ok=True)
+        if previous_path is not None and previous_path != self._replica_db_path:
+            import stockdice.readpool
 
-        return self._replica_db_path
+            # Idle threads would otherwise keep the deleted file mapped.
+            stockdice.readpool.close_replica(previous_path)
+            pathlib.Path(previous_path).unlink(missing_ok=True)
+
+    @property
+    def db_path(self) -> pathlib.Path:
+        return self._db_path or DB_PATH
+
+    @db_path.setter
+    def db_path(self, path):
+        # For example, refresher shards each write to their own database.
+        if self._db is not None:
+            raise RuntimeError("Set db_path before connecting to the database.")
+        self._db_path = pathlib.Path(path)
 
     @property
     def db(self):
         if self._db is None:
-            self._db = sqlite3.connect(DB_PATH, autocommit=False)
+            self._db = sqlite3.connect(self.db_path, autocommit=False)
 
             try:
                 # End the transaction that was started automatically.
@@ -133,17 +222,72 @@ class Config:
             self._db.execute("BEGIN TRANSACTION;")
         return self._db
 
+    @property
+    def sink(self):
+        """Parses and writes downloads to db. See: stockdice.pipeline."""
+        if self._sink is None:
+            import stockdice.pipeline
+
+            # Reuse the sink so that column types are only looked up once.
+            self._sink = stockdice.pipeline.InProcessSink(self.db)
+        return self._sink
+
 
 def load_replica_from_gcs(
-    storage_client: google.cloud.storage.Client, bucket_name: str
-):
-    uri = f"gs://{bucket_name}/"
-    with tempfile.NamedTemporaryFile(delete=False, delete_on_close=False) as fp:
+    storage_client: google.cloud.storage.Client, bucket_name: str, directory=None
+) -> pathlib.Path:
+    import stockdice.manifest
+
+    directory = pathlib.Path(directory or tempfile.gettempdir())
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as fp:
         storage_client.bucket(bucket_name=bucket_name).blob(
-            "stockdice_backup.sqlite"
+            stockdice.manifest.LEGACY_REPLICA_NAME
         ).download_to_file(fp)
-    db_replica_path = fp.name
-    return db_replica_path
+    tmp_path = pathlib.Path(fp.name)
+
+    # Name the replica by its content, the same as one downloaded through the
+    # manifest, so that stockdice.dice.snapshot_version doesn't change with
+    # every download of the same data.
+    path = directory / stockdice.manifest.snapshot_file_name(
+        stockdice.manifest.file_sha256(tmp_path)
+    )
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_secrets_cache(project_id: str | None, *, path=None) -> dict | None:
+    """Read secrets cached by a recent process, if they haven't expired."""
+    path = pathlib.Path(path or SECRETS_CACHE_PATH)
+    try:
+        age = time.time() - path.stat().st_mtime
+        if age > SECRETS_CACHE_TTL_SECONDS:
+            return None
+        cached = toml.loads(path.read_text())
+    except (OSError, toml.TomlDecodeError):
+        return None
+
+    # The default project is only known after authenticating, so a cache
+    # written with an explicit project isn't used without one and vice versa.
+    if cached.get("project_id", "") != (project_id or ""):
+        return None
+    secrets = cached.get("secrets", {})
+    if any(key not in secrets for key in SECRET_KEYS):
+        return None
+    return secrets
+
+
+def write_secrets_cache(project_id: str | None, secrets: dict, *, path=None):
+    path = pathlib.Path(path or SECRETS_CACHE_PATH)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        # Only readable by the current user.
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as tmp:
+            toml.dump({"project_id": project_id or "", "secrets": secrets}, tmp)
+        os.replace(tmp_path, path)
+    except OSError:
+        logging.exception(f"Unable to cache secrets to {path}.")
 
 
 def create_config():
@@ -162,6 +306,28 @@ def create_config():
         return Config.create_from_gcp()
 
 
-config = create_config()
-FMP_API_KEY = config.fmp_api_key
-REQUESTS_PER_MINUTE = config.requests_per_minute
+_config: Config | None = None
+_config_lock = threading.Lock()
+
+
+def get_config() -> Config:
+    global _config
+
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = create_config()
+    return _config
+
+
+def __getattr__(name: str):
+    # Module-level properties, so that config is only created when used.
+    if name == "config":
+        return get_config()
+    if name == "FMP_API_KEY":
+        return get_config().fmp_api_key
+    if name == "FMP_API_KEYS":
+        return get_config().fmp_api_keys
+    if name == "REQUESTS_PER_MINUTE":
+        return get_config().requests_per_minute
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
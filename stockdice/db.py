@@ -13,8 +13,11 @@
 # limitations under the License.
 
 import logging
+import math
+import sqlite3
 
 import stockdice.config
+import stockdice.negative_cache
 
 
 def _table_exists(db, table_name):
@@ -25,12 +28,247 @@ def _table_exists(db, table_name):
     return exists is not None
 
 
+def _drop_all_tables(db):
+    tables = [
+        row[0]
+        for row in db.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
+        )
+    ]
+    for table in tables:
+        db.execute(f"DROP TABLE IF EXISTS {table};")
+    db.execute("PRAGMA user_version = 0;")
+    db.commit()
+
+
 def create_all_tables(db, *, reset: bool):
-    create_balance_sheet(db, reset=reset)
-    create_company_profile(db, reset=reset)
-    create_forex(db, reset=reset)
-    create_income(db, reset=reset)
-    create_symbols(db, reset=reset)
+    if reset:
+        _drop_all_tables(db)
+    migrate(db)
+
+
+def _create_initial_tables(db):
+    create_balance_sheet(db, reset=False)
+    create_company_profile(db, reset=False)
+    create_forex(db, reset=False)
+    create_income(db, reset=False)
+    create_symbols(db, reset=False)
+
+
+def _create_latest_fy_tables(db):
+    create_latest_fy_balance_sheet(db, reset=False)
+    create_latest_fy_income(db, reset=False)
+
+
+def _create_serving_indexes(db):
+    # Partial index, since we only ever serve stocks, not funds.
+    db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS company_profile_stocks
+        ON company_profile (symbol)
+        WHERE isEtf = false AND isFund = false;
+        """
+    )
+    # Covering indexes for currency conversion and the list of symbols to
+    # refresh.
+    db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS forex_to_currency
+        ON forex (to_currency, from_currency, price);
+        """
+    )
+    db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS symbol_trading_currency
+        ON symbol (trading_currency, symbol);
+        """
+    )
+    for table in ("income", "balance_sheet"):
+        # Used to predict the next filing. See: stockdice.filings.
+        db.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS {table}_fy
+            ON {table} (symbol, fiscalYear, date, filingDate, acceptedDate)
+            WHERE period = 'FY';
+            """
+        )
+        # Used to check if the statements are fresh.
+        db.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS {table}_last_updated
+            ON {table} (symbol, last_updated_us);
+            """
+        )
+
+
+def _create_forex_history(db):
+    # One row per pair per day, so keep it compact with WITHOUT ROWID.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS forex_history (
+            symbol TEXT NOT NULL,
+            date TEXT NOT NULL,
+            price REAL,
+            PRIMARY KEY (symbol, date)
+        ) STRICT, WITHOUT ROWID;
+        """
+    )
+
+
+def _add_company_profile_quote_last_updated(db):
+    # Quotes update a few columns more often than the full profile. Track
+    # them separately, so they don't make the profile look fresh. See:
+    # stockdice.quotes.
+    if "quote_last_updated_us" not in table_column_types(db, "company_profile"):
+        db.execute(
+            "ALTER TABLE company_profile ADD COLUMN quote_last_updated_us INTEGER;"
+        )
+
+
+# Before stockdice.negative_cache, requests that returned no data wrote these
+# placeholder rows instead. NULLs are distinct in primary keys, so statements
+# gained another placeholder with every request.
+_PLACEHOLDERS = {
+    "company_profile": "companyName IS NULL AND isEtf IS NULL AND isFund IS NULL",
+    "income": "fiscalYear IS NULL OR period IS NULL",
+    "balance_sheet": "fiscalYear IS NULL OR period IS NULL",
+}
+
+
+def _create_negative_cache(db):
+    total_deleted = 0
+    for table, is_placeholder in _PLACEHOLDERS.items():
+        stockdice.negative_cache.create_table(db, table)
+        deleted = stockdice.negative_cache.compact_placeholders(
+            db, table, is_placeholder=is_placeholder
+        )
+        if deleted:
+            logging.info(f"Compacted {deleted} placeholder rows from {table}.")
+        total_deleted += deleted
+
+    # Give the space back, so that backups don't copy the freed pages.
+    # Compacting again is a no-op, so it's safe to commit before migrate does.
+    if total_deleted:
+        _vacuum(db)
+
+
+def _vacuum(db):
+    # VACUUM can't run in a transaction, but connections opened with
+    # autocommit=False, such as stockdice.config.Config.db, are always in one.
+    autocommit = db.autocommit
+    db.commit()
+    db.autocommit = True
+    try:
+        db.execute("VACUUM;")
+    finally:
+        db.autocommit = autocommit
+
+
+def _create_symbol_events(db):
+    # Symbols added to or removed from the symbol list. See:
+    # stockdice.stocklist.update_symbol_list.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS symbol_event (
+            symbol TEXT NOT NULL,
+            event TEXT NOT NULL,
+            company_name TEXT,
+            event_us INTEGER NOT NULL
+        ) STRICT;
+        """
+    )
+    db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS symbol_event_time
+        ON symbol_event (event_us);
+        """
+    )
+    # Unchanged symbols aren't rewritten, so their last_updated_us no longer
+    # says when the list was downloaded. Record each download instead.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS symbol_list_download (
+            last_updated_us INTEGER PRIMARY KEY,
+            listed INTEGER NOT NULL,
+            updated INTEGER NOT NULL,
+            delisted INTEGER NOT NULL
+        ) STRICT;
+        """
+    )
+
+
+def _create_forex_history_negative_cache(db):
+    # Pairs without history would otherwise be requested on every sweep. See:
+    # stockdice.forex.download_forex_history.
+    stockdice.negative_cache.create_table(db, "forex_history")
+
+
+# Each migration upgrades the schema by one version, which is tracked with
+# PRAGMA user_version. Only ever append to this list.
+#
+# Databases created before we tracked versions start at version 0, but may
+# already have some of these tables, so migrations must be safe to re-run.
+MIGRATIONS = (
+    _create_initial_tables,
+    _create_latest_fy_tables,
+    _create_serving_indexes,
+    _create_forex_history,
+    _add_company_profile_quote_last_updated,
+    _create_negative_cache,
+    _create_symbol_events,
+    _create_forex_history_negative_cache,
+)
+
+
+def analyze(path, *, analysis_limit: int = 1000):
+    """Update the query planner statistics in the database at path.
+
+    ANALYZE needs a write lock, so run this on a copy, such as a backup,
+    rather than on a database that is being written to.
+    """
+    db = sqlite3.connect(path)
+    try:
+        # Keep ANALYZE cheap, since it runs before every backup.
+        # https://www.sqlite.org/pragma.html#pragma_analysis_limit
+        db.execute(f"PRAGMA analysis_limit = {int(analysis_limit)};")
+        db.execute("ANALYZE;")
+        db.commit()
+    finally:
+        db.close()
+
+
+def end_read_transaction(db):
+    """Commit, so that the next statement sees the latest data.
+
+    Connections opened with autocommit=False are always in a transaction. In
+    WAL mode, one that has read since another process committed, such as the
+    ProcessPoolSink writer, can't write until that transaction ends. Call
+    this before writing after an await, since other coroutines may have read
+    in the meantime.
+    """
+    db.commit()
+
+
+def schema_version(db) -> int:
+    return db.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(db):
+    """Upgrade the database schema in place to the latest version."""
+    current_version = schema_version(db)
+    if current_version > len(MIGRATIONS):
+        raise ValueError(
+            f"Database schema version {current_version} is newer than the "
+            f"latest known version {len(MIGRATIONS)}."
+        )
+
+    for version, migration in enumerate(
+        MIGRATIONS[current_version:], start=current_version + 1
+    ):
+        logging.info(f"Migrating to schema version {version}: {migration.__name__}")
+        migration(db)
+        db.execute(f"PRAGMA user_version = {version};")
+        db.commit()
 
 
 def create_balance_sheet(db, *, reset: bool):
@@ -200,6 +438,148 @@ def create_income(db, *, reset: bool):
     db.commit()
 
 
+# Columns needed to serve rolls from the most recent annual statements.
+LATEST_FY_BALANCE_SHEET_COLUMNS = (
+    "symbol",
+    "fiscalYear",
+    "period",
+    "date",
+    "reportedCurrency",
+    "totalAssets",
+    "totalLiabilities",
+    "last_updated_us",
+)
+LATEST_FY_INCOME_COLUMNS = (
+    "symbol",
+    "fiscalYear",
+    "period",
+    "date",
+    "reportedCurrency",
+    "revenue",
+    "netIncome",
+    "last_updated_us",
+)
+
+
+def _create_latest_fy(
+    db, *, table: str, latest_table: str, columns: tuple[str, ...], reset: bool
+):
+    """Create a table with only the latest FY statement per symbol.
+
+    Triggers on the source table keep it up-to-date on write so that readers
+    don't have to find the latest fiscal year across all of history.
+    """
+    if reset:
+        db.execute(f"DROP TABLE IF EXISTS {latest_table};")
+    elif _table_exists(db, latest_table):
+        logging.warning(f"{latest_table} already exists, skipping")
+        return
+
+    # The trigger and table types must match the source table, so copy the
+    # declared types from there.
+    types = {row[1]: row[2] for row in db.execute(f"PRAGMA table_info({table});")}
+    column_defs = ",\n".join(
+        f'"{column}" {types[column]}' for column in columns if column != "symbol"
+    )
+    column_names = ", ".join(f'"{column}"' for column in columns)
+    new_values = ", ".join(f'NEW."{column}"' for column in columns)
+    updates = ",\n".join(
+        f'"{column}" = excluded."{column}"' for column in columns if column != "symbol"
+    )
+    upsert = f"""
+        INSERT INTO {latest_table} ({column_names})
+        VALUES ({new_values})
+        ON CONFLICT (symbol) DO UPDATE SET
+            {updates}
+        WHERE excluded."fiscalYear" >= {latest_table}."fiscalYear";
+    """
+
+    db.execute(
+        f"""
+        CREATE TABLE {latest_table} (
+            "symbol" TEXT PRIMARY KEY,
+            {column_defs}
+        );
+        """
+    )
+    for action in ("INSERT", "UPDATE"):
+        db.execute(f"DROP TRIGGER IF EXISTS {latest_table}_{action.lower()};")
+        db.execute(
+            f"""
+            CREATE TRIGGER {latest_table}_{action.lower()}
+            AFTER {action} ON {table}
+            WHEN NEW."period" = 'FY'
+            BEGIN
+                {upsert}
+            END;
+            """
+        )
+
+    # Statements are rarely deleted, but if the latest one is, fall back to
+    # the next most recent.
+    db.execute(f"DROP TRIGGER IF EXISTS {latest_table}_delete;")
+    db.execute(
+        f"""
+        CREATE TRIGGER {latest_table}_delete
+        AFTER DELETE ON {table}
+        WHEN OLD."period" = 'FY'
+        BEGIN
+            DELETE FROM {latest_table}
+            WHERE "symbol" = OLD."symbol"
+            AND "fiscalYear" = OLD."fiscalYear";
+
+            INSERT OR IGNORE INTO {latest_table} ({column_names})
+            SELECT {column_names}
+            FROM {table}
+            WHERE "symbol" = OLD."symbol"
+            AND "period" = 'FY'
+            ORDER BY "fiscalYear" DESC
+            LIMIT 1;
+        END;
+        """
+    )
+
+    # Backfill from any statements we already have.
+    db.execute(
+        f"""
+        INSERT INTO {latest_table} ({column_names})
+        SELECT {column_names}
+        FROM (
+            SELECT
+                {column_names},
+                ROW_NUMBER() OVER (
+                    PARTITION BY "symbol"
+                    ORDER BY "fiscalYear" DESC
+                ) AS rn
+            FROM {table}
+            WHERE "period" = 'FY'
+        )
+        WHERE rn = 1;
+        """
+    )
+    db.commit()
+
+
+def create_latest_fy_balance_sheet(db, *, reset: bool):
+    _create_latest_fy(
+        db,
+        table="balance_sheet",
+        latest_table="latest_fy_balance_sheet",
+        columns=LATEST_FY_BALANCE_SHEET_COLUMNS,
+        reset=reset,
+    )
+
+
+def create_latest_fy_income(db, *, reset: bool):
+    _create_latest_fy(
+        db,
+        table="income",
+        latest_table="latest_fy_income",
+        columns=LATEST_FY_INCOME_COLUMNS,
+        reset=reset,
+    )
+
+
 def create_symbols(db, *, reset: bool):
     if reset:
         db.execute("DROP TABLE IF EXISTS symbol;")
@@ -283,3 +663,186 @@ def is_fresh(*, table: str, symbol: str, max_last_updated_us: int) -> bool:
         and previous_last_updated[0] is not None
         and previous_last_updated[0] > max_last_updated_us
     )
+
+
+# STRICT tables only allow a few types, so map our declared types to those.
+# https://www.sqlite.org/stricttables.html
+_CANONICAL_TYPES = {
+    "BOOLEAN": "INTEGER",
+    "INTEGER": "INTEGER",
+    "REAL": "REAL",
+    # Note: STRING isn't a SQLite type, so it gets NUMERIC affinity, which
+    # converts symbols like "600519" to integers.
+    "STRING": "TEXT",
+    "TEXT": "TEXT",
+}
+
+
+def canonical_type(declared_type: str) -> str:
+    return _CANONICAL_TYPES.get(declared_type.upper(), "ANY")
+
+
+def is_strict(db, table: str) -> bool:
+    row = db.execute(
+        "SELECT strict FROM pragma_table_list WHERE name = :table;",
+        {"table": table},
+    ).fetchone()
+    return bool(row and row[0])
+
+
+def _strict_cast(column: str, column_type: str) -> str:
+    if column_type in ("INTEGER", "REAL"):
+        return f"""
+            CASE
+                WHEN trim("{column}") = '' THEN NULL
+                ELSE CAST("{column}" AS {column_type})
+            END
+            """
+    if column_type == "TEXT":
+        return f'CAST("{column}" AS TEXT)'
+    return f'"{column}"'
+
+
+def convert_to_strict(db, table: str):
+    """Rebuild a table as a STRICT table with canonical column types.
+
+    See "Making Other Kinds Of Table Schema Changes" at
+    https://www.sqlite.org/lang_altertable.html for the steps.
+    """
+    if is_strict(db, table):
+        logging.warning(f"{table} is already STRICT, skipping")
+        return
+
+    columns = db.execute(f"PRAGMA table_info({table});").fetchall()
+    indexes_and_triggers = [
+        row[0]
+        for row in db.execute(
+            """
+            SELECT sql
+            FROM sqlite_master
+            WHERE tbl_name = :table
+            AND type IN ('index', 'trigger')
+            AND sql IS NOT NULL;
+            """,
+            {"table": table},
+        )
+    ]
+
+    column_defs = []
+    primary_key = []
+    for _, name, declared_type, not_null, default, pk in columns:
+        column_def = f'"{name}" {canonical_type(declared_type)}'
+        if not_null:
+            column_def += " NOT NULL"
+        if default is not None:
+            column_def += f" DEFAULT {default}"
+        column_defs.append(column_def)
+        if pk:
+            primary_key.append((pk, name))
+    if primary_key:
+        pk_columns = ", ".join(f'"{name}"' for _, name in sorted(primary_key))
+        column_defs.append(f"PRIMARY KEY ({pk_columns})")
+
+    column_names = ", ".join(f'"{column[1]}"' for column in columns)
+    casts = ", ".join(
+        _strict_cast(column[1], canonical_type(column[2])) for column in columns
+    )
+    column_defs_sql = ",\n".join(column_defs)
+    db.execute(f"DROP TABLE IF EXISTS {table}__strict;")
+    db.execute(f"CREATE TABLE {table}__strict ({column_defs_sql}) STRICT;")
+
+    # OR REPLACE, because values that were stored with the wrong type, such
+    # as a symbol stored as an integer, might collide once cast.
+    db.execute(
+        f"""
+        INSERT OR REPLACE INTO {table}__strict ({column_names})
+        SELECT {casts} FROM {table};
+        """
+    )
+    db.execute(f"DROP TABLE {table};")
+    db.execute(f"ALTER TABLE {table}__strict RENAME TO {table};")
+    for sql in indexes_and_triggers:
+        db.execute(sql)
+
+
+def convert_all_to_strict(db):
+    """Switch to typed storage by converting every table to STRICT.
+
+    Safe to re-run, such as after a migration adds new tables.
+    """
+    tables = [
+        row[0]
+        for row in db.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
+        )
+    ]
+
+    # Triggers on one table can reference another, so don't check references
+    # while tables are being swapped out.
+    db.execute("PRAGMA legacy_alter_table = ON;")
+    try:
+        for table in tables:
+            if not is_strict(db, table):
+                logging.info(f"Converting {table} to STRICT")
+                convert_to_strict(db, table)
+        db.commit()
+    finally:
+        db.execute("PRAGMA legacy_alter_table = OFF;")
+
+
+def _to_integer(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return round(value) if math.isfinite(value) else None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return _to_integer(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_real(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def table_column_types(db, table: str) -> dict[str, str]:
+    """Map each column of table to its canonical type."""
+    return {
+        row[1]: canonical_type(row[2])
+        for row in db.execute(f"PRAGMA table_info({table});")
+    }
+
+
+def normalize_values(column_types: dict[str, str], rows: list[dict]) -> list[dict]:
+    """Like normalize_rows, but with column types from table_column_types.
+
+    This doesn't need a database connection, so it can run in another
+    process.
+    """
+    converters = {"INTEGER": _to_integer, "REAL": _to_real}
+
+    for row in rows:
+        for key, value in row.items():
+            converter = converters.get(column_types.get(key))
+            if converter is None or value is None:
+                continue
+            row[key] = None if value == "" else converter(value)
+    return rows
+
+
+def normalize_rows(db, table: str, rows: list[dict]) -> list[dict]:
+    """Coerce values in rows to the canonical types of the table's columns.
+
+    STRICT tables reject values that can't be converted losslessly, such as
+    empty strings or fractional values in INTEGER columns. Rows are modified
+    in place and returned for convenience.
+    """
+    return normalize_values(table_column_types(db, table), rows)
@@ -15,12 +15,20 @@
 from __future__ import annotations
 
 import dataclasses
-import sqlite3
+import hashlib
+import os
+import threading
+from typing import Iterator
 
 import numpy.random
 import polars
 
 import stockdice.config
+import stockdice.forex
+import stockdice.loader
+import stockdice.manifest
+import stockdice.readpool
+import stockdice.snapshot_cache
 
 
 @dataclasses.dataclass
@@ -28,39 +36,39 @@ class _Tables:
     company_profile: polars.DataFrame
     most_recent_fy_balance_sheet: polars.DataFrame
     most_recent_fy_income: polars.DataFrame
-    forex: polars.DataFrame
-
-
-def _load_dfs() -> _Tables:
-    # TODO: we might be able to use read_database_uri if we're more careful
-    # about what types we store in each column.
-    with sqlite3.connect(
-        stockdice.config.config.replica_db_path, autocommit=False
-    ) as db:
-        try:
-            # End the transaction that was started automatically.
-            db.execute("ROLLBACK;")
-        except sqlite3.OperationalError:
-            # Transaction might not have been started.
-            pass
-        # Enable Write-Ahead Logging for greater concurrency.
-        # https://stackoverflow.com/a/39265148/101923
-        db.execute("PRAGMA journal_mode=WAL")
-        db.execute("BEGIN TRANSACTION;")
+    usd_rates: polars.DataFrame
 
+
+_TABLES = (
+    "company_profile",
+    "forex",
+    "forex_history",
+    "latest_fy_balance_sheet",
+    "latest_fy_income",
+)
+
+
+def _load_dfs(replica_db_path=None, *, arrow: bool | None = None) -> _Tables:
+    if replica_db_path is None:
+        replica_db_path = stockdice.config.config.replica_db_path
+
+    with (
+        stockdice.readpool.connection(replica_db_path) as db,
+        stockdice.loader.connect(
+            db, replica_db_path, tables=_TABLES, arrow=arrow
+        ) as reader,
+    ):
         company_profile_query = """
             SELECT *
             FROM company_profile
             WHERE isEtf = false
             AND isFund = false;
             """
-        company_profile = polars.read_database(
-            query=company_profile_query, connection=db
-        )
-        forex = polars.read_database(
-            query="SELECT * FROM forex WHERE to_currency = 'USD';",
-            connection=db,
-        )
+        company_profile = reader.read(company_profile_query)
+        usd_rates = stockdice.forex.load_usd_rates(reader)
+        # The latest_fy_* tables are maintained on write, so there's only one
+        # row per symbol to read. See: stockdice.db._create_latest_fy.
+        # TODO: how to handle quarterly reports?
         balance_sheet_query = """
             SELECT
                 symbol,
@@ -71,32 +79,9 @@ def _load_dfs() -> _Tables:
                 totalAssets,
                 totalLiabilities,
                 last_updated_us
-            FROM (
-                SELECT
-                    symbol,
-                    fiscalYear,
-                    period,
-                    date,
-                    reportedCurrency,
-                    totalAssets,
-                    totalLiabilities,
-                    last_updated_us,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY symbol
-                        ORDER BY fiscalYear DESC
-                    ) as rn
-                FROM
-                    balance_sheet
-                WHERE
-                    -- TODO: how to handle quarterly reports?
-                    period = 'FY'
-            )
-            WHERE
-                rn = 1;
+            FROM latest_fy_balance_sheet;
             """
-        most_recent_fy_balance_sheet = polars.read_database(
-            query=balance_sheet_query, connection=db
-        )
+        most_recent_fy_balance_sheet = reader.read(balance_sheet_query)
         income_query = """
             SELECT
                 symbol,
@@ -107,72 +92,274 @@ def _load_dfs() -> _Tables:
                 revenue,
                 netIncome,
                 last_updated_us
-            FROM (
-                SELECT
-                    symbol,
-                    fiscalYear,
-                    period,
-                    date,
-                    reportedCurrency,
-                    revenue,
-                    netIncome,
-                    last_updated_us,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY symbol
-                        ORDER BY fiscalYear DESC
-                    ) as rn
-                FROM
-                    income
-                WHERE
-                    -- TODO: how to handle quarterly reports?
-                    period = 'FY'
-            )
-            WHERE
-                rn = 1;
+            FROM latest_fy_income;
             """
-        most_recent_fy_income = polars.read_database(query=income_query, connection=db)
+        most_recent_fy_income = reader.read(income_query)
 
     return _Tables(
         company_profile=company_profile,
-        forex=forex,
+        usd_rates=usd_rates,
         most_recent_fy_balance_sheet=most_recent_fy_balance_sheet,
         most_recent_fy_income=most_recent_fy_income,
     )
 
 
-def roll(*, n: int = 1, weights=None) -> polars.DataFrame:
-    dfs = _load_dfs()
+# Columns of the universe that can be used as weights.
+WEIGHT_COLUMNS = (
+    "marketCapUSD",
+    "revenueUSD",
+    "netIncomeUSD",
+    "totalAssetsUSD",
+)
+
+
+def _universe(dfs: _Tables) -> polars.DataFrame:
+    """Combine the tables into one row per stock, with values in USD."""
+    # Statements are converted at the exchange rate on the date of the report,
+    # all at once.
+    income_usd = stockdice.forex.statements_to_usd(
+        dfs.most_recent_fy_income,
+        dfs.usd_rates,
+        columns=("revenue", "netIncome"),
+    ).select("symbol", "revenueUSD", "netIncomeUSD")
+    balance_sheet_usd = stockdice.forex.statements_to_usd(
+        dfs.most_recent_fy_balance_sheet,
+        dfs.usd_rates,
+        columns=("totalAssets", "totalLiabilities"),
+    ).select("symbol", "totalAssetsUSD", "totalLiabilitiesUSD")
 
-    # Convert currencies to USD
-    company_profile_usd = (
+    # Market cap is current, so convert at the current exchange rate.
+    return (
         dfs.company_profile.join(
-            dfs.forex, left_on="currency", right_on="from_currency", suffix="_forex"
+            stockdice.forex.latest_usd_rates(dfs.usd_rates),
+            left_on="currency",
+            right_on="from_currency",
+            suffix="_forex",
         )
         .select(
             polars.col("symbol"),
             polars.col("companyName"),
+            polars.col("sector"),
             marketCapUSD=polars.col("marketCap") * polars.col("price_forex"),
         )
         .filter(polars.col("marketCapUSD") > 0)
+        .join(income_usd, on="symbol", how="left")
+        .join(balance_sheet_usd, on="symbol", how="left")
         .with_row_index("idx")
     )
 
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class Snapshot:
+    """The universe of stocks from one version of the replica database."""
+
+    version: tuple
+    universe: polars.DataFrame
+    # Cumulative distribution for each of WEIGHT_COLUMNS, precomputed so that
+    # drawing a sample is a binary search.
+    cdfs: dict[str, numpy.ndarray]
+
+    @classmethod
+    def from_universe(cls, version: tuple, universe: polars.DataFrame) -> Snapshot:
+        cdfs = {}
+        for column in WEIGHT_COLUMNS:
+            if column not in universe.columns:
+                continue
+            # Inspired by the numpy implementation of weighted sampling with replacement:
+            # https://github.com/numpy/numpy/blob/f5a6af86acab7fcd1644fad76b5fbe466a0a98dd/numpy/random/mtrand.pyx#L1009-L1015
+            # Stocks with missing or negative values can't be chosen.
+            weight = (
+                universe[column].fill_null(0).clip(lower_bound=0).cast(polars.Float64)
+            )
+            cdfs[column] = (weight / weight.sum()).cum_sum().to_numpy()
+        return cls(version=version, universe=universe, cdfs=cdfs)
+
+
+def snapshot_version(replica_db_path) -> tuple:
+    """Identify the contents of the replica without reading it.
+
+    Replicas downloaded from Cloud Storage are named by their SHA-256, which
+    is the same on every instance and in every process. Otherwise, the
+    replica is replaced rather than modified in place, so a new path,
+    modification time, or size means new data.
+    """
+    sha256 = stockdice.manifest.content_hash_from_path(replica_db_path)
+    if sha256 is not None:
+        return ("sha256", sha256)
+
+    stat = os.stat(replica_db_path)
+    return (str(replica_db_path), stat.st_mtime_ns, stat.st_size)
+
+
+def snapshot_etag(snapshot: Snapshot, *parts) -> str:
+    """An ETag for a response computed from the snapshot and parts."""
+    return hashlib.sha256(repr((snapshot.version, parts)).encode("utf-8")).hexdigest()
+
+
+_snapshot: Snapshot | None = None
+_snapshot_lock = threading.Lock()
+
+
+def load_snapshot(replica_db_path, *, cache_dir=None) -> Snapshot:
+    """Load the universe from the on-disk cache or, if missing, the replica."""
+    if cache_dir is None:
+        cache_dir = stockdice.config.SNAPSHOT_CACHE_DIR
+
+    version = snapshot_version(replica_db_path)
+    universe = stockdice.snapshot_cache.read(cache_dir, version)
+    if universe is None:
+        universe = _universe(_load_dfs(replica_db_path))
+        stockdice.snapshot_cache.write(cache_dir, version, universe)
+    return Snapshot.from_universe(version, universe)
+
+
+def current_snapshot(replica_db_path=None) -> Snapshot:
+    """Get the universe, reloading it only if the replica has changed."""
+    global _snapshot
+
+    if replica_db_path is None:
+        replica_db_path = stockdice.config.config.replica_db_path
+
+    version = snapshot_version(replica_db_path)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _snapshot_lock:
+        # Another thread might have loaded it while we waited for the lock.
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = load_snapshot(replica_db_path)
+        return _snapshot
+
+
+def _check_weights(weights: str | None):
+    if weights is not None and weights not in WEIGHT_COLUMNS:
+        raise ValueError(
+            f"Unsupported weights {repr(weights)}, expected one of {WEIGHT_COLUMNS}"
+        )
+
+
+def sample_indices(
+    snapshot: Snapshot,
+    weights: str | None,
+    n: int,
+    rng: numpy.random.Generator,
+) -> numpy.ndarray:
+    """Choose n row indices of the snapshot universe with replacement."""
+    height = snapshot.universe.height
+    if weights is None:
+        return rng.integers(0, height, size=n)
+
+    targets = rng.uniform(0, 1, size=(n,))
+    idxs = numpy.searchsorted(snapshot.cdfs[weights], targets, side="left")
+    # Rounding errors could make the last value of cdf less than 1.
+    return numpy.minimum(idxs, height - 1)
+
+
+# Columns returned by roll.
+ROLL_COLUMNS = ("symbol", "companyName", "marketCapUSD")
+ROLL_CHUNK_SIZE = 100_000
+
+
+def sample_indices_without_replacement(
+    snapshot: Snapshot,
+    weights: str | None,
+    n: int,
+    rng: numpy.random.Generator,
+) -> numpy.ndarray:
+    """Choose n distinct row indices of the snapshot universe.
+
+    Weighted sampling draws an exponential key with rate equal to each
+    stock's weight and keeps the n smallest, which is equivalent to drawing
+    stocks one at a time and removing each from the pool. See:
+    Efraimidis and Spirakis, "Weighted random sampling with a reservoir".
+    """
+    height = snapshot.universe.height
     if weights is None:
-        samples = company_profile_usd.sample(n=n)
-    else:
-        # Inspired by the numpy implementation of weighted sampling with replacement:
-        # https://github.com/numpy/numpy/blob/f5a6af86acab7fcd1644fad76b5fbe466a0a98dd/numpy/random/mtrand.pyx#L1009-L1015
-        # TODO: support more than just market cap weighted.
-        pdf = (
-            company_profile_usd["marketCapUSD"]
-            / company_profile_usd["marketCapUSD"].sum()
+        if n > height:
+            raise ValueError(f"Can't choose {n} distinct stocks from {height}.")
+        return rng.choice(height, size=n, replace=False)
+
+    weight = numpy.diff(snapshot.cdfs[weights], prepend=0.0)
+    eligible = numpy.count_nonzero(weight > 0)
+    if n > eligible:
+        raise ValueError(
+            f"Can't choose {n} distinct stocks from {eligible} with positive {weights}."
         )
-        cdf = pdf.cum_sum()
-        rng = numpy.random.default_rng()
-        targets = rng.uniform(0, 1, size=(n,))
-        sample_idxs = cdf.search_sorted(targets).to_frame("idx")
-        samples = company_profile_usd.join(sample_idxs, on="idx")
-
-    return samples.select(
-        polars.col("symbol"), polars.col("companyName"), polars.col("marketCapUSD")
-    )
+
+    with numpy.errstate(divide="ignore"):
+        keys = rng.exponential(size=height) / weight
+    idxs = numpy.argpartition(keys, n - 1)[:n] if n else numpy.array([], dtype=int)
+    # Return them in the order they would have been drawn.
+    return idxs[numpy.argsort(keys[idxs])]
+
+
+def _sample(
+    snapshot: Snapshot,
+    weights: str | None,
+    n: int,
+    rng: numpy.random.Generator,
+    *,
+    replace: bool,
+) -> numpy.ndarray:
+    if replace:
+        return sample_indices(snapshot, weights, n, rng)
+    return sample_indices_without_replacement(snapshot, weights, n, rng)
+
+
+def roll(
+    *,
+    n: int = 1,
+    weights: str | None = None,
+    seed: int | None = None,
+    replace: bool = True,
+) -> polars.DataFrame:
+    """Choose n stocks.
+
+    Args:
+        n: Number of stocks to choose.
+        weights:
+            Name of a column in WEIGHT_COLUMNS to weight the stocks by or
+            None to weight all stocks evenly.
+        seed:
+            Seed for the random number generator, for reproducible rolls
+            from the same snapshot.
+        replace:
+            If True, a stock can be chosen more than once. Otherwise, each
+            stock is chosen at most once.
+    """
+    _check_weights(weights)
+    snapshot = current_snapshot()
+    rng = numpy.random.default_rng(seed)
+    idxs = _sample(snapshot, weights, n, rng, replace=replace)
+    return snapshot.universe.select(ROLL_COLUMNS)[idxs]
+
+
+def roll_chunks(
+    *,
+    n: int,
+    weights: str | None = None,
+    seed: int | None = None,
+    replace: bool = True,
+    chunk_size: int = ROLL_CHUNK_SIZE,
+) -> Iterator[polars.DataFrame]:
+    """Choose n stocks, chunk_size rolls at a time.
+
+    Memory use depends on chunk_size rather than n, so this can generate
+    millions of rolls. See roll for the arguments.
+    """
+    _check_weights(weights)
+    snapshot = current_snapshot()
+    universe = snapshot.universe.select(ROLL_COLUMNS)
+    rng = numpy.random.default_rng(seed)
+
+    if not replace:
+        # There can't be more rolls than stocks, so these fit in memory.
+        idxs = sample_indices_without_replacement(snapshot, weights, n, rng)
+        for start in range(0, n, chunk_size):
+            yield universe[idxs[start : start + chunk_size]]
+        return
+
+    for start in range(0, n, chunk_size):
+        idxs = sample_indices(snapshot, weights, min(chunk_size, n - start), rng)
+        yield universe[idxs]
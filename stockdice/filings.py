@@ -0,0 +1,191 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Predict when a company next files its annual financial statements.
+
+Annual statements change about once a year, so there is no need to download
+them daily. Instead, we use the dates from previous filings to guess when the
+next one is due and only download statements while that window is open.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import statistics
+from typing import Iterable
+
+# Used when we don't have any previous filing to learn from. Large accelerated
+# filers have 60 days after the end of the fiscal year to file a 10-K, others
+# have 75 to 90 days.
+DEFAULT_FILING_LAG = datetime.timedelta(days=75)
+
+# Ignore lags outside this range, as they likely come from amended or
+# otherwise unusual filings.
+MIN_FILING_LAG = datetime.timedelta(days=1)
+MAX_FILING_LAG = datetime.timedelta(days=366)
+
+# Start checking a bit before the expected filing date, since companies don't
+# always take the same amount of time each year.
+FILING_WINDOW_LEAD = datetime.timedelta(days=10)
+
+# Keep checking for a while after the expected filing date in case the filing
+# is late or FMP takes a while to process it.
+FILING_WINDOW_GRACE = datetime.timedelta(days=45)
+
+# Safety net: refresh statements at least this often, even if we don't expect
+# a new filing. This catches amendments, restatements, and bad predictions.
+SLOW_SWEEP_MAX_AGE = datetime.timedelta(days=60)
+
+# How many previous fiscal years to consider when estimating the filing lag.
+HISTORY_YEARS = 5
+
+
+@dataclasses.dataclass(frozen=True)
+class FilingPrediction:
+    period_end: datetime.date
+    expected_filing: datetime.date
+    window_start: datetime.date
+    window_end: datetime.date
+
+    def is_window_open(self, today: datetime.date) -> bool:
+        return self.window_start <= today <= self.window_end
+
+
+def _parse_date(value) -> datetime.date | None:
+    if not value:
+        return None
+
+    try:
+        # acceptedDate includes a time, such as "2024-11-01 06:01:36".
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _add_year(value: datetime.date) -> datetime.date:
+    try:
+        return value.replace(year=value.year + 1)
+    except ValueError:
+        # February 29th.
+        return value.replace(year=value.year + 1, day=28)
+
+
+def predict_next_filing(statements: Iterable[tuple]) -> FilingPrediction | None:
+    """Predict the next annual filing from previous ones.
+
+    Args:
+        statements:
+            Rows of (fiscalYear, date, filingDate, acceptedDate) for annual
+            statements, in any order.
+
+    Returns:
+        The predicted filing window or None if there are no dated statements.
+    """
+    latest_fiscal_year = None
+    latest_period_end = None
+    lags = []
+
+    for fiscal_year, date, filing_date, accepted_date in statements:
+        period_end = _parse_date(date)
+        if period_end is None:
+            continue
+
+        if latest_period_end is None or (fiscal_year or 0, period_end) > (
+            latest_fiscal_year or 0,
+            latest_period_end,
+        ):
+            latest_fiscal_year = fiscal_year
+            latest_period_end = period_end
+
+        filed = _parse_date(filing_date) or _parse_date(accepted_date)
+        if filed is None:
+            continue
+
+        lag = filed - period_end
+        if MIN_FILING_LAG <= lag <= MAX_FILING_LAG:
+            lags.append(lag)
+
+    if latest_period_end is None:
+        return None
+
+    lag = statistics.median_low(lags) if lags else DEFAULT_FILING_LAG
+    period_end = _add_year(latest_period_end)
+    expected_filing = period_end + lag
+    return FilingPrediction(
+        period_end=period_end,
+        expected_filing=expected_filing,
+        # Can't file before the end of the fiscal year.
+        window_start=max(period_end, expected_filing - FILING_WINDOW_LEAD),
+        window_end=expected_filing + FILING_WINDOW_GRACE,
+    )
+
+
+def should_download(
+    *,
+    prediction: FilingPrediction | None,
+    last_updated_us: int | None,
+    now_us: int,
+    max_age: datetime.timedelta,
+) -> bool:
+    if last_updated_us is None:
+        return True
+
+    age = datetime.timedelta(microseconds=now_us - last_updated_us)
+    if age <= max_age:
+        return False
+
+    if age > SLOW_SWEEP_MAX_AGE:
+        return True
+
+    # Without any previous filings, there's nothing to predict from, so fall
+    # back to refreshing whenever the data is older than max_age.
+    if prediction is None:
+        return True
+
+    now = datetime.datetime.fromtimestamp(now_us / 1_000_000, datetime.timezone.utc)
+    return prediction.is_window_open(now.date())
+
+
+def is_statement_due(
+    db, *, table: str, symbol: str, now_us: int, max_age: datetime.timedelta
+) -> bool:
+    """Check if we should download the statements in table for symbol."""
+    last_updated = db.execute(
+        f"""
+        SELECT last_updated_us
+        FROM {table}
+        WHERE symbol = :symbol
+        ORDER BY last_updated_us DESC
+        LIMIT 1;
+        """,
+        {"symbol": symbol},
+    ).fetchone()
+    history = db.execute(
+        f"""
+        SELECT fiscalYear, date, filingDate, acceptedDate
+        FROM {table}
+        WHERE symbol = :symbol
+        AND period = 'FY'
+        ORDER BY fiscalYear DESC
+        LIMIT {HISTORY_YEARS};
+        """,
+        {"symbol": symbol},
+    ).fetchall()
+    return should_download(
+        prediction=predict_next_filing(history),
+        last_updated_us=last_updated[0] if last_updated else None,
+        now_us=now_us,
+        max_age=max_age,
+    )
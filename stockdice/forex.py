@@ -16,49 +16,283 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import collections
 import datetime
 import logging
+from typing import Iterable
 
 import httpx
+import polars
 
 import stockdice.ratelimits
+import stockdice.coalesce
 import stockdice.config
+import stockdice.db
+import stockdice.loader
+import stockdice.negative_cache
 import stockdice.timeutils
 
 
-FMP_FOREX_LIST = "https://financialmodelingprep.com/stable/forex-list?apikey={apikey}"
-FMP_FOREX_QUOTE = (
-    "https://financialmodelingprep.com/stable/quote?symbol={symbol}&apikey={apikey}"
-)
+FMP_FOREX_LIST = "https://financialmodelingprep.com/stable/forex-list"
+# https://site.financialmodelingprep.com/developer/docs/stable/forex-historical-price-eod-light
+FMP_FOREX_HISTORY = "https://financialmodelingprep.com/stable/historical-price-eod/light?symbol={symbol}&from={start}"
 
-forex_to_usd = None
+# How far back to download exchange rates, so that we can convert financial
+# statements at the rate on the date they were reported.
+FOREX_HISTORY = datetime.timedelta(days=10 * 365)
 
+# If the history for a pair doesn't go back at least this far, it's only got
+# the daily quotes we've recorded ourselves, so download the full history.
+FOREX_HISTORY_MIN_AGE = datetime.timedelta(days=30)
 
-def load_forex():
-    global forex_to_usd
-    forex_to_usd = {"USD": 1.0}
 
-    db = stockdice.config.config.db
-    rows = db.execute(
-        """
-        SELECT from_currency, price
-        FROM forex
-        WHERE to_currency = 'USD'
-        """
+# When there's no direct quote, prefer triangulating through the most liquid
+# currencies.
+HUB_CURRENCIES = ("EUR", "JPY", "GBP", "CNY", "CHF", "CAD", "AUD")
+
+
+def currency_paths(
+    pairs: Iterable[tuple[str, str, str]], *, base: str = "USD"
+) -> dict[str, list[tuple[str, int]]]:
+    """Find the shortest chain of pairs from each currency to base.
+
+    Args:
+        pairs: Rows of (symbol, from_currency, to_currency).
+        base: The currency to convert to.
+
+    Returns:
+        Mapping from currency to the path of (symbol, exponent) to convert it
+        to base. The rate to base is the product of each pair's price raised
+        to the exponent: 1 when going from the pair's from_currency to its
+        to_currency and -1 when going in the opposite direction.
+    """
+    neighbors: dict[str, list[tuple[str, str, int]]] = collections.defaultdict(list)
+    for symbol, from_currency, to_currency in pairs:
+        if not from_currency or not to_currency or from_currency == to_currency:
+            continue
+        # Moving from from_currency towards to_currency multiplies by price.
+        neighbors[to_currency].append((from_currency, symbol, 1))
+        neighbors[from_currency].append((to_currency, symbol, -1))
+
+    def preference(edge):
+        currency, symbol, _ = edge
+        hub = (
+            HUB_CURRENCIES.index(currency)
+            if currency in HUB_CURRENCIES
+            else len(HUB_CURRENCIES)
+        )
+        return hub, currency, symbol
+
+    # Breadth-first search finds the paths with the fewest pairs, which
+    # minimizes both the number of quotes needed and compounding errors.
+    paths: dict[str, list[tuple[str, int]]] = {base: []}
+    queue = collections.deque([base])
+    while queue:
+        currency = queue.popleft()
+        for neighbor, symbol, exponent in sorted(neighbors[currency], key=preference):
+            if neighbor in paths:
+                continue
+            paths[neighbor] = [(symbol, exponent)] + paths[currency]
+            queue.append(neighbor)
+    return paths
+
+
+def spanning_pairs(
+    pairs: Iterable[tuple[str, str, str]], *, base: str = "USD"
+) -> list[str]:
+    """Find a minimal set of pairs to quote to convert every currency to base."""
+    paths = currency_paths(pairs, base=base)
+    # Each currency's path is its first pair plus its parent's path, so the
+    # first pairs form a spanning tree.
+    return sorted({path[0][0] for path in paths.values() if path})
+
+
+def usd_rates(pairs: polars.DataFrame, prices: polars.DataFrame) -> polars.DataFrame:
+    """Derive every currency's rate to USD on each date.
+
+    Currencies without a direct quote to USD are converted through other
+    currencies, such as THB to EUR to USD.
+
+    Args:
+        pairs: Forex pairs with "symbol", "from_currency", and "to_currency".
+        prices: Quotes with "symbol", "date", and "price" columns.
+
+    Returns:
+        Rates with "from_currency", "date", and "price" columns. Only dates
+        where every pair in a currency's path has a quote are included.
+    """
+    prices = prices.filter(polars.col("price") > 0).unique(
+        subset=["symbol", "date"], keep="last", maintain_order=True
+    )
+    quoted = set(prices["symbol"].to_list())
+    paths = currency_paths(
+        row
+        for row in pairs.select("symbol", "from_currency", "to_currency").iter_rows()
+        if row[0] in quoted
+    )
+    path_edges = polars.DataFrame(
+        [
+            (currency, symbol, exponent, len(path))
+            for currency, path in paths.items()
+            for symbol, exponent in path
+        ],
+        schema={
+            "from_currency": polars.String,
+            "symbol": polars.String,
+            "exponent": polars.Int8,
+            "path_length": polars.UInt32,
+        },
+        orient="row",
+    )
+    return (
+        path_edges.join(prices, on="symbol")
+        .group_by("from_currency", "date")
+        .agg(
+            log_rate=(polars.col("exponent") * polars.col("price").log()).sum(),
+            hops=polars.len(),
+            path_length=polars.col("path_length").first(),
+        )
+        .filter(polars.col("hops") == polars.col("path_length"))
+        .select(
+            polars.col("from_currency"),
+            polars.col("date"),
+            price=polars.col("log_rate").exp(),
+        )
+        .sort("from_currency", "date")
+    )
+
+
+def latest_usd_rates(rates: polars.DataFrame) -> polars.DataFrame:
+    """Pick the most recent rate to USD for each currency, including USD."""
+    return polars.concat(
+        [
+            rates.sort("date")
+            .group_by("from_currency")
+            .agg(polars.col("price").last())
+            .filter(polars.col("from_currency") != "USD"),
+            polars.DataFrame(
+                {"from_currency": ["USD"], "price": [1.0]},
+                schema={"from_currency": polars.String, "price": polars.Float64},
+            ),
+        ]
     )
-    for row in rows:
-        from_currency, price = row
-        forex_to_usd[from_currency] = price
 
 
-def to_usd(*, curr, value):
-    if forex_to_usd is None:
-        load_forex()
-    if curr is None or curr != curr or curr in {"None", "unknown"}:
-        # Assume USD? None usually corresponds to no reported value.
-        return value
+def statements_to_usd(
+    statements: polars.DataFrame,
+    forex_history: polars.DataFrame,
+    *,
+    columns: Iterable[str],
+) -> polars.DataFrame:
+    """Convert financial statement values to USD as of the report date.
 
-    return forex_to_usd[curr] * value
+    Args:
+        statements:
+            Must contain "reportedCurrency" and "date" (ISO 8601 string or
+            date) columns, plus the value columns to convert.
+        forex_history:
+            Rates to USD, with "from_currency", "date", and "price" columns, as
+            returned by usd_rates.
+        columns:
+            The value columns to convert. Adds a "{column}USD" column for each.
+
+    Returns:
+        The statements with the additional USD columns, in the same order.
+    """
+    columns = tuple(columns)
+    rates = (
+        polars.concat(
+            [
+                forex_history.select(
+                    _currency=polars.col("from_currency"),
+                    _rate_date=polars.col("date")
+                    .cast(polars.String)
+                    .str.to_date(strict=False),
+                    _rate=polars.col("price").cast(polars.Float64),
+                ),
+                polars.DataFrame(
+                    {
+                        "_currency": ["USD"],
+                        "_rate_date": [datetime.date(1970, 1, 1)],
+                        "_rate": [1.0],
+                    },
+                    schema={
+                        "_currency": polars.String,
+                        "_rate_date": polars.Date,
+                        "_rate": polars.Float64,
+                    },
+                ),
+            ]
+        )
+        .drop_nulls()
+        .sort("_rate_date")
+    )
+
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    converted = (
+        statements.with_row_index("_row")
+        .with_columns(
+            # Assume USD? None usually corresponds to no reported value.
+            _currency=polars.col("reportedCurrency")
+            .replace(["None", "unknown"], None)
+            .fill_null("USD"),
+            # Without a report date, use the latest rate.
+            _date=polars.col("date")
+            .cast(polars.String)
+            .str.to_date(strict=False)
+            .fill_null(today),
+        )
+        .sort("_date")
+        .join_asof(
+            rates,
+            left_on="_date",
+            right_on="_rate_date",
+            by="_currency",
+            # Use the closest rate, so that statements from before our history
+            # starts still get converted.
+            strategy="nearest",
+            check_sortedness=False,
+        )
+        .with_columns(
+            [
+                (polars.col(column) * polars.col("_rate")).alias(f"{column}USD")
+                for column in columns
+            ]
+        )
+        .sort("_row")
+    )
+    return converted.select(
+        *statements.columns, *(f"{column}USD" for column in columns)
+    )
+
+
+def load_usd_rates(reader: stockdice.loader.Reader) -> polars.DataFrame:
+    """Load rates to USD by date, including the latest quote for each pair."""
+    pairs = reader.read(
+        """
+        SELECT symbol, from_currency, to_currency
+        FROM forex
+        WHERE from_currency IS NOT NULL
+        AND to_currency IS NOT NULL;
+        """
+    )
+    prices = reader.read(
+        """
+        SELECT symbol, date, price
+        FROM forex_history
+        UNION ALL
+        SELECT
+            symbol,
+            COALESCE(
+                date(last_updated_us / 1000000, 'unixepoch'),
+                date('now')
+            ) AS date,
+            price
+        FROM forex
+        WHERE price IS NOT NULL;
+        """
+    )
+    return usd_rates(pairs, prices)
 
 
 async def download_forex(
@@ -66,23 +300,37 @@ async def download_forex(
     max_age: datetime.timedelta = datetime.timedelta(days=1),
     client: httpx.AsyncClient,
 ):
-    all_symbols = await download_forex_list(client=client)
+    all_pairs = await download_forex_list(client=client)
+
+    # Other rates can be derived from these, so we only need to spend API
+    # requests on them.
+    symbols = spanning_pairs(all_pairs)
+    logging.info(
+        f"Quoting {len(symbols)} of {len(all_pairs)} forex pairs "
+        "to convert every currency to USD."
+    )
+    # Quotes for all pairs are combined into a few batch requests.
+    quotes = stockdice.coalesce.Coalescer(stockdice.coalesce.FMP_BATCH_QUOTE)
     return await asyncio.gather(
         *[
-            download_forex_quote(client=client, symbol=symbol, max_age=max_age)
-            for symbol in all_symbols
-        ]
+            download_forex_quote(
+                client=client, symbol=symbol, max_age=max_age, quotes=quotes
+            )
+            for symbol in symbols
+        ],
+        *[download_forex_history(client=client, symbol=symbol) for symbol in symbols],
     )
 
 
 @stockdice.ratelimits.retry_fmp
 async def download_forex_list(*, client: httpx.AsyncClient):
     db = stockdice.config.config.db
-    url = FMP_FOREX_LIST.format(apikey=stockdice.config.FMP_API_KEY)
-    symbols = []
+    url = FMP_FOREX_LIST
+    pairs = []
 
     resp = await stockdice.ratelimits.get(client, url)
     resp_json = stockdice.ratelimits.check_status(resp)
+    stockdice.db.end_read_transaction(db)
     for forex in resp_json:
         symbol = forex.get("symbol")
         from_currency = forex.get("fromCurrency")
@@ -90,9 +338,13 @@ async def download_forex_list(*, client: httpx.AsyncClient):
         from_name = forex.get("fromName")
         to_name = forex.get("toName")
 
-        if to_currency is None or to_currency.upper() != "USD":
+        if symbol is None or from_currency is None or to_currency is None:
             continue
 
+        # Keep all pairs, not just those to USD, so that we can triangulate
+        # rates for currencies without a direct quote.
+        from_currency = from_currency.upper()
+        to_currency = to_currency.upper()
         db.execute(
             """INSERT INTO forex
             (symbol, from_currency, to_currency, from_name, to_name)
@@ -111,17 +363,22 @@ async def download_forex_list(*, client: httpx.AsyncClient):
                 "to_name": to_name,
             },
         )
-        db.commit()
-        symbols.append(symbol)
+        pairs.append((symbol, from_currency, to_currency))
 
-    return symbols
+    db.commit()
+    return pairs
 
 
-@stockdice.ratelimits.retry_fmp
 async def download_forex_quote(
-    *, client: httpx.AsyncClient, symbol: str, max_age: datetime.timedelta
+    *,
+    client: httpx.AsyncClient,
+    symbol: str,
+    max_age: datetime.timedelta,
+    quotes: stockdice.coalesce.Coalescer | None = None,
 ):
     db = stockdice.config.config.db
+    if quotes is None:
+        quotes = stockdice.coalesce.Coalescer(stockdice.coalesce.FMP_BATCH_QUOTE)
 
     now_us = stockdice.timeutils.now_in_microseconds()
     last_updated = db.execute(
@@ -129,22 +386,26 @@ async def download_forex_quote(
     ).fetchone()
     if (
         last_updated
+        and last_updated[0] is not None
         and datetime.timedelta(microseconds=now_us - last_updated[0]) <= max_age
     ):
         logging.debug(f"Data already fresh, skipping forex for {symbol}.")
         return
 
-    url = FMP_FOREX_QUOTE.format(symbol=symbol, apikey=stockdice.config.FMP_API_KEY)
-    resp = await stockdice.ratelimits.get(client, url)
-    resp_json = stockdice.ratelimits.check_status(resp)
-    if resp_json:
-        price = resp_json[0].get("price")
+    # Retries are handled by the coalescer.
+    quote = await quotes.get(client, symbol)
+    price = None
+    timestamp = None
+    if quote:
+        price = quote.get("price")
+        timestamp = quote.get("timestamp")
 
     if price is None:
         logging.warning(f"no price for {symbol}")
     else:
         price = float(price)
 
+    stockdice.db.end_read_transaction(db)
     db.execute(
         """INSERT INTO forex
         (symbol, price, last_updated_us)
@@ -159,6 +420,82 @@ async def download_forex_quote(
             "last_updated_us": now_us,
         },
     )
+
+    if price is not None:
+        quote_time = (
+            datetime.datetime.fromtimestamp(int(timestamp), datetime.timezone.utc)
+            if timestamp
+            else datetime.datetime.now(datetime.timezone.utc)
+        )
+        db.execute(
+            """INSERT INTO forex_history
+            (symbol, date, price)
+            VALUES (:symbol, :date, :price)
+            ON CONFLICT(symbol, date) DO UPDATE
+            SET price=excluded.price
+            """,
+            {
+                "symbol": symbol,
+                "date": quote_time.date().isoformat(),
+                "price": price,
+            },
+        )
+    db.commit()
+
+
+@stockdice.ratelimits.retry_fmp
+async def download_forex_history(*, client: httpx.AsyncClient, symbol: str):
+    db = stockdice.config.config.db
+
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    earliest = db.execute(
+        "SELECT MIN(date) FROM forex_history WHERE symbol = :symbol",
+        {"symbol": symbol},
+    ).fetchone()
+    if (
+        earliest
+        and earliest[0] is not None
+        and datetime.date.fromisoformat(earliest[0]) <= today - FOREX_HISTORY_MIN_AGE
+    ):
+        logging.debug(f"Already have history, skipping forex_history for {symbol}.")
+        return
+
+    now_us = stockdice.timeutils.now_in_microseconds()
+    if stockdice.negative_cache.is_suppressed(
+        db, "forex_history", symbol=symbol, now_us=now_us
+    ):
+        logging.debug(f"Recently had no data, skipping forex_history for {symbol}.")
+        return
+
+    url = FMP_FOREX_HISTORY.format(
+        symbol=symbol,
+        start=(today - FOREX_HISTORY).isoformat(),
+    )
+    resp = await stockdice.ratelimits.get(client, url)
+    resp_json = stockdice.ratelimits.check_status(resp)
+    rows = [
+        {"symbol": symbol, "date": row["date"], "price": float(row["price"])}
+        for row in resp_json or ()
+        if row.get("date") and row.get("price") is not None
+    ]
+    stockdice.db.end_read_transaction(db)
+    if not rows:
+        logging.info(f"No forex_history data available for {symbol}.")
+        stockdice.negative_cache.record_miss(
+            db, "forex_history", symbol=symbol, now_us=now_us
+        )
+        db.commit()
+        return
+
+    db.executemany(
+        """INSERT INTO forex_history
+        (symbol, date, price)
+        VALUES (:symbol, :date, :price)
+        ON CONFLICT(symbol, date) DO NOTHING
+        """,
+        rows,
+    )
+    stockdice.negative_cache.record_hit(db, "forex_history", symbol=symbol)
     db.commit()
 
 
@@ -0,0 +1,43 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Health checks for the hosting platform."""
+
+from __future__ import annotations
+
+import flask
+
+import stockdice.warmup
+
+
+bp = flask.Blueprint("health", __name__)
+
+
+@bp.route("/healthz")
+def healthz():
+    # Only checks that the process can serve requests, so it must stay cheap.
+    return {"status": "ok"}
+
+
+@bp.route("/readyz")
+def readyz():
+    if stockdice.warmup.is_ready(flask.current_app):
+        return {"status": "ready"}
+
+    # The error itself is logged by the warm-up thread. Don't expose it, since
+    # it can include paths, bucket names, or SQL.
+    state = flask.current_app.extensions[stockdice.warmup.EXTENSION_KEY]
+    if state.error is not None:
+        return {"status": "retrying"}, 503
+    return {"status": "warming up"}, 503
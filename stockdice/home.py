@@ -14,8 +14,8 @@
 
 import flask
 
-from stockdice import dice
 from stockdice import render
+from stockdice import rollpool
 
 
 bp = flask.Blueprint("home", __name__)
@@ -38,21 +38,21 @@ def customize():
 
 @bp.route("/en/roll-uniform/")
 def roll_uniform():
-    result = dice.roll()
+    result = rollpool.roll_one()
     return render.render_template(
         "roll.html.j2",
-        symbol=result["symbol"].item(),
-        company_name=result["companyName"].item(),
-        market_cap_usd=int(result["marketCapUSD"].item()),
+        symbol=result["symbol"],
+        company_name=result["companyName"],
+        market_cap_usd=int(result["marketCapUSD"]),
     )
 
 
 @bp.route("/en/roll-market-cap/")
 def roll_market_cap():
-    result = dice.roll(weights=True)
+    result = rollpool.roll_one(weights="marketCapUSD")
     return render.render_template(
         "roll.html.j2",
-        symbol=result["symbol"].item(),
-        company_name=result["companyName"].item(),
-        market_cap_usd=int(result["marketCapUSD"].item()),
+        symbol=result["symbol"],
+        company_name=result["companyName"],
+        market_cap_usd=int(result["marketCapUSD"]),
     )
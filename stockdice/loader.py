@@ -0,0 +1,121 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Read query results from the SQLite database into polars DataFrames.
+
+If the adbc-driver-sqlite package is installed and the tables are STRICT (see
+stockdice.db.convert_all_to_strict), columns are read directly into Arrow
+without going through Python row tuples. Otherwise, fall back to reading rows
+with the sqlite3 module.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import importlib.util
+import sqlite3
+from typing import Iterable, Iterator, Protocol
+
+import polars
+
+import stockdice.db
+import stockdice.readpool
+
+
+# The ADBC driver infers column types from the first batch of rows. Read
+# everything in one batch so that a column which starts with NULLs isn't
+# assumed to be an integer column.
+ARROW_BATCH_ROWS = 10_000_000
+
+
+@functools.cache
+def _has_adbc() -> bool:
+    # Check without importing, which is slow.
+    return importlib.util.find_spec("adbc_driver_sqlite") is not None
+
+
+class Reader(Protocol):
+    def read(self, query: str) -> polars.DataFrame: ...
+
+
+class CursorReader:
+    """Read rows through the sqlite3 module. Works with any table."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+
+    def read(self, query: str) -> polars.DataFrame:
+        return polars.read_database(query=query, connection=self._db)
+
+
+class ArrowReader:
+    """Read columns directly into Arrow. Requires STRICT tables."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def read(self, query: str) -> polars.DataFrame:
+        import adbc_driver_sqlite
+
+        with self._connection.cursor() as cursor:
+            cursor.adbc_statement.set_options(
+                **{
+                    adbc_driver_sqlite.StatementOptions.BATCH_ROWS.value: str(
+                        ARROW_BATCH_ROWS
+                    )
+                }
+            )
+            cursor.execute(query)
+            return polars.from_arrow(cursor.fetch_arrow_table())
+
+
+def can_read_arrow(db: sqlite3.Connection, tables: Iterable[str]) -> bool:
+    return _has_adbc() and all(stockdice.db.is_strict(db, table) for table in tables)
+
+
+@contextlib.contextmanager
+def connect(
+    db: sqlite3.Connection,
+    path,
+    *,
+    tables: Iterable[str],
+    arrow: bool | None = None,
+) -> Iterator[Reader]:
+    """Choose the fastest way to read from tables in the database at path.
+
+    Args:
+        db: An open connection to the database at path.
+        path: Path to the database file.
+        tables: The tables that will be queried.
+        arrow:
+            Force (True) or disable (False) the Arrow-native reader. By
+            default, use it whenever possible.
+    """
+    if arrow is None:
+        arrow = can_read_arrow(db, tables)
+
+    if not arrow:
+        yield CursorReader(db)
+        return
+
+    if not _has_adbc():
+        raise ImportError("Install adbc-driver-sqlite to read directly into Arrow.")
+
+    import adbc_driver_sqlite.dbapi
+
+    with adbc_driver_sqlite.dbapi.connect(
+        stockdice.readpool.immutable_uri(path)
+    ) as connection:
+        yield ArrowReader(connection)
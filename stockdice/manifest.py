@@ -0,0 +1,159 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Publish and fetch content-addressed replicas through a manifest.
+
+The refresher uploads each backup as an immutable object named by its
+SHA-256 and then points manifest.json at it. Because the manifest is
+written last, readers never see a partially uploaded replica. Readers poll
+only the small manifest and download a replica only when its hash changes,
+so every instance converges on the same version.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+import tempfile
+
+
+MANIFEST_NAME = "manifest.json"
+# Web instances from before the manifest download this object directly.
+LEGACY_REPLICA_NAME = "stockdice_backup.sqlite"
+SNAPSHOT_PREFIX = "snapshots/"
+# Keep a few old replicas in case a reader is still downloading one.
+KEEP_SNAPSHOTS = 5
+_CHUNK_BYTES = 1024 * 1024
+_FILE_NAME_PATTERN = re.compile(r"^stockdice-([0-9a-f]{64})\.sqlite$")
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_file_name(sha256: str) -> str:
+    return f"stockdice-{sha256}.sqlite"
+
+
+def content_hash_from_path(path) -> str | None:
+    """Get the SHA-256 from a path named by snapshot_file_name, if any."""
+    match = _FILE_NAME_PATTERN.match(pathlib.Path(path).name)
+    return match.group(1) if match else None
+
+
+def publish(bucket, path, *, keep: int = KEEP_SNAPSHOTS) -> dict:
+    """Upload the replica at path and point the manifest at it.
+
+    Also overwrite the legacy replica object, so that web instances which
+    don't read the manifest yet stay up to date during a rollout.
+
+    Args:
+        bucket: A google.cloud.storage.Bucket.
+        path: The replica to publish.
+        keep: Number of snapshot objects to keep, including this one.
+
+    Returns:
+        The manifest.
+    """
+    sha256 = file_sha256(path)
+    object_name = f"{SNAPSHOT_PREFIX}{snapshot_file_name(sha256)}"
+    blob = bucket.blob(object_name)
+    # Objects are named by their content, so there's nothing to do if it was
+    # already uploaded.
+    if not blob.exists():
+        blob.upload_from_filename(str(path))
+
+    manifest = {
+        "version": sha256,
+        "object": object_name,
+        "sha256": sha256,
+        "size": os.path.getsize(path),
+        "published": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    manifest_blob = bucket.blob(MANIFEST_NAME)
+    # Readers poll this, so make sure they don't get a cached copy.
+    manifest_blob.cache_control = "no-cache, max-age=0"
+    manifest_blob.upload_from_string(
+        json.dumps(manifest), content_type="application/json"
+    )
+
+    # TODO: Stop uploading this once every reader uses read_manifest.
+    bucket.blob(LEGACY_REPLICA_NAME).upload_from_filename(str(path))
+
+    _prune(bucket, keep=keep, current=object_name)
+    return manifest
+
+
+def _prune(bucket, *, keep: int, current: str):
+    snapshots = sorted(
+        bucket.list_blobs(prefix=SNAPSHOT_PREFIX),
+        key=lambda blob: blob.time_created,
+        reverse=True,
+    )
+    for blob in snapshots[keep:]:
+        if blob.name != current:
+            blob.delete()
+
+
+def read_manifest(bucket) -> dict | None:
+    """Fetch the manifest, or None if the refresher hasn't published one."""
+    import google.api_core.exceptions
+
+    try:
+        return json.loads(bucket.blob(MANIFEST_NAME).download_as_bytes())
+    except google.api_core.exceptions.NotFound:
+        return None
+
+
+def download_snapshot(bucket, manifest: dict, directory=None) -> pathlib.Path:
+    """Download and verify the replica that the manifest points to.
+
+    Returns:
+        Path to the replica, named by snapshot_file_name.
+
+    Raises:
+        ValueError: If the download doesn't match the manifest.
+    """
+    directory = pathlib.Path(directory or tempfile.gettempdir())
+    path = directory / snapshot_file_name(manifest["sha256"])
+    if path.exists() and file_sha256(path) == manifest["sha256"]:
+        return path
+
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as tmp:
+        tmp_path = pathlib.Path(tmp.name)
+    try:
+        bucket.blob(manifest["object"]).download_to_filename(str(tmp_path))
+        size = tmp_path.stat().st_size
+        sha256 = file_sha256(tmp_path)
+        if size != manifest["size"] or sha256 != manifest["sha256"]:
+            raise ValueError(
+                f"Downloaded {manifest['object']} has size {size} and SHA-256 "
+                f"{sha256}, expected {manifest['size']} and {manifest['sha256']}."
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    logging.info(f"Downloaded replica version {manifest['version']}.")
+    return path
@@ -0,0 +1,170 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Remember which symbols FMP has no data for, so we stop asking.
+
+Each dataset has a table named {table}_missing with one row per symbol that
+last returned no data. The retry interval doubles with each miss, so symbols
+that are delisted or never have statements, such as ETFs, cost fewer and fewer
+requests. Any data for the symbol clears the row.
+"""
+
+from __future__ import annotations
+
+import datetime
+
+# Retry the day after the first miss, then wait twice as long each time.
+BASE_RETRY_INTERVAL = datetime.timedelta(days=1)
+
+# Still check occasionally, since symbols can be relisted or start filing.
+MAX_RETRY_INTERVAL = datetime.timedelta(days=64)
+
+DATASETS = ("company_profile", "income", "balance_sheet")
+
+
+def missing_table(table: str) -> str:
+    return f"{table}_missing"
+
+
+def retry_interval(misses: int) -> datetime.timedelta:
+    """How long to wait after the misses-th consecutive miss."""
+    if misses < 1:
+        return datetime.timedelta(0)
+    # Stop doubling once past the maximum, which also keeps timedelta from
+    # overflowing for symbols that have been missing for a long time.
+    interval = BASE_RETRY_INTERVAL
+    for _ in range(misses - 1):
+        if interval >= MAX_RETRY_INTERVAL:
+            break
+        interval *= 2
+    return min(interval, MAX_RETRY_INTERVAL)
+
+
+def create_table(db, table: str):
+    db.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {missing_table(table)} (
+            symbol TEXT PRIMARY KEY,
+            misses INTEGER NOT NULL,
+            last_updated_us INTEGER NOT NULL,
+            retry_after_us INTEGER NOT NULL
+        ) STRICT;
+        """
+    )
+
+
+def is_suppressed(db, table: str, *, symbol: str, now_us: int) -> bool:
+    """Check if symbol had no data in table recently enough to skip it."""
+    row = db.execute(
+        f"""
+        SELECT retry_after_us
+        FROM {missing_table(table)}
+        WHERE symbol = :symbol;
+        """,
+        {"symbol": symbol},
+    ).fetchone()
+    return row is not None and now_us < row[0]
+
+
+def record_miss(db, table: str, *, symbol: str, now_us: int, misses: int = 1):
+    """Record that symbol had no data in table. Doesn't commit.
+
+    Args:
+        misses: How many misses to add, such as when compacting old rows.
+    """
+    previous = db.execute(
+        f"SELECT misses FROM {missing_table(table)} WHERE symbol = :symbol;",
+        {"symbol": symbol},
+    ).fetchone()
+    misses += previous[0] if previous else 0
+    db.execute(
+        f"""
+        INSERT INTO {missing_table(table)} (
+            symbol, misses, last_updated_us, retry_after_us
+        ) VALUES (
+            :symbol, :misses, :now_us, :retry_after_us
+        ) ON CONFLICT (symbol) DO UPDATE SET
+            misses = excluded.misses,
+            last_updated_us = excluded.last_updated_us,
+            retry_after_us = excluded.retry_after_us;
+        """,
+        {
+            "symbol": symbol,
+            "misses": misses,
+            "now_us": now_us,
+            "retry_after_us": now_us
+            + retry_interval(misses) // datetime.timedelta(microseconds=1),
+        },
+    )
+
+
+def record_hit(db, table: str, *, symbol: str):
+    """Record that symbol has data in table. Doesn't commit."""
+    db.execute(
+        f"DELETE FROM {missing_table(table)} WHERE symbol = :symbol;",
+        {"symbol": symbol},
+    )
+
+
+def prune(db, table: str, *, schema: str = "main") -> int:
+    """Clear misses for symbols that have data written since.
+
+    Needed after copying rows from another database, such as a shard, which
+    may have found data for a symbol that this one recorded as missing.
+    """
+    cursor = db.execute(
+        f"""
+        DELETE FROM {schema}.{missing_table(table)} AS m
+        WHERE EXISTS (
+            SELECT 1
+            FROM {schema}.{table} AS t
+            WHERE t.symbol = m.symbol
+            AND t.last_updated_us > m.last_updated_us
+        );
+        """
+    )
+    return cursor.rowcount
+
+
+def compact_placeholders(db, table: str, *, is_placeholder: str) -> int:
+    """Replace placeholder rows in table with misses. Doesn't commit.
+
+    Before this cache, a request that returned no data wrote a placeholder
+    row to the table instead, so the number of placeholders is the number of
+    misses.
+
+    Args:
+        is_placeholder: SQL expression which is true for placeholder rows.
+
+    Returns:
+        The number of placeholder rows deleted.
+    """
+    placeholders = db.execute(
+        f"""
+        SELECT symbol, COUNT(*), MAX(COALESCE(last_updated_us, 0))
+        FROM {table}
+        WHERE {is_placeholder}
+        AND symbol IS NOT NULL
+        GROUP BY symbol
+        HAVING symbol NOT IN (
+            SELECT symbol
+            FROM {table}
+            WHERE NOT ({is_placeholder})
+            AND symbol IS NOT NULL
+        );
+        """
+    ).fetchall()
+    for symbol, misses, last_updated_us in placeholders:
+        record_miss(db, table, symbol=symbol, now_us=last_updated_us, misses=misses)
+    return db.execute(f"DELETE FROM {table} WHERE {is_placeholder};").rowcount
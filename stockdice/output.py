@@ -0,0 +1,79 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Write rolls to files or stdout one chunk at a time."""
+
+from __future__ import annotations
+
+import contextlib
+import sys
+from typing import BinaryIO, Iterable, Iterator
+
+import polars
+import pyarrow.parquet
+
+
+STREAMING_FORMATS = ("csv", "ndjson", "parquet")
+
+
+@contextlib.contextmanager
+def open_output(output_path: str) -> Iterator[BinaryIO]:
+    """Open a file for writing bytes, or stdout if output_path is "--"."""
+    if output_path == "--":
+        yield sys.stdout.buffer
+        sys.stdout.buffer.flush()
+        return
+
+    with open(output_path, "wb") as output:
+        yield output
+
+
+def write_chunks(
+    chunks: Iterable[polars.DataFrame], output: BinaryIO, format: str
+) -> int:
+    """Write each chunk as soon as it's available.
+
+    Args:
+        chunks: DataFrames with the same schema.
+        output: A file opened for writing bytes.
+        format:
+            One of STREAMING_FORMATS. Each chunk is written as a Parquet row
+            group.
+
+    Returns:
+        The number of rows written.
+    """
+    if format not in STREAMING_FORMATS:
+        raise ValueError(
+            f"Unsupported format {repr(format)}, expected one of {STREAMING_FORMATS}"
+        )
+
+    rows = 0
+    parquet_writer = None
+    try:
+        for chunk in chunks:
+            if format == "csv":
+                chunk.write_csv(output, include_header=rows == 0)
+            elif format == "ndjson":
+                chunk.write_ndjson(output)
+            else:
+                table = chunk.to_arrow()
+                if parquet_writer is None:
+                    parquet_writer = pyarrow.parquet.ParquetWriter(output, table.schema)
+                parquet_writer.write_table(table)
+            rows += chunk.height
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return rows
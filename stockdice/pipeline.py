@@ -0,0 +1,235 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Where downloaded responses are parsed and written.
+
+By default, responses are parsed and written in the current process. With
+ProcessPoolSink, parsing (JSON decoding and type coercion) runs in a pool of
+worker processes and one writer process owns the SQLite connection, so the
+downloader's event loop only waits on the network.
+
+Datasets provide a parse function, which takes the raw response body and the
+table's column types, and a write function, which takes a connection and
+the parsed rows. An empty list of rows records that no data is available.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import queue
+import sqlite3
+from typing import Callable
+
+import stockdice.db
+
+
+# Limit parsed rows waiting for the writer, so that memory use is bounded if
+# the downloaders are faster than the database.
+QUEUE_SIZE = 1_000
+# Commit after this many responses, or sooner if the queue is empty.
+WRITER_BATCH_SIZE = 100
+
+ParseFn = Callable[..., list[dict]]
+WriteFn = Callable[..., None]
+
+
+class InProcessSink:
+    """Parse and write each response in the current process."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+        self._column_types: dict[str, dict[str, str]] = {}
+
+    def column_types(self, table: str) -> dict[str, str]:
+        if table not in self._column_types:
+            self._column_types[table] = stockdice.db.table_column_types(self._db, table)
+        return self._column_types[table]
+
+    async def parse_and_write(
+        self,
+        *,
+        parse: ParseFn,
+        write: WriteFn,
+        table: str,
+        content: bytes,
+        symbol: str,
+        now_us: int,
+    ) -> int:
+        """Parse a response and write the rows.
+
+        Returns:
+            The number of rows parsed.
+        """
+        rows = parse(content, column_types=self.column_types(table))
+        self.write(write, rows, symbol=symbol, now_us=now_us)
+        return len(rows)
+
+    def write(self, write: WriteFn, rows: list[dict], *, symbol: str, now_us: int):
+        write(self._db, rows, symbol=symbol, now_us=now_us)
+        self._db.commit()
+
+
+def _connect_writer(db_path: str) -> sqlite3.Connection:
+    # Wait for the downloaders' connection, which might also write.
+    db = sqlite3.connect(db_path, autocommit=False, timeout=60.0)
+    try:
+        # End the transaction that was started automatically.
+        db.execute("ROLLBACK;")
+    except sqlite3.OperationalError:
+        # Transaction might not have been started.
+        pass
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("BEGIN TRANSACTION;")
+    return db
+
+
+def _writer_main(db_path: str, rows_queue: multiprocessing.Queue, failures):
+    db = _connect_writer(db_path)
+    pending = 0
+    while True:
+        item = rows_queue.get()
+        if item is None:
+            break
+
+        write, rows, symbol, now_us = item
+        # Undo a partial write without losing the rest of the batch.
+        db.execute("SAVEPOINT write_symbol;")
+        try:
+            write(db, rows, symbol=symbol, now_us=now_us)
+        except Exception:
+            logging.exception(f"Unable to write {symbol}.")
+            db.execute("ROLLBACK TO write_symbol;")
+            db.execute("RELEASE write_symbol;")
+            with failures.get_lock():
+                failures.value += 1
+            continue
+        db.execute("RELEASE write_symbol;")
+
+        pending += 1
+        if pending >= WRITER_BATCH_SIZE or rows_queue.empty():
+            db.commit()
+            pending = 0
+
+    db.commit()
+    db.close()
+
+
+_parser_queue: multiprocessing.Queue | None = None
+
+
+def _init_parser(rows_queue: multiprocessing.Queue):
+    global _parser_queue
+    _parser_queue = rows_queue
+
+
+def _parse_and_enqueue(
+    parse: ParseFn,
+    write: WriteFn,
+    column_types: dict[str, str],
+    content: bytes,
+    symbol: str,
+    now_us: int,
+) -> int:
+    rows = parse(content, column_types=column_types)
+    # Send the rows straight to the writer rather than back through the
+    # downloader process.
+    _parser_queue.put((write, rows, symbol, now_us))
+    return len(rows)
+
+
+class ProcessPoolSink(InProcessSink):
+    """Parse in a process pool and write from a single writer process.
+
+    Use as a context manager. Exiting waits for all rows to be written and
+    raises RuntimeError if any of them couldn't be.
+    """
+
+    def __init__(
+        self,
+        db: sqlite3.Connection,
+        db_path,
+        *,
+        processes: int | None = None,
+    ):
+        super().__init__(db)
+        self._db_path = str(db_path)
+        self._processes = processes
+        self._context = multiprocessing.get_context("spawn")
+        self._queue = None
+        self._failures = None
+        self._writer = None
+        self._pool = None
+
+    def __enter__(self) -> ProcessPoolSink:
+        self._queue = self._context.Queue(maxsize=QUEUE_SIZE)
+        self._failures = self._context.Value("q", 0)
+        self._writer = self._context.Process(
+            target=_writer_main,
+            args=(self._db_path, self._queue, self._failures),
+            name="stockdice-writer",
+            daemon=True,
+        )
+        self._writer.start()
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self._processes,
+            mp_context=self._context,
+            initializer=_init_parser,
+            initargs=(self._queue,),
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        self._pool.shutdown(wait=True)
+        self._queue.put(None)
+        self._writer.join()
+        if self._writer.exitcode != 0:
+            raise RuntimeError(f"Writer process exited with {self._writer.exitcode}.")
+        # The downloaders have already counted these rows, so don't let the
+        # refresh look successful. The writer logged each error.
+        if self._failures.value:
+            raise RuntimeError(
+                f"Writer process was unable to write {self._failures.value} responses."
+            )
+
+    async def parse_and_write(
+        self,
+        *,
+        parse: ParseFn,
+        write: WriteFn,
+        table: str,
+        content: bytes,
+        symbol: str,
+        now_us: int,
+    ) -> int:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool,
+            _parse_and_enqueue,
+            parse,
+            write,
+            self.column_types(table),
+            content,
+            symbol,
+            now_us,
+        )
+
+    def write(self, write: WriteFn, rows: list[dict], *, symbol: str, now_us: int):
+        try:
+            self._queue.put_nowait((write, rows, symbol, now_us))
+        except queue.Full:
+            # Block the downloaders until the writer catches up.
+            self._queue.put((write, rows, symbol, now_us))
@@ -0,0 +1,151 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Refresh prices and market caps without downloading full profiles.
+
+Most of a company profile, such as the description, address and CEO, rarely
+changes. During trading hours, only the quote columns are refreshed, using
+batch requests (see stockdice.coalesce), so market-cap weights stay fresh
+while full profiles are downloaded about once a day.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+
+import httpx
+
+import stockdice.coalesce
+import stockdice.config
+import stockdice.db
+import stockdice.shards
+import stockdice.stocklist
+import stockdice.timeutils
+
+
+# Columns of company_profile updated from batch-quote results, which use
+# the same names.
+QUOTE_COLUMNS = ("price", "marketCap", "volume", "change", "changePercentage")
+
+
+def symbols_due(
+    db,
+    *,
+    max_age: datetime.timedelta,
+    now_us: int,
+    shard: stockdice.shards.Shard | None = None,
+    limit: int | None = None,
+) -> list[str]:
+    """List stocks whose price is older than max_age, oldest first.
+
+    Symbols without a profile are skipped, since the full profile is needed
+    first.
+
+    Args:
+        limit: Return at most this many symbols.
+    """
+    listed = set(stockdice.stocklist.list_symbols(shard))
+    max_last_updated_us = now_us - max_age // datetime.timedelta(microseconds=1)
+    symbols = [
+        row[0]
+        for row in db.execute(
+            """
+            SELECT symbol
+            FROM company_profile
+            WHERE isEtf = false
+            AND isFund = false
+            AND MAX(
+                COALESCE(last_updated_us, 0),
+                COALESCE(quote_last_updated_us, 0)
+            ) < :max_last_updated_us
+            ORDER BY MAX(
+                COALESCE(last_updated_us, 0),
+                COALESCE(quote_last_updated_us, 0)
+            ), symbol;
+            """,
+            {"max_last_updated_us": max_last_updated_us},
+        )
+        if row[0] in listed
+    ]
+    return symbols if limit is None else symbols[:limit]
+
+
+def write_quotes(db, quotes: list[dict], *, now_us: int):
+    """Update the quote columns of existing profiles. Doesn't commit."""
+    column_types = stockdice.db.table_column_types(db, "company_profile")
+    rows = stockdice.db.normalize_values(
+        column_types,
+        [
+            {
+                "symbol": quote["symbol"],
+                **{column: quote.get(column) for column in QUOTE_COLUMNS},
+            }
+            for quote in quotes
+        ],
+    )
+    assignments = ", ".join(f'"{column}" = :{column}' for column in QUOTE_COLUMNS)
+    db.executemany(
+        f"""
+        UPDATE company_profile
+        SET {assignments}, quote_last_updated_us = :now_us
+        WHERE symbol = :symbol;
+        """,
+        [{**row, "now_us": now_us} for row in rows],
+    )
+
+
+async def download_all(
+    *,
+    max_age: datetime.timedelta,
+    client: httpx.AsyncClient,
+    shard: stockdice.shards.Shard | None = None,
+    limit: int | None = None,
+) -> int:
+    """Refresh quotes that are older than max_age.
+
+    Args:
+        limit: Refresh at most this many of the oldest quotes.
+
+    Returns:
+        The number of profiles updated.
+    """
+    db = stockdice.config.config.db
+    now_us = stockdice.timeutils.now_in_microseconds()
+    symbols = symbols_due(db, max_age=max_age, now_us=now_us, shard=shard, limit=limit)
+    if not symbols:
+        return 0
+
+    quotes = stockdice.coalesce.Coalescer(stockdice.coalesce.FMP_BATCH_QUOTE)
+    # A failed batch shouldn't throw away the quotes from the other batches.
+    results = await asyncio.gather(
+        *[quotes.get(client, symbol) for symbol in symbols], return_exceptions=True
+    )
+    found = []
+    failed = 0
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logging.error(f"Unable to get quote for {symbol}: {result!r}")
+        elif result is not None:
+            found.append(result)
+    logging.info(
+        f"Got {len(found)} quotes for {len(symbols)} symbols "
+        f"in {quotes.requests} requests. {failed} failed."
+    )
+
+    write_quotes(db, found, now_us=now_us)
+    db.commit()
+    return len(found)
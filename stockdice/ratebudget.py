@@ -0,0 +1,142 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A request budget shared by several processes.
+
+Refresher shards (see stockdice.shards) each send requests, but the plan's
+rate limit applies to all of them together. The token bucket lives in a small
+SQLite database, so processes on the same host, or on hosts sharing a volume
+with working file locks, draw from the same budget.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import pathlib
+import sqlite3
+import time
+
+
+class SharedTokenBucket:
+    """A token bucket stored in a SQLite database at path.
+
+    Args:
+        path: Database file, created if needed.
+        name: Several buckets, such as one per API key, can share a file.
+        requests_per_minute: Rate at which tokens are added.
+        capacity:
+            Most tokens that can be saved up. The default of 1 spaces
+            requests out evenly, like stockdice.ratelimits.get does within a
+            single process.
+    """
+
+    def __init__(
+        self,
+        path,
+        *,
+        requests_per_minute: float,
+        capacity: float = 1.0,
+        name: str = "default",
+    ):
+        self._path = pathlib.Path(path)
+        self._name = name
+        self._rate = requests_per_minute / 60.0
+        self._capacity = capacity
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            # Manage transactions explicitly so that BEGIN IMMEDIATE takes the
+            # write lock before reading the bucket.
+            self._db = sqlite3.connect(self._path, timeout=60.0, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS token_bucket (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                ) STRICT;
+                """
+            )
+            self._db.execute(
+                """
+                INSERT OR IGNORE INTO token_bucket (name, tokens, updated)
+                VALUES (:name, :capacity, :now);
+                """,
+                {"name": self._name, "capacity": self._capacity, "now": time.time()},
+            )
+        return self._db
+
+    def _update(self, fn) -> float:
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE;")
+        try:
+            tokens, updated = db.execute(
+                "SELECT tokens, updated FROM token_bucket WHERE name = :name;",
+                {"name": self._name},
+            ).fetchone()
+            # Wall clock time, because monotonic clocks aren't comparable
+            # between hosts.
+            now = time.time()
+            tokens = min(self._capacity, tokens + max(0.0, now - updated) * self._rate)
+            tokens, result = fn(tokens)
+            db.execute(
+                """
+                UPDATE token_bucket
+                SET tokens = :tokens, updated = :now
+                WHERE name = :name;
+                """,
+                {"name": self._name, "tokens": tokens, "now": now},
+            )
+            db.execute("COMMIT;")
+        except BaseException:
+            db.execute("ROLLBACK;")
+            raise
+        return result
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one will be.
+        """
+
+        def take(tokens):
+            if tokens >= 1.0:
+                return tokens - 1.0, 0.0
+            return tokens, (1.0 - tokens) / self._rate
+
+        return self._update(take)
+
+    async def acquire(self):
+        while (wait_seconds := self.try_acquire()) > 0:
+            await asyncio.sleep(wait_seconds)
+
+    def pause(self, seconds: float):
+        """Don't hand out tokens to any process for seconds.
+
+        Used when the server reports that we've hit the rate limit anyway.
+        """
+
+        def drain(tokens):
+            return min(tokens, 1.0 - seconds * self._rate), None
+
+        self._update(drain)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -12,23 +12,224 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import annotations
+
 import asyncio
+import contextlib
+import contextvars
 import functools
+import hashlib
+import json
 import logging
 import random
 import time
+from typing import Iterable
 
 import httpx
 
 import stockdice.config
+import stockdice.ratebudget
 
 
 # Rate limit from our side. We only want to download BATCH_SIZE records per
 # BATCH_WAIT seconds. At 300 API calls / minute, we can do at most 5 per second.
-SECONDS_BETWEEN_REQUESTS = 60.0 / stockdice.config.REQUESTS_PER_MINUTE
-next_request_time = time.monotonic()
-next_request_time_lock = asyncio.Lock()
-request_lock = asyncio.Lock()
+# This applies to each API key separately.
+def seconds_between_requests() -> float:
+    return 60.0 / stockdice.config.REQUESTS_PER_MINUTE
+
+
+def __getattr__(name: str):
+    # Computed on first use so that importing doesn't load the config.
+    if name == "SECONDS_BETWEEN_REQUESTS":
+        return seconds_between_requests()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# After this many rate limit errors in a row, stop using a key for a while, in
+# case it's also being used somewhere else or has a lower limit than we think.
+QUARANTINE_STRIKES = 3
+QUARANTINE_SECONDS = 15 * 60.0
+
+
+def key_id(key: str) -> str:
+    """A name for an API key that's safe to log or store."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+class ApiKey:
+    """Pacing and rate limit state for one FMP API key.
+
+    Args:
+        key: The API key.
+        seconds_between_requests: Spacing between requests with this key.
+        budget:
+            Optional budget shared with other processes, which replaces the
+            spacing. See stockdice.ratebudget.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        *,
+        seconds_between_requests: float,
+        budget: stockdice.ratebudget.SharedTokenBucket | None = None,
+    ):
+        self.key = key
+        self.seconds_between_requests = seconds_between_requests
+        self.budget = budget
+        self.next_request_time = time.monotonic()
+        self.quarantined_until = 0.0
+        self.strikes = 0
+        # Only one request at a time per key.
+        self.busy = False
+
+    def available_time(self) -> float:
+        return max(self.next_request_time, self.quarantined_until)
+
+    def back_off(self, seconds: float):
+        """Record a rate limit error and wait seconds before the next request."""
+        current_time = time.monotonic()
+        # Don't accidentally decrease the time to the next request.
+        self.next_request_time = max(self.next_request_time, current_time + seconds)
+        if self.budget is not None:
+            # The other processes are hitting the same limit.
+            self.budget.pause(seconds)
+
+        self.strikes += 1
+        if self.strikes >= QUARANTINE_STRIKES:
+            logging.warning(
+                f"Got {self.strikes} rate limit errors in a row with API key "
+                f"{key_id(self.key)}. Not using it for {QUARANTINE_SECONDS} seconds."
+            )
+            self.quarantined_until = current_time + QUARANTINE_SECONDS
+            self.strikes = 0
+
+    def succeeded(self):
+        self.strikes = 0
+
+
+class KeyPool:
+    """Send each request with the API key that can send it soonest."""
+
+    def __init__(self, keys: Iterable[ApiKey]):
+        self.keys = tuple(keys)
+        if not self.keys:
+            raise ValueError("Need at least one API key.")
+        # Created on first use, so that it's bound to the running event loop.
+        self._idle: asyncio.Condition | None = None
+
+    def _idle_condition(self) -> asyncio.Condition:
+        if self._idle is None:
+            self._idle = asyncio.Condition()
+        return self._idle
+
+    @classmethod
+    def from_config(cls, *, budget_path=None) -> KeyPool:
+        keys = []
+        for key in stockdice.config.FMP_API_KEYS:
+            budget = None
+            if budget_path is not None:
+                budget = stockdice.ratebudget.SharedTokenBucket(
+                    budget_path,
+                    name=key_id(key),
+                    requests_per_minute=stockdice.config.REQUESTS_PER_MINUTE,
+                )
+            keys.append(
+                ApiKey(
+                    key,
+                    seconds_between_requests=seconds_between_requests(),
+                    budget=budget,
+                )
+            )
+        return cls(keys)
+
+    async def acquire(self) -> ApiKey:
+        """Wait until a key can send a request.
+
+        The caller must call release after sending the request.
+        """
+        idle = self._idle_condition()
+        async with idle:
+            while True:
+                # Of the idle keys, use the one with the most budget, which is
+                # the one that's been waiting longest.
+                key = min(
+                    (key for key in self.keys if not key.busy),
+                    key=lambda key: key.available_time(),
+                    default=None,
+                )
+                if key is None:
+                    await idle.wait()
+                    continue
+
+                wait_seconds = key.available_time() - time.monotonic()
+                if wait_seconds <= 0:
+                    key.busy = True
+                    break
+
+                # Wait for the key's budget, unless another key becomes idle
+                # first. This way, a key that's backing off from a rate limit
+                # doesn't hold up requests that other keys could send.
+                try:
+                    await asyncio.wait_for(idle.wait(), wait_seconds)
+                except TimeoutError:
+                    pass
+
+        try:
+            if key.budget is None:
+                key.next_request_time = time.monotonic() + key.seconds_between_requests
+            else:
+                await key.budget.acquire()
+        except BaseException:
+            await self.release(key)
+            raise
+        return key
+
+    async def release(self, key: ApiKey):
+        idle = self._idle_condition()
+        async with idle:
+            key.busy = False
+            idle.notify()
+
+
+_key_pool: KeyPool | None = None
+
+# The key used by the latest request in the current task, so that a rate
+# limit error can be charged to it.
+current_key: contextvars.ContextVar[ApiKey | None] = contextvars.ContextVar(
+    "current_key", default=None
+)
+
+# Limits how many requests from the current task, and the tasks it starts, can
+# wait for a key at once. Background refreshes set this, so that their
+# requests don't queue ahead of more urgent ones. See: stockdice.scheduler.
+request_slots: contextvars.ContextVar[asyncio.Semaphore | None] = (
+    contextvars.ContextVar("request_slots", default=None)
+)
+
+
+def get_key_pool() -> KeyPool:
+    global _key_pool
+
+    if _key_pool is None:
+        _key_pool = KeyPool.from_config()
+    return _key_pool
+
+
+def use_key_pool(pool: KeyPool | None):
+    """Replace the key pool. None recreates it from the config on next use."""
+    global _key_pool
+    _key_pool = pool
+
+
+def use_shared_budget(path):
+    """Pace each key with a budget shared with other processes, such as
+    refresher shards.
+
+    This replaces the per-process spacing from seconds_between_requests.
+    """
+    use_key_pool(KeyPool.from_config(budget_path=path))
+
 
 # Rate limit from server side. This is especially useful when we're downloading
 # from several APIs at once.
@@ -40,31 +241,63 @@ RATE_LIMIT_MINIMUM_SECONDS = 10.0
 
 class RateLimitError(Exception):
     def __init__(self, seconds, millis):
+        # Pass the arguments along so that the exception can be pickled when
+        # raised from a worker process.
+        super().__init__(seconds, millis)
         self.seconds = seconds
         self.millis = millis
 
 
-async def get(client: httpx.AsyncClient, url: str):
-    global next_request_time
+def _with_key(url: str, key: ApiKey) -> httpx.URL:
+    # Merge rather than pass params=, which would replace the query.
+    return httpx.URL(url).copy_merge_params({"apikey": key.key})
 
-    async with request_lock:
-        current_time = time.monotonic()
 
-        # OK without the lock because getting a variable is atomic and if it
-        # changes between the check and the sleep, it would only to be to
-        # increase in value.
-        if current_time < next_request_time:
-            await asyncio.sleep(next_request_time - current_time)
+def _request_slot():
+    slots = request_slots.get()
+    return contextlib.nullcontext() if slots is None else slots
 
-        next_request_time = current_time + SECONDS_BETWEEN_REQUESTS
-        return await client.get(url)
 
+async def get(client: httpx.AsyncClient, url: str):
+    """Send a GET request, adding the apikey parameter."""
+    async with _request_slot():
+        pool = get_key_pool()
+        key = await pool.acquire()
+        try:
+            current_key.set(key)
+            return await client.get(_with_key(url, key))
+        finally:
+            await pool.release(key)
 
-def check_status(resp):
+
+@contextlib.asynccontextmanager
+async def stream(client: httpx.AsyncClient, url: str):
+    """Like get, but the body is read as it's iterated, for large files."""
+    async with _request_slot():
+        pool = get_key_pool()
+        key = await pool.acquire()
+        try:
+            current_key.set(key)
+            async with client.stream("GET", _with_key(url, key)) as resp:
+                yield resp
+        finally:
+            await pool.release(key)
+
+
+def check_status_code(resp):
     if resp.status_code == RATE_LIMIT_STATUS:
         raise RateLimitError(1, 0)
-    resp_json = resp.json()
-    if RATE_LIMIT_SECONDS in resp_json or RATE_LIMIT_MILLISECONDS in resp_json:
+
+
+def parse_json(content: bytes):
+    """Decode a response body, checking for a rate limit error.
+
+    Doesn't need the response object, so it can run in another process.
+    """
+    resp_json = json.loads(content)
+    if isinstance(resp_json, dict) and (
+        RATE_LIMIT_SECONDS in resp_json or RATE_LIMIT_MILLISECONDS in resp_json
+    ):
         raise RateLimitError(
             float(resp_json.get(RATE_LIMIT_SECONDS, 0)),
             float(resp_json.get(RATE_LIMIT_MILLISECONDS, 0)),
@@ -72,12 +305,16 @@ def check_status(resp):
     return resp_json
 
 
+def check_status(resp):
+    check_status_code(resp)
+    return parse_json(resp.content)
+
+
 def retry_fmp(async_fn):
     @functools.wraps(async_fn)
     async def wrapped(*args, **kwargs):
-        global next_request_time
-
         while True:
+            current_key.set(None)
             try:
                 value = await async_fn(*args, **kwargs)
             except RateLimitError as exp:
@@ -93,12 +330,12 @@ def retry_fmp(async_fn):
                     f"Exception reported a minimum wait time of {sleep_seconds} seconds. "
                     f"Waiting {actual_sleep_seconds} seconds."
                 )
-                current_time = time.monotonic()
-                next_request_time_local = current_time + actual_sleep_seconds
 
-                async with next_request_time_lock:
-                    # Don't accidentally decrease the time to the next request.
-                    next_request_time = max(next_request_time, next_request_time_local)
+                # Only the key that hit the limit needs to wait.
+                key = current_key.get()
+                keys = get_key_pool().keys if key is None else (key,)
+                for key in keys:
+                    key.back_off(actual_sleep_seconds)
 
             except httpx.ReadTimeout:
                 # Try again.
@@ -106,6 +343,9 @@ def retry_fmp(async_fn):
             except:
                 raise
             else:
+                key = current_key.get()
+                if key is not None:
+                    key.succeeded()
                 return value
 
     return wrapped
@@ -0,0 +1,163 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""One long-lived, read-only connection to the replica per thread.
+
+The replica is a downloaded copy that is replaced rather than modified, so
+connections open it with immutable=1. SQLite then skips locking and change
+detection entirely. A connection is recycled when the replica's path, inode,
+size, or modification time changes.
+
+Keeping connections open also keeps sqlite3's prepared statement cache warm,
+so repeated queries are only compiled once per thread.
+
+Each connection maps up to MMAP_SIZE of the replica, so a thread that sits
+idle after the replica is swapped would keep the old, deleted file resident.
+The code that swaps the replica calls close_replica to close every thread's
+connection to the old file right away.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Iterator
+
+
+# Map the whole replica into memory rather than copying pages into the cache.
+MMAP_SIZE = 1024 * 1024 * 1024
+# In KiB, for pages that aren't memory-mapped, such as temporary B-trees.
+CACHE_SIZE_KIB = 64 * 1024
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+
+
+class _Connection:
+    def __init__(self, key: tuple, db: sqlite3.Connection):
+        self.key = key
+        self.db = db
+        # Held while the owning thread queries, so that close_replica doesn't
+        # close the connection out from under it.
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.db.close()
+
+
+# Every thread's connection, so that close_replica can reach idle threads.
+_connections: set[_Connection] = set()
+_connections_lock = threading.Lock()
+
+
+def immutable_uri(path) -> str:
+    return f"{pathlib.Path(path).absolute().as_uri()}?mode=ro&immutable=1"
+
+
+def _file_key(path) -> tuple:
+    stat = os.stat(path)
+    return (str(path), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def connect(path) -> sqlite3.Connection:
+    """Open a new tuned, read-only connection to the replica at path."""
+    db = sqlite3.connect(
+        immutable_uri(path),
+        uri=True,
+        autocommit=True,
+        cached_statements=CACHED_STATEMENTS,
+        # Only the owning thread queries, but close_replica may close the
+        # connection from another thread.
+        check_same_thread=False,
+    )
+    db.execute(f"PRAGMA mmap_size = {MMAP_SIZE};")
+    db.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB};")
+    db.execute("PRAGMA query_only = true;")
+    return db
+
+
+def _discard(connection: _Connection):
+    with _connections_lock:
+        _connections.discard(connection)
+    connection.close()
+
+
+def _get(path) -> _Connection:
+    key = _file_key(path)
+    current = getattr(_local, "connection", None)
+    if current is not None:
+        if current.key == key and not current.closed:
+            return current
+        _local.connection = None
+        _discard(current)
+
+    connection = _Connection(key, connect(path))
+    with _connections_lock:
+        _connections.add(connection)
+    _local.connection = connection
+    return connection
+
+
+def get(path) -> sqlite3.Connection:
+    """Get this thread's connection to the replica at path.
+
+    The connection must only be used by the calling thread. Use connection
+    instead if another thread might swap the replica while it's in use.
+    """
+    return _get(path).db
+
+
+@contextlib.contextmanager
+def connection(path) -> Iterator[sqlite3.Connection]:
+    """Use this thread's connection to the replica at path.
+
+    close_replica waits until the block exits before closing it.
+    """
+    while True:
+        current = _get(path)
+        with current.lock:
+            # Closed by close_replica after _get returned it, so reconnect.
+            if current.closed:
+                continue
+            yield current.db
+            return
+
+
+def close_replica(path):
+    """Close every thread's connection to the replica at path.
+
+    Call this before deleting a replica, so that its memory is released
+    without waiting for idle threads to query again.
+    """
+    path = str(path)
+    with _connections_lock:
+        stale = [connection for connection in _connections if connection.key[0] == path]
+        _connections.difference_update(stale)
+    for connection in stale:
+        connection.close()
+
+
+def close():
+    """Close this thread's connection, if any."""
+    current = getattr(_local, "connection", None)
+    if current is not None:
+        _local.connection = None
+        _discard(current)
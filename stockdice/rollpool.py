@@ -0,0 +1,145 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pre-drawn rolls so that a single roll doesn't sample on the request path.
+
+Each weighting scheme has a buffer of row indices into the current snapshot's
+universe. A background thread refills the buffer in vectorized blocks whenever
+it drops below a low-water mark. When the replica changes, the buffers are
+replaced so that indices always refer to the snapshot they were drawn from.
+"""
+
+from __future__ import annotations
+
+import collections
+import threading
+
+import numpy.random
+
+import stockdice.dice
+
+
+BLOCK_SIZE = 4096
+LOW_WATER_MARK = 1024
+
+
+class RollPool:
+    """Pre-drawn row indices for one weighting scheme of one snapshot."""
+
+    def __init__(
+        self,
+        snapshot: stockdice.dice.Snapshot,
+        weights: str | None,
+        *,
+        block_size: int = BLOCK_SIZE,
+        low_water_mark: int = LOW_WATER_MARK,
+        seed=None,
+    ):
+        self.snapshot = snapshot
+        self.weights = weights
+        self._block_size = block_size
+        self._low_water_mark = low_water_mark
+        # Generators aren't thread-safe, so only the refill thread uses this.
+        self._rng = numpy.random.default_rng(seed)
+        # Appending and popping from opposite ends of a deque are atomic, so
+        # requests don't need to take a lock.
+        self._indices: collections.deque[int] = collections.deque()
+        self._needs_refill = threading.Event()
+        self._closed = False
+
+        self._refill()
+        self._thread = threading.Thread(
+            target=self._refill_forever,
+            name=f"rollpool-{weights}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def _refill(self):
+        while len(self._indices) < self._low_water_mark + self._block_size:
+            block = stockdice.dice.sample_indices(
+                self.snapshot, self.weights, self._block_size, self._rng
+            )
+            self._indices.extend(block.tolist())
+
+    def _refill_forever(self):
+        while True:
+            self._needs_refill.wait()
+            if self._closed:
+                return
+            self._needs_refill.clear()
+            self._refill()
+
+    def pop(self) -> int:
+        """Take the next pre-drawn row index."""
+        try:
+            idx = self._indices.popleft()
+        except IndexError:
+            # The refill thread fell behind. Sample on the request path rather
+            # than wait for it.
+            self._needs_refill.set()
+            return int(
+                stockdice.dice.sample_indices(
+                    self.snapshot, self.weights, 1, numpy.random.default_rng()
+                )[0]
+            )
+
+        if len(self._indices) < self._low_water_mark:
+            self._needs_refill.set()
+        return idx
+
+    def close(self):
+        self._closed = True
+        self._needs_refill.set()
+
+
+_pools: dict[str | None, RollPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(weights: str | None = None, *, replica_db_path=None) -> RollPool:
+    """Get the pool for a weighting scheme, replacing it if the replica changed."""
+    stockdice.dice._check_weights(weights)
+    snapshot = stockdice.dice.current_snapshot(replica_db_path)
+    pool = _pools.get(weights)
+    if pool is not None and pool.snapshot.version == snapshot.version:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(weights)
+        if pool is None or pool.snapshot.version != snapshot.version:
+            if pool is not None:
+                pool.close()
+            pool = RollPool(snapshot, weights)
+            _pools[weights] = pool
+        return pool
+
+
+def roll_one(weights: str | None = None, *, replica_db_path=None) -> dict:
+    """Choose one stock from a pre-drawn pool.
+
+    Args:
+        weights:
+            Name of a column in stockdice.dice.WEIGHT_COLUMNS to weight the
+            stocks by or None to weight all stocks evenly.
+
+    Returns:
+        The chosen row of the universe, with "symbol", "companyName", and
+        "marketCapUSD" keys.
+    """
+    pool = get_pool(weights, replica_db_path=replica_db_path)
+    return pool.snapshot.universe.row(pool.pop(), named=True)
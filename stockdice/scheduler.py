@@ -0,0 +1,272 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Refresh each dataset continuously, as often as it needs to be.
+
+Each dataset has a target staleness for each phase of the trading day. A loop
+per dataset refreshes what's close to the target, then sleeps until the next
+pass or the next phase, instead of sweeping everything back to back.
+
+Requests are paced by stockdice.ratelimits, so together the loops use the
+whole rate budget without going over it. Background datasets have many
+requests but no urgency, so they only queue a few at a time, and quotes don't
+wait behind them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import math
+from typing import Awaitable, Callable, NamedTuple
+
+import httpx
+
+import stockdice.balance_sheet
+import stockdice.company_profile
+import stockdice.config
+import stockdice.forex
+import stockdice.income
+import stockdice.quotes
+import stockdice.ratelimits
+import stockdice.shards
+import stockdice.stocklist
+import stockdice.timeutils
+import stockdice.trading_hours
+
+PHASES = ("pre_market", "open", "midday", "close", "closed")
+
+# Pre-market trading starts at 4:00 a.m., 5.5 hours before the open.
+PRE_MARKET = datetime.timedelta(hours=5, minutes=30)
+# Prices move the most in the first and last hour of the session.
+OPENING = datetime.timedelta(hours=1)
+CLOSING = datetime.timedelta(hours=1)
+
+_MINUTE = datetime.timedelta(minutes=1)
+_DAY = datetime.timedelta(days=1)
+
+# How stale each dataset may get in each phase. None means don't refresh it
+# in that phase, leaving the budget to the others.
+TARGET_STALENESS: dict[str, dict[str, datetime.timedelta | None]] = {
+    # Only changes with listings and delistings.
+    "symbol_list": dict.fromkeys(PHASES, _DAY),
+    "forex": {
+        "pre_market": 30 * _MINUTE,
+        "open": 5 * _MINUTE,
+        "midday": 15 * _MINUTE,
+        "close": 5 * _MINUTE,
+        "closed": _DAY,
+    },
+    "quotes": {
+        "pre_market": None,
+        "open": 2 * _MINUTE,
+        "midday": 10 * _MINUTE,
+        "close": 2 * _MINUTE,
+        "closed": None,
+    },
+    "company_profile": dict.fromkeys(PHASES, _DAY),
+    # Statements are only downloaded near predicted filings, see
+    # stockdice.filings, so the busiest parts of the session can skip them.
+    "income": {
+        "pre_market": _DAY,
+        "open": None,
+        "midday": _DAY,
+        "close": None,
+        "closed": _DAY,
+    },
+    "balance_sheet": {
+        "pre_market": _DAY,
+        "open": None,
+        "midday": _DAY,
+        "close": None,
+        "closed": _DAY,
+    },
+}
+
+# Refresh these datasets in this many slices per target, oldest first. All
+# quotes are written at once, so otherwise they'd all expire at once, too, and
+# be refreshed in a burst.
+SLICES = {"quotes": 10}
+
+# Refresh data a bit before it reaches the target staleness, since it takes a
+# while to get through a pass.
+EARLY_REFRESH = 0.1
+
+# Datasets with many requests and no urgency.
+BACKGROUND = frozenset(("company_profile", "income", "balance_sheet"))
+# Enough requests waiting for each key to keep it busy.
+BACKGROUND_SLOTS_PER_KEY = 2
+
+MIN_SLEEP_SECONDS = 1.0
+
+
+class Pass(NamedTuple):
+    # Refresh data older than this, or nothing if None.
+    max_age: datetime.timedelta | None
+    # When to plan the next pass.
+    next_pass: datetime.datetime
+
+
+def phase(now: datetime.datetime) -> tuple[str, datetime.datetime]:
+    """The phase of the trading day at now and when it ends."""
+    session = stockdice.trading_hours.next_session(now)
+    ends = (
+        ("closed", session.open - PRE_MARKET),
+        ("pre_market", session.open),
+        ("open", session.open + OPENING),
+        ("midday", session.close - CLOSING),
+        ("close", session.close),
+    )
+    for name, end in ends:
+        if now < end:
+            return name, end
+    # The last moment of the session.
+    return "close", session.close
+
+
+def plan(dataset: str, now: datetime.datetime) -> Pass:
+    current, end = phase(now)
+    target = TARGET_STALENESS[dataset][current]
+    if target is None:
+        return Pass(max_age=None, next_pass=end)
+    interval = target / SLICES.get(dataset, 1)
+    return Pass(
+        max_age=target * (1 - EARLY_REFRESH), next_pass=min(now + interval, end)
+    )
+
+
+def _seconds_until(when: datetime.datetime) -> float:
+    # Subtract in UTC, since Python ignores the UTC offset when subtracting
+    # times with the same tzinfo.
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (when.astimezone(datetime.timezone.utc) - now).total_seconds()
+
+
+async def refresh_symbol_list(
+    *,
+    max_age: datetime.timedelta,
+    client: httpx.AsyncClient,
+    shard: stockdice.shards.Shard | None = None,
+):
+    db = stockdice.config.config.db
+    last_updated_us = stockdice.stocklist.last_updated_us(db)
+    now_us = stockdice.timeutils.now_in_microseconds()
+    if (
+        last_updated_us is not None
+        and datetime.timedelta(microseconds=now_us - last_updated_us) <= max_age
+    ):
+        return
+    await stockdice.stocklist.download_symbol_list(client=client)
+
+
+async def refresh_forex(
+    *,
+    max_age: datetime.timedelta,
+    client: httpx.AsyncClient,
+    shard: stockdice.shards.Shard | None = None,
+):
+    await stockdice.forex.download_forex(max_age=max_age, client=client)
+
+
+async def refresh_quotes(
+    *,
+    max_age: datetime.timedelta,
+    client: httpx.AsyncClient,
+    shard: stockdice.shards.Shard | None = None,
+):
+    symbols = len(stockdice.stocklist.list_symbols(shard))
+    await stockdice.quotes.download_all(
+        max_age=max_age,
+        client=client,
+        shard=shard,
+        limit=math.ceil(symbols / SLICES["quotes"]),
+    )
+
+
+Refresh = Callable[..., Awaitable]
+
+
+def refreshers(shard: stockdice.shards.Shard | None = None) -> dict[str, Refresh]:
+    jobs = {
+        "symbol_list": refresh_symbol_list,
+        "quotes": refresh_quotes,
+        "company_profile": stockdice.company_profile.download_all,
+        "income": stockdice.income.download_all,
+        "balance_sheet": stockdice.balance_sheet.download_all,
+    }
+    # Only one shard needs the data that isn't per symbol.
+    if shard is None or shard.index == 0:
+        jobs["forex"] = refresh_forex
+    return jobs
+
+
+async def _refresh_loop(
+    dataset: str,
+    refresh: Refresh,
+    *,
+    client: httpx.AsyncClient,
+    shard: stockdice.shards.Shard | None,
+    slots: asyncio.Semaphore | None,
+):
+    # Set in this loop's task, so it only applies to this dataset's requests.
+    stockdice.ratelimits.request_slots.set(slots)
+
+    while True:
+        planned = plan(dataset, datetime.datetime.now(stockdice.trading_hours.NEW_YORK))
+        if planned.max_age is not None:
+            try:
+                await refresh(max_age=planned.max_age, client=client, shard=shard)
+            except Exception:
+                logging.exception(f"Got exception refreshing {dataset}.")
+
+        await asyncio.sleep(max(MIN_SLEEP_SECONDS, _seconds_until(planned.next_pass)))
+
+
+async def run(
+    *,
+    client: httpx.AsyncClient,
+    shard: stockdice.shards.Shard | None = None,
+    jobs: dict[str, Refresh] | None = None,
+):
+    """Refresh every dataset forever."""
+    if jobs is None:
+        jobs = refreshers(shard)
+
+    # The other datasets refresh the listed symbols, so list them first. If
+    # that fails, keep going with the symbols that are already listed.
+    if "symbol_list" in jobs:
+        now = datetime.datetime.now(stockdice.trading_hours.NEW_YORK)
+        try:
+            await jobs["symbol_list"](
+                max_age=plan("symbol_list", now).max_age, client=client, shard=shard
+            )
+        except Exception:
+            logging.exception("Got exception refreshing symbol_list.")
+
+    background = asyncio.Semaphore(
+        BACKGROUND_SLOTS_PER_KEY * len(stockdice.ratelimits.get_key_pool().keys)
+    )
+    await asyncio.gather(
+        *[
+            _refresh_loop(
+                dataset,
+                refresh,
+                client=client,
+                shard=shard,
+                slots=background if dataset in BACKGROUND else None,
+            )
+            for dataset, refresh in jobs.items()
+        ]
+    )
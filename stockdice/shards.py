@@ -0,0 +1,198 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Split the refresh across several processes or hosts.
+
+Each shard downloads the symbols whose hash falls in its partition and
+writes them to its own database. Shard 0 writes to the main database and
+merges the others into it. Requests are paced by a shared budget, see
+stockdice.ratebudget.
+"""
+
+from __future__ import annotations
+
+import pathlib
+import sqlite3
+import zlib
+from typing import NamedTuple
+
+import stockdice.config
+import stockdice.negative_cache
+import stockdice.ratelimits
+
+
+# Tables with one set of rows per symbol, which each shard downloads for its
+# own symbols. Other tables, such as symbol and forex, are downloaded by
+# shard 0.
+SHARDED_TABLES = ("company_profile", "income", "balance_sheet")
+
+
+class Shard(NamedTuple):
+    index: int
+    count: int
+
+    def contains(self, symbol: str) -> bool:
+        # CRC-32 rather than hash(), which is randomized per process.
+        return zlib.crc32(symbol.encode("utf-8")) % self.count == self.index
+
+
+def parse_shard(value: str) -> Shard:
+    """Parse a shard written as INDEX/COUNT, such as 0/4."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Expected a shard like 0/4, got {value!r}.") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in [0, {count}), got {index}.")
+    return Shard(index, count)
+
+
+def db_path(shard: Shard) -> pathlib.Path:
+    if shard.index == 0:
+        return stockdice.config.DB_PATH
+    return stockdice.config.FMP_DIR / (
+        f"stockdice.shard-{shard.index}-of-{shard.count}.sqlite"
+    )
+
+
+def configure(shard: Shard, *, rate_budget_path=None):
+    """Write to the shard's database and pace requests with the shared budget.
+
+    Call before connecting to the database.
+    """
+    stockdice.config.config.db_path = db_path(shard)
+    stockdice.ratelimits.use_shared_budget(
+        rate_budget_path or stockdice.config.RATE_BUDGET_PATH
+    )
+
+
+def _quote(name: str) -> str:
+    return f'"{name}"'
+
+
+def _merge_table(db: sqlite3.Connection, table: str) -> int:
+    columns = db.execute(f"PRAGMA main.table_info({table});").fetchall()
+    shard_columns = {row[1] for row in db.execute(f"PRAGMA shard.table_info({table});")}
+    names = [column[1] for column in columns if column[1] in shard_columns]
+    primary_key = [
+        column[1] for column in sorted(columns, key=lambda c: c[5]) if column[5]
+    ]
+
+    column_list = ", ".join(_quote(name) for name in names)
+    updates = ", ".join(
+        f"{_quote(name)} = excluded.{_quote(name)}"
+        for name in names
+        if name not in primary_key
+    )
+
+    def has_null_key(alias):
+        return " OR ".join(f"{alias}.{_quote(name)} IS NULL" for name in primary_key)
+
+    before = db.total_changes
+
+    # Placeholder rows, which record that there's no data for a symbol, have
+    # NULLs in the primary key, so they never conflict. Replace them instead.
+    db.execute(
+        f"""
+        DELETE FROM main.{table} AS m
+        WHERE ({has_null_key("m")})
+        AND EXISTS (
+            SELECT 1
+            FROM shard.{table} AS s
+            WHERE s.symbol = m.symbol
+            AND ({has_null_key("s")})
+            AND s.last_updated_us > m.last_updated_us
+        );
+        """
+    )
+    db.execute(
+        f"""
+        INSERT INTO main.{table} ({column_list})
+        SELECT {column_list}
+        FROM shard.{table} AS s
+        WHERE ({has_null_key("s")})
+        AND NOT EXISTS (
+            SELECT 1
+            FROM main.{table} AS m
+            WHERE m.symbol = s.symbol
+            AND ({has_null_key("m")})
+        );
+        """
+    )
+
+    # Only rows that are newer than the main database's copy are written, so
+    # merging again is cheap.
+    db.execute(
+        f"""
+        INSERT INTO main.{table} ({column_list})
+        SELECT {column_list}
+        FROM shard.{table} AS s
+        WHERE NOT ({has_null_key("s")})
+        ON CONFLICT ({", ".join(_quote(name) for name in primary_key)}) DO UPDATE SET
+            {updates}
+        WHERE excluded.last_updated_us > {table}.last_updated_us
+        OR {table}.last_updated_us IS NULL;
+        """
+    )
+    return db.total_changes - before
+
+
+def merge(main_path, shard_path) -> int:
+    """Copy rows from a shard's database that are newer than the main copy.
+
+    Returns:
+        The number of rows written.
+    """
+    shard_path = pathlib.Path(shard_path)
+    if not shard_path.exists():
+        return 0
+
+    # ATTACH can't run inside a transaction, so manage them explicitly.
+    db = sqlite3.connect(main_path, timeout=60.0, isolation_level=None, uri=True)
+    try:
+        db.execute(
+            "ATTACH DATABASE :uri AS shard;",
+            {"uri": f"{shard_path.absolute().as_uri()}?mode=ro"},
+        )
+        db.execute("BEGIN IMMEDIATE;")
+        try:
+            merged = 0
+            for table in SHARDED_TABLES:
+                for name in (table, stockdice.negative_cache.missing_table(table)):
+                    if db.execute(
+                        """
+                        SELECT 1 FROM shard.sqlite_master
+                        WHERE type = 'table' AND name = :table;
+                        """,
+                        {"table": name},
+                    ).fetchone():
+                        merged += _merge_table(db, name)
+                # The shard may have found data for symbols that the main
+                # database recorded as missing.
+                stockdice.negative_cache.prune(db, table)
+            db.execute("COMMIT;")
+        except BaseException:
+            db.execute("ROLLBACK;")
+            raise
+        db.execute("DETACH DATABASE shard;")
+    finally:
+        db.close()
+    return merged
+
+
+def merge_all(main_path, count: int) -> int:
+    """Merge shards 1 to count - 1 into the database at main_path."""
+    return sum(
+        merge(main_path, db_path(Shard(index, count))) for index in range(1, count)
+    )
@@ -0,0 +1,297 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Simulate many DIY portfolios to see how closely they track the index.
+
+Each simulated portfolio buys an equal dollar amount of each of k rolls, as
+recommended in the README. It is compared with the market-cap weighted index
+of the whole universe.
+
+All portfolios in a chunk are computed at once with NumPy. Large simulations
+are split across a process pool.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import dataclasses
+import functools
+import multiprocessing
+import os
+import threading
+
+import numpy
+import numpy.random
+import polars
+
+import stockdice.dice
+
+
+# Roughly how many rolls to simulate in one batched computation.
+CHUNK_ROLLS = 1_000_000
+# Below this many rolls, starting worker processes costs more than it saves.
+PROCESS_POOL_MIN_ROLLS = 20_000_000
+PERCENTILES = (5, 25, 50, 75, 95)
+# Summaries are small, so keep plenty of them.
+CACHE_SIZE = 256
+METRICS = (
+    "hhi",
+    "effective_holdings",
+    "sector_overlap",
+    "active_share",
+)
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class _Arrays:
+    """The parts of the snapshot needed to simulate, cheap to send to workers."""
+
+    height: int
+    # Cumulative distribution to roll from, or None for uniform.
+    cdf: numpy.ndarray | None
+    # Weight of each stock in the market-cap weighted index.
+    index_weight: numpy.ndarray
+    sector_codes: numpy.ndarray
+    sector_count: int
+    index_sector_weight: numpy.ndarray
+
+
+def _arrays(snapshot: stockdice.dice.Snapshot, weights: str | None) -> _Arrays:
+    universe = snapshot.universe
+    market_cap = universe["marketCapUSD"].fill_null(0).clip(lower_bound=0).to_numpy()
+    index_weight = market_cap / market_cap.sum()
+    # Stocks without a sector are grouped together.
+    sector_codes = (
+        universe["sector"].fill_null("").cast(polars.Categorical).to_physical()
+    ).to_numpy()
+    sector_count = int(sector_codes.max()) + 1 if len(sector_codes) else 0
+    return _Arrays(
+        height=universe.height,
+        cdf=None if weights is None else snapshot.cdfs[weights],
+        index_weight=index_weight,
+        sector_codes=sector_codes,
+        sector_count=sector_count,
+        index_sector_weight=numpy.bincount(
+            sector_codes, weights=index_weight, minlength=sector_count
+        ),
+    )
+
+
+def _roll(arrays: _Arrays, size, rng: numpy.random.Generator) -> numpy.ndarray:
+    if arrays.cdf is None:
+        return rng.integers(0, arrays.height, size=size)
+    idxs = numpy.searchsorted(arrays.cdf, rng.uniform(0, 1, size=size), side="left")
+    return numpy.minimum(idxs, arrays.height - 1)
+
+
+def _simulate_chunk(
+    arrays: _Arrays, *, k: int, runs: int, seed: numpy.random.SeedSequence
+) -> dict[str, numpy.ndarray]:
+    rng = numpy.random.default_rng(seed)
+    idxs = _roll(arrays, (runs, k), rng)
+
+    # Count how many times each stock was rolled in each portfolio. Buying
+    # the same stock twice doubles its weight.
+    run_of_roll = numpy.repeat(numpy.arange(runs), k)
+    holdings, counts = numpy.unique(
+        run_of_roll * arrays.height + idxs.ravel(), return_counts=True
+    )
+    holding_run = holdings // arrays.height
+    holding_stock = holdings % arrays.height
+    holding_weight = counts / k
+    holding_index_weight = arrays.index_weight[holding_stock]
+
+    hhi = numpy.bincount(holding_run, weights=holding_weight**2, minlength=runs)
+
+    # Active share is half the sum of absolute weight differences. Stocks
+    # that aren't held contribute their whole index weight.
+    held_difference = numpy.bincount(
+        holding_run,
+        weights=numpy.abs(holding_weight - holding_index_weight),
+        minlength=runs,
+    )
+    held_index_weight = numpy.bincount(
+        holding_run, weights=holding_index_weight, minlength=runs
+    )
+    active_share = 0.5 * (held_difference + 1 - held_index_weight)
+
+    portfolio_sector_weight = (
+        numpy.bincount(
+            (run_of_roll * arrays.sector_count + arrays.sector_codes[idxs.ravel()]),
+            minlength=runs * arrays.sector_count,
+        ).reshape(runs, arrays.sector_count)
+        / k
+    )
+    sector_overlap = numpy.minimum(
+        portfolio_sector_weight, arrays.index_sector_weight
+    ).sum(axis=1)
+
+    return {
+        "hhi": hhi,
+        "effective_holdings": 1 / hhi,
+        "sector_overlap": sector_overlap,
+        "active_share": active_share,
+    }
+
+
+_worker_arrays: _Arrays | None = None
+
+
+def _init_worker(arrays: _Arrays):
+    # Send the arrays once per worker rather than once per chunk.
+    global _worker_arrays
+    _worker_arrays = arrays
+
+
+def _simulate_chunk_in_worker(
+    runs: int, seed: numpy.random.SeedSequence, *, k: int
+) -> dict[str, numpy.ndarray]:
+    return _simulate_chunk(_worker_arrays, k=k, runs=runs, seed=seed)
+
+
+def simulate_runs(
+    snapshot: stockdice.dice.Snapshot,
+    *,
+    weights: str | None,
+    k: int,
+    runs: int,
+    seed: int = 0,
+    processes: int | None = None,
+) -> polars.DataFrame:
+    """Simulate portfolios of k equal-dollar rolls.
+
+    Args:
+        snapshot: The universe to roll from.
+        weights:
+            Name of a column in stockdice.dice.WEIGHT_COLUMNS to weight the
+            rolls by or None to weight all stocks evenly.
+        k: Number of rolls in each portfolio.
+        runs: Number of portfolios to simulate.
+        seed:
+            Seed for the random number generator. Results don't depend on
+            whether a process pool is used.
+        processes:
+            Number of worker processes. By default, use all CPUs for large
+            simulations and none for small ones.
+
+    Returns:
+        One row per portfolio with a column for each of METRICS.
+    """
+    stockdice.dice._check_weights(weights)
+    if k < 1 or runs < 1:
+        raise ValueError(f"Expected k and runs to be positive, got {k=} and {runs=}")
+
+    arrays = _arrays(snapshot, weights)
+    chunk_runs = max(1, CHUNK_ROLLS // k)
+    chunks = [min(chunk_runs, runs - start) for start in range(0, runs, chunk_runs)]
+    seeds = numpy.random.SeedSequence(seed).spawn(len(chunks))
+
+    if processes is None:
+        processes = os.cpu_count() if runs * k >= PROCESS_POOL_MIN_ROLLS else 1
+    processes = min(processes or 1, len(chunks))
+
+    if processes <= 1:
+        results = [
+            _simulate_chunk(arrays, k=k, runs=chunk, seed=chunk_seed)
+            for chunk, chunk_seed in zip(chunks, seeds)
+        ]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes,
+            # Forking a web server process with background threads, such as
+            # the roll pool's, can deadlock.
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(arrays,),
+        ) as executor:
+            results = list(
+                executor.map(
+                    functools.partial(_simulate_chunk_in_worker, k=k),
+                    chunks,
+                    seeds,
+                )
+            )
+
+    return polars.DataFrame(
+        {
+            metric: numpy.concatenate([result[metric] for result in results])
+            for metric in METRICS
+        }
+    )
+
+
+def summarize(runs: polars.DataFrame) -> polars.DataFrame:
+    """Describe the distribution of each metric across the simulated runs."""
+    return polars.concat(
+        [
+            runs.select(
+                metric=polars.lit(metric),
+                mean=polars.col(metric).mean(),
+                **{
+                    f"p{percentile:02d}": polars.col(metric).quantile(
+                        percentile / 100, interpolation="linear"
+                    )
+                    for percentile in PERCENTILES
+                },
+            )
+            for metric in METRICS
+        ]
+    )
+
+
+_summaries: collections.OrderedDict[tuple, polars.DataFrame] = collections.OrderedDict()
+_summaries_lock = threading.Lock()
+
+
+def simulate(
+    *,
+    weights: str | None,
+    k: int,
+    runs: int,
+    seed: int = 0,
+    processes: int | None = None,
+    replica_db_path=None,
+) -> polars.DataFrame:
+    """Summarize simulated portfolios from the current snapshot.
+
+    See simulate_runs for the arguments. Results are cached until the
+    snapshot version changes.
+
+    Returns:
+        One row per metric with the mean and PERCENTILES across runs.
+    """
+    snapshot = stockdice.dice.current_snapshot(replica_db_path)
+    key = (snapshot.version, weights, k, runs, seed)
+    with _summaries_lock:
+        if key in _summaries:
+            _summaries.move_to_end(key)
+            return _summaries[key]
+
+    summary = summarize(
+        simulate_runs(
+            snapshot,
+            weights=weights,
+            k=k,
+            runs=runs,
+            seed=seed,
+            processes=processes,
+        )
+    )
+
+    with _summaries_lock:
+        _summaries[key] = summary
+        while len(_summaries) > CACHE_SIZE:
+            _summaries.popitem(last=False)
+    return summary
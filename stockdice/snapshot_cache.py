@@ -0,0 +1,91 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persist the serving universe so that new processes can skip SQL.
+
+Files are Arrow IPC, named by a hash of the snapshot version, so a changed
+replica is never served from a stale file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+
+import polars
+
+
+# Increment when the universe's columns or their meaning change.
+FORMAT_VERSION = 1
+# Keep a few recent snapshots in case multiple replicas are in use.
+MAX_FILES = 3
+SUFFIX = ".arrow"
+
+
+def cache_path(cache_dir, version: tuple) -> pathlib.Path:
+    key = hashlib.sha256(repr((FORMAT_VERSION, version)).encode("utf-8"))
+    return pathlib.Path(cache_dir) / f"{key.hexdigest()}{SUFFIX}"
+
+
+def read(cache_dir, version: tuple) -> polars.DataFrame | None:
+    path = cache_path(cache_dir, version)
+    try:
+        # Memory mapped by default rather than copied, which is safe since
+        # the file never changes.
+        return polars.read_ipc(path)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logging.exception(f"Ignoring unreadable snapshot cache {path}.")
+        return None
+
+
+def write(cache_dir, version: tuple, universe: polars.DataFrame):
+    """Write atomically, then remove all but the newest MAX_FILES files."""
+    cache_dir = pathlib.Path(cache_dir)
+    path = cache_path(cache_dir, version)
+    tmp_path = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=cache_dir, suffix=".tmp", delete=False
+        ) as tmp:
+            tmp_path = tmp.name
+            universe.write_ipc(tmp)
+        os.replace(tmp_path, path)
+        tmp_path = None
+    except OSError:
+        # The cache is only an optimization, for example if the directory is
+        # read-only.
+        logging.exception(f"Unable to write snapshot cache {path}.")
+        return
+    finally:
+        # Don't leave a partial file behind on each failed attempt.
+        if tmp_path is not None:
+            pathlib.Path(tmp_path).unlink(missing_ok=True)
+
+    files = sorted(
+        cache_dir.glob(f"*{SUFFIX}"),
+        key=lambda file: file.stat().st_mtime_ns,
+        reverse=True,
+    )
+    for old in files[MAX_FILES:]:
+        try:
+            old.unlink(missing_ok=True)
+        except OSError:
+            # Might be memory-mapped by another process on some platforms.
+            pass
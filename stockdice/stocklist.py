@@ -18,47 +18,168 @@ import argparse
 import asyncio
 import datetime
 import logging
+from typing import NamedTuple
 
 import httpx
 
 import stockdice.ratelimits
 import stockdice.config
+import stockdice.shards
 import stockdice.timeutils
 
 
 # Only include companies for whom financial statements are available.
 # https://site.financialmodelingprep.com/developer/docs/stable/financial-symbols-list
-FMP_FINANCIAL_STATEMENT_SYMBOL_LIST = "https://financialmodelingprep.com/stable/financial-statement-symbol-list?apikey={apikey}"
+FMP_FINANCIAL_STATEMENT_SYMBOL_LIST = (
+    "https://financialmodelingprep.com/stable/financial-statement-symbol-list"
+)
+
+
+# Columns of the symbol table and the symbol list fields they come from.
+_COLUMNS = {
+    "company_name": "companyName",
+    "trading_currency": "tradingCurrency",
+    "reporting_currency": "reportingCurrency",
+}
+
+LISTED = "listed"
+DELISTED = "delisted"
+
+# Only a handful of symbols are delisted between downloads. Losing more than
+# this fraction at once is more likely a bad response, such as an empty list
+# from a transient fault, than a real mass delisting.
+MAX_DELISTED_FRACTION = 0.1
+
+
+class SymbolListChanges(NamedTuple):
+    listed: list[str]
+    updated: list[str]
+    delisted: list[str]
 
 
 @stockdice.ratelimits.retry_fmp
-async def download_symbol_list(*, client: httpx.AsyncClient):
+async def download_symbol_list(*, client: httpx.AsyncClient) -> SymbolListChanges:
     db = stockdice.config.config.db
-    url = FMP_FINANCIAL_STATEMENT_SYMBOL_LIST.format(
-        apikey=stockdice.config.FMP_API_KEY
-    )
+    url = FMP_FINANCIAL_STATEMENT_SYMBOL_LIST
     last_updated_us = stockdice.timeutils.now_in_microseconds()
 
     resp = await stockdice.ratelimits.get(client, url)
     resp_json = stockdice.ratelimits.check_status(resp)
 
+    changes = update_symbol_list(db, resp_json, now_us=last_updated_us)
+    logging.info(
+        f"Symbol list: {len(changes.listed)} listed, {len(changes.updated)} "
+        f"updated, {len(changes.delisted)} delisted."
+    )
+    return changes
+
+
+def update_symbol_list(
+    db,
+    symbols: list[dict],
+    *,
+    now_us: int,
+    max_delisted_fraction: float = MAX_DELISTED_FRACTION,
+) -> SymbolListChanges:
+    """Replace the symbol table with symbols, writing only what changed.
+
+    Nearly every symbol is the same from one download to the next, so
+    rewriting them all would only grow the WAL and the next backup. Symbols
+    that are added or removed are recorded in symbol_event, except when the
+    table starts out empty.
+
+    Raises:
+        ValueError:
+            If more than max_delisted_fraction of the existing symbols would
+            be removed. Nothing is written.
+    """
+    existing = {
+        row[0]: row[1:]
+        for row in db.execute(f"SELECT symbol, {', '.join(_COLUMNS)} FROM symbol;")
+    }
+    latest = {
+        item["symbol"]: tuple(item.get(field) for field in _COLUMNS.values())
+        for item in symbols
+    }
+
+    listed = [symbol for symbol in latest if symbol not in existing]
+    updated = [
+        symbol
+        for symbol, values in latest.items()
+        if symbol in existing and existing[symbol] != values
+    ]
+    delisted = [symbol for symbol in existing if symbol not in latest]
+    if existing and len(delisted) > max_delisted_fraction * len(existing):
+        raise ValueError(
+            f"Refusing to delist {len(delisted)} of {len(existing)} symbols. "
+            f"The downloaded list has {len(latest)} symbols."
+        )
+
+    db.executemany(
+        """
+        INSERT INTO symbol (
+            symbol, company_name, trading_currency, reporting_currency,
+            last_updated_us
+        ) VALUES (
+            :symbol, :company_name, :trading_currency, :reporting_currency,
+            :last_updated_us
+        ) ON CONFLICT (symbol) DO UPDATE SET
+            company_name = excluded.company_name,
+            trading_currency = excluded.trading_currency,
+            reporting_currency = excluded.reporting_currency,
+            last_updated_us = excluded.last_updated_us;
+        """,
+        [
+            {
+                "symbol": symbol,
+                **dict(zip(_COLUMNS, latest[symbol])),
+                "last_updated_us": now_us,
+            }
+            for symbol in listed + updated
+        ],
+    )
     db.executemany(
-        f"""INSERT INTO symbol
-        (symbol, company_name, trading_currency, reporting_currency, last_updated_us)
-        VALUES (:symbol, :companyName, :tradingCurrency, :reportingCurrency, {last_updated_us})
-        ON CONFLICT(symbol) DO UPDATE
-        SET company_name=excluded.company_name,
-        trading_currency = excluded.trading_currency,
-        reporting_currency = excluded.trading_currency,
-        last_updated_us = excluded.last_updated_us;
+        "DELETE FROM symbol WHERE symbol = ?;",
+        [(symbol,) for symbol in delisted],
+    )
+
+    # On the first download, every symbol is new, which isn't news.
+    if existing:
+        db.executemany(
+            """
+            INSERT INTO symbol_event (symbol, event, company_name, event_us)
+            VALUES (?, ?, ?, ?);
+            """,
+            [(symbol, LISTED, latest[symbol][0], now_us) for symbol in listed]
+            + [(symbol, DELISTED, existing[symbol][0], now_us) for symbol in delisted],
+        )
+    db.execute(
+        """
+        INSERT OR REPLACE INTO symbol_list_download (
+            last_updated_us, listed, updated, delisted
+        ) VALUES (?, ?, ?, ?);
         """,
-        resp_json,
+        (now_us, len(listed), len(updated), len(delisted)),
     )
-    db.execute(f"DELETE FROM symbol WHERE last_updated_us <> {last_updated_us};")
     db.commit()
+    return SymbolListChanges(listed=listed, updated=updated, delisted=delisted)
+
+
+def last_updated_us(db) -> int | None:
+    """When the symbol list was last downloaded, or None if it never was."""
+    # Fall back to the symbol table for lists downloaded before downloads
+    # were recorded.
+    return db.execute(
+        """
+        SELECT COALESCE(
+            (SELECT MAX(last_updated_us) FROM symbol_list_download),
+            (SELECT MAX(last_updated_us) FROM symbol)
+        );
+        """
+    ).fetchone()[0]
 
 
-def list_symbols():
+def list_symbols(shard: stockdice.shards.Shard | None = None):
     db = stockdice.config.config.db
     # TODO: support global stocks.
     return [
@@ -66,4 +187,5 @@ def list_symbols():
         for row in db.execute(
             "SELECT symbol FROM symbol WHERE trading_currency = 'USD';"
         )
+        if shard is None or shard.contains(row[0])
     ]
@@ -12,83 +12,198 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""When the New York Stock Exchange is open.
+
+Sessions for each year are computed from the NYSE holiday rules the first
+time they're needed and cached, so looking up a date is a dictionary lookup.
+See: https://www.nyse.com/markets/hours-calendars
+"""
+
 from __future__ import annotations
 
 import datetime
+import functools
 import zoneinfo
+from typing import NamedTuple
 
 NEW_YORK = zoneinfo.ZoneInfo("America/New_York")
 NEW_YORK_START_TIME = datetime.time(9, 30)
 NEW_YORK_END_TIME = datetime.time(16, 0)
-
-
-def is_new_york_regular_trading_hours(now: datetime.datetime | None = None) -> bool:
-    if now is None:
-        now = datetime.datetime.now(NEW_YORK)
-
-    # Monday is 0, ..., Saturday is 5, Sunday is 6.
-    if now.weekday() > 4:
-        return False
-
-    start_time = datetime.datetime(
-        now.year,
-        now.month,
-        now.day,
-        NEW_YORK_START_TIME.hour,
-        NEW_YORK_START_TIME.minute,
-        tzinfo=NEW_YORK,
+NEW_YORK_EARLY_CLOSE_TIME = datetime.time(13, 0)
+
+# Closures that don't follow the usual rules, such as national days of
+# mourning and weather. Add new ones as they're announced.
+SPECIAL_CLOSURES = frozenset(
+    (
+        datetime.date(2012, 10, 29),  # Hurricane Sandy
+        datetime.date(2012, 10, 30),  # Hurricane Sandy
+        datetime.date(2018, 12, 5),  # President George H.W. Bush
+        datetime.date(2025, 1, 9),  # President Jimmy Carter
+    )
+)
+
+# Juneteenth became an NYSE holiday in 2022.
+JUNETEENTH_FIRST_YEAR = 2022
+
+# Monday is 0, ..., Saturday is 5, Sunday is 6.
+_MONDAY = 0
+_THURSDAY = 3
+_SATURDAY = 5
+_SUNDAY = 6
+
+
+class Session(NamedTuple):
+    open: datetime.datetime
+    close: datetime.datetime
+
+    def contains(self, now: datetime.datetime) -> bool:
+        return self.open <= now <= self.close
+
+
+def _easter(year: int) -> datetime.date:
+    # Anonymous Gregorian algorithm. See:
+    # https://en.wikipedia.org/wiki/Date_of_Easter#Anonymous_Gregorian_algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7  # noqa: E741
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> datetime.date:
+    first = datetime.date(year, month, 1)
+    offset = (weekday - first.weekday()) % 7
+    return first + datetime.timedelta(days=offset + 7 * (n - 1))
+
+
+def _last_weekday(year: int, month: int, weekday: int) -> datetime.date:
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: datetime.date) -> datetime.date:
+    # Holidays on a Saturday are observed on Friday, on a Sunday on Monday.
+    if day.weekday() == _SATURDAY:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == _SUNDAY:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+def holidays(year: int) -> frozenset[datetime.date]:
+    """Weekdays in year when the NYSE is closed all day."""
+    new_years_day = datetime.date(year, 1, 1)
+    thanksgiving = _nth_weekday(year, 11, _THURSDAY, 4)
+    days = {
+        _easter(year) - datetime.timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 1, _MONDAY, 3),  # Martin Luther King, Jr. Day
+        _nth_weekday(year, 2, _MONDAY, 3),  # Washington's Birthday
+        _last_weekday(year, 5, _MONDAY),  # Memorial Day
+        _observed(datetime.date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, _MONDAY, 1),  # Labor Day
+        thanksgiving,
+        _observed(datetime.date(year, 12, 25)),  # Christmas Day
+    }
+    # Unlike other holidays, New Year's Day on a Saturday isn't observed on
+    # the Friday before, since that would close the last day of the year.
+    if new_years_day.weekday() != _SATURDAY:
+        days.add(_observed(new_years_day))
+    if year >= JUNETEENTH_FIRST_YEAR:
+        days.add(_observed(datetime.date(year, 6, 19)))
+    days.update(day for day in SPECIAL_CLOSURES if day.year == year)
+    return frozenset(days)
+
+
+def early_closes(year: int) -> frozenset[datetime.date]:
+    """Days in year when the NYSE closes at 1:00 p.m."""
+    thanksgiving = _nth_weekday(year, 11, _THURSDAY, 4)
+    candidates = (
+        # The day before Independence Day, unless it's the observed holiday.
+        datetime.date(year, 7, 3),
+        thanksgiving + datetime.timedelta(days=1),
+        # Christmas Eve, unless it's the observed holiday.
+        datetime.date(year, 12, 24),
     )
-    end_time = datetime.datetime(
-        now.year,
-        now.month,
-        now.day,
-        NEW_YORK_END_TIME.hour,
-        NEW_YORK_END_TIME.minute,
-        tzinfo=NEW_YORK,
+    closed = holidays(year)
+    return frozenset(
+        day for day in candidates if day.weekday() < _SATURDAY and day not in closed
     )
 
-    # TODO: Do we want to include logic for holidays?
-    return start_time <= now <= end_time
 
+def _at(day: datetime.date, time: datetime.time) -> datetime.datetime:
+    return datetime.datetime.combine(day, time, tzinfo=NEW_YORK)
 
-def _days_to_next_trading(weekday: int):
-    # Monday is 0, ..., Saturday is 5, Sunday is 6.
-    if weekday < 4:
-        return 1
-    return 7 - weekday
 
+@functools.cache
+def _sessions(year: int) -> dict[datetime.date, Session]:
+    closed = holidays(year)
+    early = early_closes(year)
+    sessions = {}
+    day = datetime.date(year, 1, 1)
+    while day.year == year:
+        if day.weekday() < _SATURDAY and day not in closed:
+            end_time = NEW_YORK_EARLY_CLOSE_TIME if day in early else NEW_YORK_END_TIME
+            sessions[day] = Session(
+                open=_at(day, NEW_YORK_START_TIME), close=_at(day, end_time)
+            )
+        day += datetime.timedelta(days=1)
+    return sessions
 
-def _is_before_regular_trading_hours(now: datetime.datetime):
-    if now.weekday() > 4:
-        return False
 
-    if now.hour < NEW_YORK_START_TIME.hour:
-        return True
+def session(day: datetime.date) -> Session | None:
+    """The regular trading session on day, or None if the market is closed."""
+    return _sessions(day.year).get(day)
 
-    if now.hour > NEW_YORK_START_TIME.hour:
-        return False
 
-    return now.minute <= NEW_YORK_START_TIME.minute
+def _now(now: datetime.datetime | None) -> datetime.datetime:
+    if now is None:
+        return datetime.datetime.now(NEW_YORK)
+    return now.astimezone(NEW_YORK)
+
+
+def current_session(now: datetime.datetime | None = None) -> Session | None:
+    """The session in progress, or None outside of regular trading hours."""
+    now = _now(now)
+    today = session(now.date())
+    if today is None or not today.contains(now):
+        return None
+    return today
+
 
+def next_session(now: datetime.datetime | None = None) -> Session:
+    """The session in progress or, if there isn't one, the next to open."""
+    now = _now(now)
+    day = now.date()
+    while True:
+        upcoming = session(day)
+        if upcoming is not None and now <= upcoming.close:
+            return upcoming
+        day += datetime.timedelta(days=1)
+
+
+def is_new_york_regular_trading_hours(now: datetime.datetime | None = None) -> bool:
+    return current_session(now) is not None
 
-def seconds_to_next_new_york_trading_hours() -> float:
-    now = datetime.datetime.now(NEW_YORK)
 
-    if is_new_york_regular_trading_hours(now):
+def seconds_to_next_new_york_trading_hours(
+    now: datetime.datetime | None = None,
+) -> float:
+    now = _now(now)
+    upcoming = next_session(now)
+    if upcoming.contains(now):
         return 0
 
-    if _is_before_regular_trading_hours(now):
-        next_trading_day = now
-    else:
-        days = _days_to_next_trading(now.weekday())
-        next_trading_day = now + datetime.timedelta(days=days)
-
-    start_of_trading = datetime.datetime(
-        year=next_trading_day.year,
-        month=next_trading_day.month,
-        day=next_trading_day.day,
-        hour=NEW_YORK_START_TIME.hour,
-        minute=NEW_YORK_START_TIME.minute,
-        tzinfo=NEW_YORK,
+    # Subtract in UTC. Python ignores the UTC offsets when subtracting times
+    # with the same tzinfo, which would be off by an hour across a daylight
+    # saving time change.
+    utc = datetime.timezone.utc
+    return (upcoming.open.astimezone(utc) - now.astimezone(utc)) / datetime.timedelta(
+        seconds=1
     )
-    return (start_of_trading - now) / datetime.timedelta(seconds=1)
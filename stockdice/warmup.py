@@ -0,0 +1,92 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Load everything the first request needs before serving traffic.
+
+Warm-up runs in a background thread so that the server can start listening
+and answer health checks right away. The /readyz endpoint reports ready once
+warm-up finishes.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+import flask
+
+import stockdice.dice
+import stockdice.rollpool
+
+
+EXTENSION_KEY = "stockdice.warmup"
+RETRY_SECONDS = 10.0
+# Weighting schemes used by the pages, which should have their pools filled.
+ROLL_POOL_WEIGHTS = (None, "marketCapUSD")
+
+
+class WarmUp:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.error: str | None = None
+        self.seconds: float | None = None
+
+
+def warm_up(app: flask.Flask):
+    """Load the snapshot, fill the roll pools, and compile the templates."""
+    stockdice.dice.current_snapshot()
+    for weights in ROLL_POOL_WEIGHTS:
+        stockdice.rollpool.get_pool(weights)
+
+    # Jinja caches compiled templates, so loading them here means the first
+    # render doesn't have to parse them.
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def _warm_up_forever(app: flask.Flask, state: WarmUp):
+    start = time.perf_counter()
+    while True:
+        try:
+            warm_up(app)
+        except Exception as exp:
+            # For example, the replica might not be uploaded yet.
+            state.error = repr(exp)
+            logging.exception(f"Warm-up failed. Retrying in {RETRY_SECONDS} seconds.")
+            time.sleep(RETRY_SECONDS)
+        else:
+            state.error = None
+            state.seconds = time.perf_counter() - start
+            logging.info(f"Warm-up finished in {state.seconds:.2f} seconds.")
+            state.ready.set()
+            return
+
+
+def start(app: flask.Flask, *, background: bool = True) -> WarmUp:
+    state = WarmUp()
+    app.extensions[EXTENSION_KEY] = state
+    if background:
+        threading.Thread(
+            target=_warm_up_forever, args=(app, state), name="warmup", daemon=True
+        ).start()
+    else:
+        _warm_up_forever(app, state)
+    return state
+
+
+def is_ready(app: flask.Flask) -> bool:
+    state = app.extensions.get(EXTENSION_KEY)
+    # Without warm-up, requests load whatever they need on demand.
+    return state is None or state.ready.is_set()
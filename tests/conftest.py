@@ -19,10 +19,11 @@ from stockdice import create_app
 
 @pytest.fixture()
 def app():
-    app = create_app()
-    app.config.update(
+    app = create_app(
         {
             "TESTING": True,
+            # Tests don't have a replica database to load.
+            "WARM_UP": False,
         }
     )
 
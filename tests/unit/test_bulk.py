@@ -0,0 +1,191 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import sqlite3
+
+import httpx
+import pytest
+
+import stockdice.bulk
+import stockdice.db
+import stockdice.negative_cache
+import stockdice.ratelimits
+
+
+NOW_US = 1_750_000_000_000_000
+
+
+@pytest.fixture()
+def db():
+    db = sqlite3.connect(":memory:")
+    stockdice.db.create_all_tables(db, reset=False)
+    stockdice.db.migrate(db)
+    yield db
+    db.close()
+
+
+@pytest.fixture()
+def key_pool():
+    stockdice.ratelimits.use_key_pool(
+        stockdice.ratelimits.KeyPool(
+            [stockdice.ratelimits.ApiKey("key-a", seconds_between_requests=0.0)]
+        )
+    )
+    yield
+    stockdice.ratelimits.use_key_pool(None)
+
+
+def _write_csv(tmp_path, text, name="bulk.csv"):
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+
+def test_ingest_csv_casts_like_normalize_rows(db, tmp_path):
+    path = _write_csv(
+        tmp_path,
+        "symbol,price,marketCap,fullTimeEmployees,volume,isEtf,isFund,notAColumn\n"
+        "AAPL,201.5,3.5e12,,12345,false,FALSE,x\n"
+        "SPY,600,123,n/a,inf,true,false,y\n",
+    )
+
+    assert stockdice.bulk.ingest_csv(db, "company_profile", path, now_us=NOW_US) == 2
+
+    assert db.execute(
+        """
+        SELECT symbol, price, marketCap, fullTimeEmployees, volume, isEtf, isFund,
+            last_updated_us
+        FROM company_profile
+        ORDER BY symbol;
+        """
+    ).fetchall() == [
+        ("AAPL", 201.5, 3_500_000_000_000, None, 12345, 0, 0, NOW_US),
+        ("SPY", 600.0, 123, None, None, 1, 0, NOW_US),
+    ]
+
+
+@pytest.mark.parametrize(
+    "chunk_rows",
+    (
+        pytest.param(1, id="one-row-chunks"),
+        pytest.param(1000, id="one-chunk"),
+    ),
+)
+def test_ingest_csv_upserts_statements(db, tmp_path, chunk_rows):
+    db.execute(
+        """
+        INSERT INTO income (symbol, fiscalYear, period, revenue, cik, last_updated_us)
+        VALUES ('AAPL', 2023, 'FY', 1, '0000320193', 0);
+        """
+    )
+    path = _write_csv(
+        tmp_path,
+        "symbol,fiscalYear,period,revenue,netIncome\n"
+        "AAPL,2023,FY,100,10\n"
+        "AAPL,2024,FY,200,20\n"
+        # Rows without a complete key are skipped.
+        ",2024,FY,300,30\n"
+        "MSFT,,FY,400,40\n",
+    )
+
+    assert (
+        stockdice.bulk.ingest_csv(
+            db, "income", path, now_us=NOW_US, chunk_rows=chunk_rows
+        )
+        == 4
+    )
+
+    assert db.execute(
+        """
+        SELECT symbol, fiscalYear, period, revenue, netIncome, cik, last_updated_us
+        FROM income
+        ORDER BY symbol, fiscalYear;
+        """
+    ).fetchall() == [
+        # Columns that aren't in the file are kept.
+        ("AAPL", 2023, "FY", 100, 10, "0000320193", NOW_US),
+        ("AAPL", 2024, "FY", 200, 20, None, NOW_US),
+    ]
+    assert db.execute(
+        "SELECT symbol, fiscalYear, revenue FROM latest_fy_income;"
+    ).fetchall() == [("AAPL", 2024, 200)]
+
+
+def test_ingest_csv_clears_negative_cache(db, tmp_path):
+    for symbol in ("AAPL", "DEAD"):
+        stockdice.negative_cache.record_miss(
+            db, "balance_sheet", symbol=symbol, now_us=0
+        )
+    path = _write_csv(
+        tmp_path, "symbol,fiscalYear,period,totalAssets\nAAPL,2024,FY,1000\n"
+    )
+
+    stockdice.bulk.ingest_csv(db, "balance_sheet", path, now_us=NOW_US)
+
+    assert db.execute("SELECT symbol FROM balance_sheet_missing;").fetchall() == [
+        ("DEAD",)
+    ]
+
+
+def test_ingest_csv_missing_key_column_raises(db, tmp_path):
+    path = _write_csv(tmp_path, "symbol,period,revenue\nAAPL,FY,1\n")
+    with pytest.raises(ValueError, match="fiscalYear"):
+        stockdice.bulk.ingest_csv(db, "income", path, now_us=NOW_US)
+
+
+def test_download_files_profile_parts(tmp_path, key_pool):
+    requested = []
+
+    def handler(request):
+        requested.append(dict(request.url.params))
+        part = int(request.url.params["part"])
+        if part >= 2:
+            return httpx.Response(200, content=b"[]")
+        return httpx.Response(200, content=f"symbol\nS{part}\n".encode())
+
+    async def download():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await stockdice.bulk.download_files(
+                "profile", client=client, directory=tmp_path
+            )
+
+    paths = asyncio.run(download())
+
+    assert [path.read_text() for path in paths] == ["symbol\nS0\n", "symbol\nS1\n"]
+    assert requested == [
+        {"part": "0", "apikey": "key-a"},
+        {"part": "1", "apikey": "key-a"},
+        {"part": "2", "apikey": "key-a"},
+    ]
+    assert not list(tmp_path.glob("*.partial"))
+
+
+def test_download_bulk_error_raises(tmp_path, key_pool):
+    def handler(request):
+        return httpx.Response(200, json={"Error Message": "Premium endpoint."})
+
+    async def download():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await stockdice.bulk.download_bulk(
+                client,
+                stockdice.bulk.FMP_INCOME_BULK.format(year=2024),
+                tmp_path / "income.csv",
+            )
+
+    with pytest.raises(ValueError, match="Premium"):
+        asyncio.run(download())
+    assert not (tmp_path / "income.csv").exists()
@@ -0,0 +1,112 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import httpx
+import pytest
+
+import stockdice.coalesce
+import stockdice.ratelimits
+
+
+URL = "https://example.com/batch-quote?symbols={symbols}"
+
+
+@pytest.fixture(autouse=True)
+def key_pool():
+    stockdice.ratelimits.use_key_pool(
+        stockdice.ratelimits.KeyPool(
+            [stockdice.ratelimits.ApiKey("key-a", seconds_between_requests=0.0)]
+        )
+    )
+    yield
+    stockdice.ratelimits.use_key_pool(None)
+
+
+def _quote_all(symbols, handler, **kwargs):
+    coalescer = stockdice.coalesce.Coalescer(URL, **kwargs)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await asyncio.gather(
+                *[coalescer.get(client, symbol) for symbol in symbols],
+                return_exceptions=True,
+            )
+
+    return coalescer, asyncio.run(run())
+
+
+def _quotes(request):
+    symbols = request.url.params["symbols"].split(",")
+    return httpx.Response(
+        200,
+        json=[
+            {"symbol": symbol, "price": float(len(symbol))}
+            for symbol in symbols
+            if symbol != "MISSING"
+        ],
+    )
+
+
+def test_coalescer_batches_requests():
+    symbols = [f"S{i}" for i in range(250)]
+    coalescer, got = _quote_all(symbols, _quotes, max_batch_size=100)
+
+    assert coalescer.requests == 3
+    assert got == [
+        {"symbol": symbol, "price": float(len(symbol))} for symbol in symbols
+    ]
+
+
+def test_coalescer_duplicate_and_missing_symbols():
+    coalescer, got = _quote_all(["AAPL", "MISSING", "AAPL"], _quotes)
+
+    assert coalescer.requests == 1
+    assert got == [
+        {"symbol": "AAPL", "price": 4.0},
+        None,
+        {"symbol": "AAPL", "price": 4.0},
+    ]
+
+
+def test_coalescer_retries_rate_limit_once_per_batch(monkeypatch):
+    monkeypatch.setattr(stockdice.ratelimits, "RATE_LIMIT_MINIMUM_SECONDS", 0.0)
+    monkeypatch.setattr(stockdice.ratelimits.random, "random", lambda: 0.0)
+    responses = []
+
+    def handler(request):
+        if not responses:
+            responses.append(429)
+            return httpx.Response(stockdice.ratelimits.RATE_LIMIT_STATUS)
+        responses.append(200)
+        return _quotes(request)
+
+    coalescer, got = _quote_all(["AAPL", "MSFT"], handler)
+
+    assert responses == [429, 200]
+    assert got == [
+        {"symbol": "AAPL", "price": 4.0},
+        {"symbol": "MSFT", "price": 4.0},
+    ]
+
+
+def test_coalescer_fans_out_errors():
+    def handler(request):
+        return httpx.Response(200, content=b"not json")
+
+    _, got = _quote_all(["AAPL", "MSFT"], handler)
+
+    assert len(got) == 2
+    assert all(isinstance(error, ValueError) for error in got)
@@ -0,0 +1,94 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import sys
+import time
+
+import stockdice.config
+
+
+SECRETS = {
+    "bucket": "stockdice-backups",
+    "backup_interval_seconds": "3600",
+    "FMP_API_KEY": "not-a-real-key",
+    "requests_per_minute": "300",
+}
+
+
+def test_import_is_lazy():
+    # Run in a fresh interpreter, since other tests may have loaded the config.
+    code = """
+import sys
+import stockdice.config
+import stockdice.dice
+import stockdice.ratelimits
+assert stockdice.config._config is None
+assert not any(name.startswith("google") for name in sys.modules), sorted(
+    name for name in sys.modules if name.startswith("google")
+)
+"""
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        cwd=stockdice.config.REPO_ROOT,
+    )
+
+
+def test_secrets_cache_round_trip(tmp_path):
+    path = tmp_path / "secrets_cache.toml"
+    assert stockdice.config.read_secrets_cache("my-project", path=path) is None
+
+    stockdice.config.write_secrets_cache("my-project", SECRETS, path=path)
+
+    assert stockdice.config.read_secrets_cache("my-project", path=path) == SECRETS
+    assert stockdice.config.read_secrets_cache("other-project", path=path) is None
+    assert stockdice.config.read_secrets_cache(None, path=path) is None
+    assert os.stat(path).st_mode & 0o077 == 0
+
+
+def test_secrets_cache_expires(tmp_path):
+    path = tmp_path / "secrets_cache.toml"
+    stockdice.config.write_secrets_cache(None, SECRETS, path=path)
+    expired = time.time() - stockdice.config.SECRETS_CACHE_TTL_SECONDS - 1
+    os.utime(path, (expired, expired))
+
+    assert stockdice.config.read_secrets_cache(None, path=path) is None
+
+
+def test_secrets_cache_missing_keys(tmp_path):
+    path = tmp_path / "secrets_cache.toml"
+    stockdice.config.write_secrets_cache(None, {"bucket": "only-one"}, path=path)
+
+    assert stockdice.config.read_secrets_cache(None, path=path) is None
+
+
+def test_sink_belongs_to_config(tmp_path):
+    configs = []
+    for name in ("first", "second"):
+        config = stockdice.config.Config({})
+        config.db_path = tmp_path / f"{name}.sqlite"
+        configs.append(config)
+
+    try:
+        first, second = configs
+        assert first.sink is first.sink
+        assert first.sink._db is first.db
+        # A new connection never gets another connection's sink.
+        assert second.sink is not first.sink
+        assert second.sink._db is second.db
+    finally:
+        for config in configs:
+            config.db.close()
@@ -0,0 +1,299 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+
+import pytest
+
+import stockdice.db
+
+
+@pytest.fixture()
+def db():
+    db = sqlite3.connect(":memory:")
+    stockdice.db.create_all_tables(db, reset=False)
+    yield db
+    db.close()
+
+
+def _insert_income(db, symbol, fiscal_year, revenue, period="FY"):
+    db.execute(
+        """
+        INSERT INTO income (symbol, fiscalYear, period, revenue, last_updated_us)
+        VALUES (:symbol, :fiscalYear, :period, :revenue, 0)
+        ON CONFLICT (symbol, fiscalYear, period) DO UPDATE SET
+            revenue = excluded.revenue;
+        """,
+        {
+            "symbol": symbol,
+            "fiscalYear": fiscal_year,
+            "period": period,
+            "revenue": revenue,
+        },
+    )
+
+
+def _latest_income(db):
+    return db.execute(
+        """
+        SELECT symbol, fiscalYear, revenue
+        FROM latest_fy_income
+        ORDER BY symbol;
+        """
+    ).fetchall()
+
+
+def test_latest_fy_income_keeps_most_recent_year(db):
+    _insert_income(db, "AAPL", 2023, 100)
+    _insert_income(db, "AAPL", 2024, 200)
+    _insert_income(db, "AAPL", 2022, 50)
+    _insert_income(db, "MSFT", 2024, 300)
+    assert _latest_income(db) == [("AAPL", 2024, 200), ("MSFT", 2024, 300)]
+
+
+def test_latest_fy_income_ignores_other_periods(db):
+    _insert_income(db, "AAPL", 2024, 200)
+    _insert_income(db, "AAPL", 2025, 10, period="Q1")
+    _insert_income(db, "AAPL", None, None, period=None)
+    assert _latest_income(db) == [("AAPL", 2024, 200)]
+
+
+def test_latest_fy_income_updates_on_upsert(db):
+    _insert_income(db, "AAPL", 2024, 200)
+    _insert_income(db, "AAPL", 2024, 250)
+    _insert_income(db, "AAPL", 2023, 125)
+    assert _latest_income(db) == [("AAPL", 2024, 250)]
+
+
+def test_latest_fy_income_falls_back_on_delete(db):
+    _insert_income(db, "AAPL", 2023, 100)
+    _insert_income(db, "AAPL", 2024, 200)
+    db.execute("DELETE FROM income WHERE symbol = 'AAPL' AND fiscalYear = 2024;")
+    assert _latest_income(db) == [("AAPL", 2023, 100)]
+
+
+def test_latest_fy_backfills_existing_statements():
+    db = sqlite3.connect(":memory:")
+    stockdice.db.create_balance_sheet(db, reset=False)
+    db.executemany(
+        """
+        INSERT INTO balance_sheet (symbol, fiscalYear, period, totalAssets)
+        VALUES (?, ?, 'FY', ?);
+        """,
+        [("AAPL", 2023, 1), ("AAPL", 2024, 2), ("MSFT", 2022, 3)],
+    )
+    stockdice.db.create_latest_fy_balance_sheet(db, reset=False)
+    assert db.execute(
+        """
+        SELECT symbol, fiscalYear, totalAssets
+        FROM latest_fy_balance_sheet
+        ORDER BY symbol;
+        """
+    ).fetchall() == [("AAPL", 2024, 2), ("MSFT", 2022, 3)]
+
+
+def test_migrate_new_database(db):
+    assert stockdice.db.schema_version(db) == len(stockdice.db.MIGRATIONS)
+
+    # Running again is a no-op.
+    stockdice.db.migrate(db)
+    assert stockdice.db.schema_version(db) == len(stockdice.db.MIGRATIONS)
+
+
+def test_migrate_unversioned_database():
+    db = sqlite3.connect(":memory:")
+    stockdice.db.create_income(db, reset=False)
+    _insert_income(db, "AAPL", 2024, 200)
+    db.commit()
+    assert stockdice.db.schema_version(db) == 0
+
+    stockdice.db.migrate(db)
+
+    assert stockdice.db.schema_version(db) == len(stockdice.db.MIGRATIONS)
+    assert _latest_income(db) == [("AAPL", 2024, 200)]
+
+
+def test_migrate_newer_database_raises(db):
+    db.execute(f"PRAGMA user_version = {len(stockdice.db.MIGRATIONS) + 1};")
+    with pytest.raises(ValueError, match="newer"):
+        stockdice.db.migrate(db)
+
+
+def test_reset_drops_data(db):
+    _insert_income(db, "AAPL", 2024, 200)
+    db.commit()
+    stockdice.db.create_all_tables(db, reset=True)
+    assert _latest_income(db) == []
+    assert db.execute("SELECT COUNT(*) FROM income;").fetchone()[0] == 0
+
+
+@pytest.mark.parametrize(
+    ("query", "expected_index"),
+    (
+        pytest.param(
+            """
+            SELECT *
+            FROM company_profile
+            WHERE isEtf = false
+            AND isFund = false;
+            """,
+            "company_profile_stocks",
+            id="company_profile-stocks",
+        ),
+        pytest.param(
+            "SELECT * FROM forex WHERE to_currency = 'USD';",
+            "forex_to_currency",
+            id="forex-to-usd",
+        ),
+        pytest.param(
+            "SELECT symbol FROM symbol WHERE trading_currency = 'USD';",
+            "COVERING INDEX symbol_trading_currency",
+            id="symbol-trading-currency",
+        ),
+        pytest.param(
+            """
+            SELECT last_updated_us
+            FROM income
+            WHERE symbol = 'AAPL'
+            ORDER BY last_updated_us DESC
+            LIMIT 1;
+            """,
+            "COVERING INDEX income_last_updated",
+            id="income-last-updated",
+        ),
+    ),
+)
+def test_hot_queries_use_index(db, query, expected_index):
+    plan = " ".join(row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {query}"))
+    assert expected_index in plan
+
+
+@pytest.mark.parametrize("table", ("income", "balance_sheet"))
+def test_filing_history_uses_fy_index(db, table):
+    # The query planner prefers the primary key unless it has statistics
+    # showing that most rows aren't annual statements.
+    db.executemany(
+        f"""
+        INSERT INTO {table} (symbol, fiscalYear, period, date)
+        VALUES (?, ?, ?, '2024-12-31');
+        """,
+        [
+            (f"S{symbol}", year, period)
+            for symbol in range(50)
+            for year in range(2015, 2025)
+            for period in ("FY", "Q1", "Q2", "Q3", "Q4")
+        ],
+    )
+    db.execute("ANALYZE;")
+
+    plan = " ".join(
+        row[3]
+        for row in db.execute(
+            f"""
+            EXPLAIN QUERY PLAN
+            SELECT fiscalYear, date, filingDate, acceptedDate
+            FROM {table}
+            WHERE symbol = 'S1'
+            AND period = 'FY'
+            ORDER BY fiscalYear DESC
+            LIMIT 5;
+            """
+        )
+    )
+    assert f"{table}_fy" in plan
+
+
+def test_convert_to_strict(db):
+    db.execute(
+        """
+        INSERT INTO symbol (symbol, company_name, trading_currency)
+        VALUES ('600519.SS', 'Kweichow Moutai', 'CNY');
+        """
+    )
+    db.execute(
+        """
+        INSERT INTO company_profile (symbol, marketCap, fullTimeEmployees, isEtf, isFund)
+        VALUES ('AAPL', 3.5e12, '', false, false);
+        """
+    )
+    _insert_income(db, "AAPL", "2024", "200")
+    db.commit()
+
+    stockdice.db.convert_all_to_strict(db)
+
+    for table in ("symbol", "company_profile", "income", "latest_fy_income"):
+        assert stockdice.db.is_strict(db, table)
+    assert db.execute(
+        "SELECT marketCap, fullTimeEmployees FROM company_profile;"
+    ).fetchall() == [(3_500_000_000_000, None)]
+
+    # Indexes and triggers still work after the conversion.
+    assert "company_profile_stocks" in " ".join(
+        row[3]
+        for row in db.execute(
+            """
+            EXPLAIN QUERY PLAN
+            SELECT * FROM company_profile WHERE isEtf = false AND isFund = false;
+            """
+        )
+    )
+    _insert_income(db, "AAPL", 2025, 300)
+    assert _latest_income(db) == [("AAPL", 2025, 300)]
+
+    # Re-running is a no-op.
+    stockdice.db.convert_all_to_strict(db)
+
+
+def test_normalize_rows(db):
+    rows = [
+        {
+            "symbol": "AAPL",
+            "price": "201.5",
+            "marketCap": 3.5e12,
+            "fullTimeEmployees": "",
+            "volume": "12345",
+            "changePercentage": 1,
+            "isEtf": False,
+            "notAColumn": "",
+        }
+    ]
+    assert stockdice.db.normalize_rows(db, "company_profile", rows) == [
+        {
+            "symbol": "AAPL",
+            "price": 201.5,
+            "marketCap": 3_500_000_000_000,
+            "fullTimeEmployees": None,
+            "volume": 12345,
+            "changePercentage": 1.0,
+            "isEtf": False,
+            "notAColumn": "",
+        }
+    ]
+
+
+def test_analyze_copy(tmp_path):
+    path = tmp_path / "stockdice_backup.sqlite"
+    with sqlite3.connect(path) as db:
+        stockdice.db.create_all_tables(db, reset=False)
+        _insert_income(db, "AAPL", 2024, 200)
+        db.commit()
+    db.close()
+
+    stockdice.db.analyze(path)
+
+    db = sqlite3.connect(path)
+    try:
+        assert db.execute("SELECT COUNT(*) FROM sqlite_stat1;").fetchone()[0] > 0
+    finally:
+        db.close()
@@ -0,0 +1,125 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy
+import numpy.random
+import polars
+import pytest
+
+import stockdice.dice
+
+
+UNIVERSE = polars.DataFrame(
+    {
+        "symbol": ["AAPL", "MSFT", "PENNY", "LOSS"],
+        "companyName": ["Apple", "Microsoft", "Penny Stock", "Loss Maker"],
+        "marketCapUSD": [3.0e12, 1.0e12, 0.0, 1.0e9],
+        "netIncomeUSD": [1.0e11, None, 1.0e3, -5.0e8],
+    }
+).with_row_index("idx")
+
+
+@pytest.fixture()
+def snapshot(monkeypatch):
+    snapshot = stockdice.dice.Snapshot.from_universe(("test", 0, 0), UNIVERSE)
+    monkeypatch.setattr(
+        stockdice.dice, "current_snapshot", lambda replica_db_path=None: snapshot
+    )
+    return snapshot
+
+
+@pytest.mark.parametrize(
+    ("weights", "allowed"),
+    (
+        pytest.param(None, {0, 1, 2, 3}, id="uniform"),
+        pytest.param("marketCapUSD", {0, 1, 3}, id="market-cap"),
+        # Missing and negative values can't be chosen.
+        pytest.param("netIncomeUSD", {0, 2}, id="net-income"),
+    ),
+)
+def test_sample_indices(snapshot, weights, allowed):
+    idxs = stockdice.dice.sample_indices(
+        snapshot, weights, 10_000, numpy.random.default_rng(0)
+    )
+    assert set(idxs.tolist()) <= allowed
+
+
+def test_sample_indices_follows_weights(snapshot):
+    idxs = stockdice.dice.sample_indices(
+        snapshot, "marketCapUSD", 100_000, numpy.random.default_rng(0)
+    )
+    counts = numpy.bincount(idxs, minlength=UNIVERSE.height) / len(idxs)
+    assert counts == pytest.approx([3 / 4.001, 1 / 4.001, 0, 0.001 / 4.001], abs=0.01)
+
+
+def test_roll_chunks(snapshot):
+    chunks = list(
+        stockdice.dice.roll_chunks(n=10, weights="marketCapUSD", chunk_size=4)
+    )
+
+    assert [chunk.height for chunk in chunks] == [4, 4, 2]
+    assert all(chunk.columns == list(stockdice.dice.ROLL_COLUMNS) for chunk in chunks)
+    assert set(polars.concat(chunks)["symbol"]) <= {"AAPL", "MSFT", "LOSS"}
+
+
+@pytest.mark.parametrize(
+    ("weights", "n", "expected"),
+    (
+        pytest.param(None, 4, {"AAPL", "MSFT", "PENNY", "LOSS"}, id="uniform"),
+        # Stocks without weight can't be chosen.
+        pytest.param("marketCapUSD", 3, {"AAPL", "MSFT", "LOSS"}, id="market-cap"),
+    ),
+)
+def test_roll_without_replacement(snapshot, weights, n, expected):
+    got = stockdice.dice.roll(n=n, weights=weights, replace=False)
+    assert got.height == n
+    assert set(got["symbol"]) == expected
+
+
+@pytest.mark.parametrize(
+    ("weights", "n"),
+    (
+        pytest.param(None, 5, id="uniform"),
+        pytest.param("marketCapUSD", 4, id="market-cap"),
+    ),
+)
+def test_roll_without_replacement_too_many(snapshot, weights, n):
+    with pytest.raises(ValueError, match="distinct"):
+        stockdice.dice.roll(n=n, weights=weights, replace=False)
+
+
+def test_sample_without_replacement_first_draw_follows_weights(snapshot):
+    rng = numpy.random.default_rng(0)
+    first = [
+        stockdice.dice.sample_indices_without_replacement(
+            snapshot, "marketCapUSD", 2, rng
+        )[0]
+        for _ in range(10_000)
+    ]
+    counts = numpy.bincount(first, minlength=UNIVERSE.height) / len(first)
+    assert counts == pytest.approx([3 / 4.001, 1 / 4.001, 0, 0.001 / 4.001], abs=0.02)
+
+
+@pytest.mark.parametrize("replace", (True, False))
+def test_roll_seed_is_reproducible(snapshot, replace):
+    first = stockdice.dice.roll(n=3, weights="marketCapUSD", seed=42, replace=replace)
+    second = stockdice.dice.roll(n=3, weights="marketCapUSD", seed=42, replace=replace)
+    assert first.equals(second)
+
+    chunked = polars.concat(
+        stockdice.dice.roll_chunks(
+            n=3, weights="marketCapUSD", seed=42, replace=replace, chunk_size=2
+        )
+    )
+    assert chunked.equals(first)
@@ -0,0 +1,109 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+import pytest
+
+import stockdice.filings
+
+
+# Apple has a fiscal year ending in late September and files in early November.
+APPLE_STATEMENTS = (
+    (2024, "2024-09-28", "2024-11-01", "2024-11-01 06:01:36"),
+    (2023, "2023-09-30", "2023-11-03", "2023-11-02 18:08:27"),
+    (2022, "2022-09-24", "2022-10-28", "2022-10-27 18:01:14"),
+)
+
+
+def _to_us(value: datetime.datetime) -> int:
+    return int(value.timestamp() * 1_000_000)
+
+
+def test_predict_next_filing():
+    got = stockdice.filings.predict_next_filing(APPLE_STATEMENTS)
+    assert got is not None
+    assert got.period_end == datetime.date(2025, 9, 28)
+    # Median lag is 34 days.
+    assert got.expected_filing == datetime.date(2025, 11, 1)
+    assert got.window_start == datetime.date(2025, 10, 22)
+    assert got.window_end == datetime.date(2025, 12, 16)
+
+
+def test_predict_next_filing_falls_back_to_accepted_date():
+    got = stockdice.filings.predict_next_filing(
+        ((2024, "2024-12-31", None, "2025-02-14 16:30:00"),)
+    )
+    assert got is not None
+    assert got.expected_filing == datetime.date(2026, 2, 14)
+
+
+def test_predict_next_filing_default_lag():
+    got = stockdice.filings.predict_next_filing(((2024, "2024-12-31", None, None),))
+    assert got is not None
+    assert (
+        got.expected_filing
+        == datetime.date(2025, 12, 31) + stockdice.filings.DEFAULT_FILING_LAG
+    )
+
+
+def test_predict_next_filing_no_dates():
+    assert stockdice.filings.predict_next_filing(()) is None
+    assert stockdice.filings.predict_next_filing(((None, None, None, None),)) is None
+
+
+@pytest.mark.parametrize(
+    ("now", "last_updated", "expected"),
+    (
+        pytest.param(
+            datetime.datetime(2025, 6, 1, tzinfo=datetime.timezone.utc),
+            None,
+            True,
+            id="never-downloaded",
+        ),
+        pytest.param(
+            datetime.datetime(2025, 6, 1, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2025, 5, 20, tzinfo=datetime.timezone.utc),
+            False,
+            id="outside-window",
+        ),
+        pytest.param(
+            datetime.datetime(2025, 6, 1, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2025, 3, 1, tzinfo=datetime.timezone.utc),
+            True,
+            id="slow-sweep",
+        ),
+        pytest.param(
+            datetime.datetime(2025, 10, 25, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2025, 10, 23, tzinfo=datetime.timezone.utc),
+            True,
+            id="inside-window",
+        ),
+        pytest.param(
+            datetime.datetime(2025, 10, 25, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2025, 10, 24, 12, tzinfo=datetime.timezone.utc),
+            False,
+            id="inside-window-fresh",
+        ),
+    ),
+)
+def test_should_download(now, last_updated, expected):
+    prediction = stockdice.filings.predict_next_filing(APPLE_STATEMENTS)
+    got = stockdice.filings.should_download(
+        prediction=prediction,
+        last_updated_us=None if last_updated is None else _to_us(last_updated),
+        now_us=_to_us(now),
+        max_age=datetime.timedelta(days=1),
+    )
+    assert got == expected
@@ -0,0 +1,261 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import sqlite3
+import time
+
+import httpx
+import polars
+import polars.testing
+import pytest
+
+import stockdice.config
+import stockdice.db
+import stockdice.forex
+import stockdice.income
+import stockdice.negative_cache
+import stockdice.pipeline
+import stockdice.ratelimits
+
+
+FOREX_HISTORY = polars.DataFrame(
+    {
+        "from_currency": ["EUR", "EUR", "EUR", "JPY"],
+        "date": ["2023-01-02", "2023-12-29", "2024-12-31", "2024-12-31"],
+        "price": [1.07, 1.10, 1.04, 0.0064],
+    }
+)
+
+
+def test_statements_to_usd():
+    statements = polars.DataFrame(
+        {
+            "symbol": ["SAP", "SAP", "TM", "AAPL", "UNKNOWN"],
+            "date": ["2023-12-31", "2024-12-31", "2025-03-31", "2024-09-28", None],
+            "reportedCurrency": ["EUR", "EUR", "JPY", "USD", None],
+            "revenue": [100, 200, 1_000_000, 300, 400],
+        }
+    )
+
+    got = stockdice.forex.statements_to_usd(
+        statements, FOREX_HISTORY, columns=("revenue",)
+    )
+
+    expected = statements.with_columns(
+        revenueUSD=polars.Series(
+            [
+                # Closest rate to the report date.
+                100 * 1.10,
+                200 * 1.04,
+                # After the end of the history, use the latest rate.
+                1_000_000 * 0.0064,
+                300.0,
+                # Missing currency is assumed to be USD.
+                400.0,
+            ]
+        )
+    )
+    polars.testing.assert_frame_equal(got, expected)
+
+
+def test_statements_to_usd_missing_rate():
+    statements = polars.DataFrame(
+        {
+            "symbol": ["VOD.L"],
+            "date": ["2024-03-31"],
+            "reportedCurrency": ["GBP"],
+            "revenue": [100],
+        }
+    )
+
+    got = stockdice.forex.statements_to_usd(
+        statements, FOREX_HISTORY, columns=("revenue",)
+    )
+
+    assert got["revenueUSD"].to_list() == [None]
+
+
+PAIRS = (
+    ("EURUSD", "EUR", "USD"),
+    ("USDJPY", "USD", "JPY"),
+    ("EURTHB", "EUR", "THB"),
+    ("JPYTHB", "JPY", "THB"),
+    ("THBVND", "THB", "VND"),
+)
+
+
+def test_currency_paths():
+    got = stockdice.forex.currency_paths(PAIRS)
+    assert got == {
+        "USD": [],
+        "EUR": [("EURUSD", 1)],
+        "JPY": [("USDJPY", -1)],
+        # Both EUR and JPY reach THB in two hops, but EUR is preferred.
+        "THB": [("EURTHB", -1), ("EURUSD", 1)],
+        "VND": [("THBVND", -1), ("EURTHB", -1), ("EURUSD", 1)],
+    }
+
+
+def test_spanning_pairs():
+    assert stockdice.forex.spanning_pairs(PAIRS) == [
+        "EURTHB",
+        "EURUSD",
+        "THBVND",
+        "USDJPY",
+    ]
+
+
+def test_usd_rates():
+    pairs = polars.DataFrame(
+        PAIRS, schema=["symbol", "from_currency", "to_currency"], orient="row"
+    )
+    prices = polars.DataFrame(
+        {
+            "symbol": ["EURUSD", "USDJPY", "EURTHB", "EURUSD", "EURTHB", "THBVND"],
+            "date": [
+                "2024-12-31",
+                "2024-12-31",
+                "2024-12-31",
+                "2025-01-02",
+                "2025-01-02",
+                "2025-01-02",
+            ],
+            "price": [1.04, 157.0, 35.5, 1.03, 35.0, 750.0],
+        }
+    )
+
+    got = stockdice.forex.usd_rates(pairs, prices)
+
+    expected = polars.DataFrame(
+        {
+            "from_currency": ["EUR", "EUR", "JPY", "THB", "THB", "VND"],
+            "date": [
+                "2024-12-31",
+                "2025-01-02",
+                "2024-12-31",
+                "2024-12-31",
+                "2025-01-02",
+                # Only dates where every pair in the path has a quote.
+                "2025-01-02",
+            ],
+            "price": [
+                1.04,
+                1.03,
+                1 / 157.0,
+                1.04 / 35.5,
+                1.03 / 35.0,
+                1.03 / 35.0 / 750.0,
+            ],
+        }
+    )
+    polars.testing.assert_frame_equal(got, expected, check_exact=False)
+
+    latest = stockdice.forex.latest_usd_rates(got).sort("from_currency")
+    assert latest["from_currency"].to_list() == ["EUR", "JPY", "THB", "USD", "VND"]
+    assert latest["price"].to_list() == pytest.approx(
+        [1.03, 1 / 157.0, 1.03 / 35.0, 1.0, 1.03 / 35.0 / 750.0]
+    )
+
+
+@pytest.fixture()
+def db(tmp_path, monkeypatch):
+    config = stockdice.config.Config({"FMP_API_KEY": "key-a"})
+    config.db_path = tmp_path / "stockdice.sqlite"
+    monkeypatch.setattr(stockdice.config, "_config", config)
+    stockdice.ratelimits.use_key_pool(
+        stockdice.ratelimits.KeyPool(
+            [stockdice.ratelimits.ApiKey("key-a", seconds_between_requests=0.0)]
+        )
+    )
+
+    db = config.db
+    stockdice.db.migrate(db)
+    yield db
+    db.close()
+    stockdice.ratelimits.use_key_pool(None)
+
+
+def test_download_forex_history_remembers_missing_pairs(db):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=[])
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            for _ in range(2):
+                await stockdice.forex.download_forex_history(
+                    client=client, symbol="XYZUSD"
+                )
+
+    asyncio.run(run())
+
+    # The second sweep doesn't spend a request on the same pair.
+    assert len(requests) == 1
+    assert db.execute(
+        "SELECT symbol, misses FROM forex_history_missing;"
+    ).fetchall() == [("XYZUSD", 1)]
+
+
+def test_download_forex_history_clears_miss(db):
+    stockdice.negative_cache.record_miss(db, "forex_history", symbol="EURUSD", now_us=0)
+    db.commit()
+
+    def handler(request):
+        return httpx.Response(200, json=[{"date": "2024-12-31", "price": 1.04}])
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await stockdice.forex.download_forex_history(client=client, symbol="EURUSD")
+
+    asyncio.run(run())
+
+    assert db.execute("SELECT symbol, date, price FROM forex_history;").fetchall() == [
+        ("EURUSD", "2024-12-31", 1.04)
+    ]
+    assert db.execute("SELECT COUNT(*) FROM forex_history_missing;").fetchone()[0] == 0
+
+
+def test_download_forex_history_alongside_process_pool_sink(db):
+    config = stockdice.config.config
+    reader = sqlite3.connect(config.db_path)
+
+    with stockdice.pipeline.ProcessPoolSink(db, config.db_path, processes=1) as sink:
+
+        def handler(request):
+            # The writer process commits after the forex read, while the
+            # request is in flight.
+            sink.write(stockdice.income.write_income, [], symbol="SPY", now_us=123)
+            while not reader.execute("SELECT COUNT(*) FROM income_missing;").fetchone()[
+                0
+            ]:
+                time.sleep(0.01)
+            return httpx.Response(200, json=[{"date": "2024-12-31", "price": 1.04}])
+
+        async def run():
+            async with httpx.AsyncClient(
+                transport=httpx.MockTransport(handler)
+            ) as client:
+                await stockdice.forex.download_forex_history(
+                    client=client, symbol="EURUSD"
+                )
+
+        asyncio.run(run())
+
+    reader.close()
+    assert db.execute("SELECT symbol, date, price FROM forex_history;").fetchall() == [
+        ("EURUSD", "2024-12-31", 1.04)
+    ]
@@ -0,0 +1,84 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import flask.testing
+import polars
+
+import stockdice
+import stockdice.dice
+import stockdice.rollpool
+import stockdice.warmup
+
+
+UNIVERSE = polars.DataFrame(
+    {
+        "symbol": ["AAPL", "MSFT"],
+        "companyName": ["Apple", "Microsoft"],
+        "marketCapUSD": [3.0e12, 1.0e12],
+    }
+).with_row_index("idx")
+
+
+def test_healthz(client: flask.testing.FlaskClient):
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "ok"}
+
+
+def test_readyz_without_warm_up(client: flask.testing.FlaskClient):
+    assert client.get("/readyz").status_code == 200
+
+
+def test_readyz_while_warming_up(app, client: flask.testing.FlaskClient):
+    app.extensions[stockdice.warmup.EXTENSION_KEY] = stockdice.warmup.WarmUp()
+
+    response = client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.get_json() == {"status": "warming up"}
+
+
+def test_readyz_hides_warm_up_error(app, client: flask.testing.FlaskClient):
+    state = stockdice.warmup.WarmUp()
+    state.error = repr(FileNotFoundError("/secret/path/stockdice.sqlite"))
+    app.extensions[stockdice.warmup.EXTENSION_KEY] = state
+
+    response = client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.get_json() == {"status": "retrying"}
+
+
+def test_warm_up_loads_snapshot_and_pools(monkeypatch):
+    snapshot = stockdice.dice.Snapshot.from_universe(("test", 0, 0), UNIVERSE)
+    loads = []
+
+    def current_snapshot(replica_db_path=None):
+        loads.append(replica_db_path)
+        return snapshot
+
+    monkeypatch.setattr(stockdice.dice, "current_snapshot", current_snapshot)
+    monkeypatch.setattr(stockdice.rollpool, "_pools", {})
+    app = stockdice.create_app({"TESTING": True, "WARM_UP": False})
+
+    state = stockdice.warmup.start(app, background=False)
+
+    assert state.ready.is_set()
+    assert state.error is None
+    assert loads
+    assert set(stockdice.rollpool._pools) == set(stockdice.warmup.ROLL_POOL_WEIGHTS)
+    for pool in stockdice.rollpool._pools.values():
+        assert len(pool) > 0
+        pool.close()
+    assert app.test_client().get("/readyz").status_code == 200
@@ -0,0 +1,68 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+
+import polars.testing
+import pytest
+
+import stockdice.db
+import stockdice.loader
+
+
+QUERY = "SELECT symbol, marketCap, currency FROM company_profile ORDER BY symbol;"
+
+
+@pytest.fixture()
+def db_path(tmp_path):
+    path = tmp_path / "stockdice.sqlite"
+    db = sqlite3.connect(path)
+    stockdice.db.create_all_tables(db, reset=False)
+    db.executemany(
+        "INSERT INTO company_profile (symbol, marketCap, currency) VALUES (?, ?, ?);",
+        # Start with NULLs to make sure types aren't guessed from the first row.
+        [(f"NULL{i:04d}", None, None) for i in range(2000)]
+        + [("AAPL", 3_500_000_000_000, "USD"), ("SAP", 300_000_000_000, "EUR")],
+    )
+    db.commit()
+    db.close()
+    return path
+
+
+def test_connect_falls_back_to_cursor(db_path):
+    with sqlite3.connect(db_path) as db:
+        with stockdice.loader.connect(
+            db, db_path, tables=("company_profile",)
+        ) as reader:
+            assert isinstance(reader, stockdice.loader.CursorReader)
+            got = reader.read(QUERY)
+    assert got.height == 2002
+
+
+def test_arrow_reader_matches_cursor_reader(db_path):
+    pytest.importorskip("adbc_driver_sqlite")
+
+    with sqlite3.connect(db_path) as db:
+        stockdice.db.convert_all_to_strict(db)
+        with stockdice.loader.connect(
+            db, db_path, tables=("company_profile",), arrow=False
+        ) as reader:
+            expected = reader.read(QUERY)
+        with stockdice.loader.connect(
+            db, db_path, tables=("company_profile",)
+        ) as reader:
+            assert isinstance(reader, stockdice.loader.ArrowReader)
+            got = reader.read(QUERY)
+
+    polars.testing.assert_frame_equal(got, expected)
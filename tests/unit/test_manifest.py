@@ -0,0 +1,233 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import tempfile
+
+import google.api_core.exceptions
+import pytest
+
+import stockdice.config
+import stockdice.dice
+import stockdice.manifest
+
+
+class FakeBlob:
+    def __init__(self, bucket: FakeBucket, name: str):
+        self._bucket = bucket
+        self.name = name
+        self.cache_control = None
+
+    @property
+    def time_created(self):
+        return self._bucket.created[self.name]
+
+    def exists(self):
+        return self.name in self._bucket.objects
+
+    def upload_from_filename(self, filename):
+        with open(filename, "rb") as file:
+            self.upload_from_string(file.read())
+
+    def upload_from_string(self, data, content_type=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._bucket.uploads.append(self.name)
+        self._bucket.objects[self.name] = data
+        self._bucket.created[self.name] = datetime.datetime.now(
+            datetime.timezone.utc
+        ) + datetime.timedelta(seconds=len(self._bucket.uploads))
+
+    def download_as_bytes(self):
+        if not self.exists():
+            raise google.api_core.exceptions.NotFound(self.name)
+        return self._bucket.objects[self.name]
+
+    def download_to_filename(self, filename):
+        with open(filename, "wb") as file:
+            file.write(self.download_as_bytes())
+
+    def download_to_file(self, file):
+        file.write(self.download_as_bytes())
+
+    def delete(self):
+        del self._bucket.objects[self.name]
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.created: dict[str, datetime.datetime] = {}
+        self.uploads: list[str] = []
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix=""):
+        return [self.blob(name) for name in self.objects if name.startswith(prefix)]
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_publish_and_download(tmp_path):
+    bucket = FakeBucket()
+    replica = tmp_path / "stockdice_backup.sqlite"
+    replica.write_bytes(b"version 1")
+
+    manifest = stockdice.manifest.publish(bucket, replica)
+
+    sha256 = _sha256(b"version 1")
+    assert manifest["version"] == sha256
+    assert manifest["size"] == len(b"version 1")
+    # The manifest is written after the snapshot it points to.
+    assert bucket.uploads == [
+        manifest["object"],
+        stockdice.manifest.MANIFEST_NAME,
+        stockdice.manifest.LEGACY_REPLICA_NAME,
+    ]
+    # Readers without manifest support still get the latest replica.
+    assert bucket.objects[stockdice.manifest.LEGACY_REPLICA_NAME] == b"version 1"
+    assert stockdice.manifest.read_manifest(bucket) == manifest
+
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    path = stockdice.manifest.download_snapshot(bucket, manifest, downloads)
+    assert path.read_bytes() == b"version 1"
+    assert stockdice.manifest.content_hash_from_path(path) == sha256
+    assert list(downloads.iterdir()) == [path]
+
+
+def test_publish_same_content_uploads_only_manifest(tmp_path):
+    bucket = FakeBucket()
+    replica = tmp_path / "stockdice_backup.sqlite"
+    replica.write_bytes(b"version 1")
+
+    first = stockdice.manifest.publish(bucket, replica)
+    second = stockdice.manifest.publish(bucket, replica)
+
+    assert first["version"] == second["version"]
+    assert bucket.uploads.count(first["object"]) == 1
+
+
+def test_publish_prunes_old_snapshots(tmp_path):
+    bucket = FakeBucket()
+    replica = tmp_path / "stockdice_backup.sqlite"
+    for version in range(4):
+        replica.write_bytes(f"version {version}".encode("utf-8"))
+        manifest = stockdice.manifest.publish(bucket, replica, keep=2)
+
+    snapshots = sorted(
+        name
+        for name in bucket.objects
+        if name.startswith(stockdice.manifest.SNAPSHOT_PREFIX)
+    )
+    assert len(snapshots) == 2
+    assert manifest["object"] in snapshots
+
+
+def test_read_manifest_missing():
+    assert stockdice.manifest.read_manifest(FakeBucket()) is None
+
+
+def test_download_snapshot_verifies_hash(tmp_path):
+    bucket = FakeBucket()
+    replica = tmp_path / "stockdice_backup.sqlite"
+    replica.write_bytes(b"version 1")
+    manifest = stockdice.manifest.publish(bucket, replica)
+    bucket.objects[manifest["object"]] = b"version 2"
+
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    with pytest.raises(ValueError, match="SHA-256"):
+        stockdice.manifest.download_snapshot(bucket, manifest, downloads)
+    assert list(downloads.iterdir()) == []
+
+
+def test_snapshot_version_uses_content_hash(tmp_path):
+    sha256 = _sha256(b"version 1")
+    path = tmp_path / stockdice.manifest.snapshot_file_name(sha256)
+    path.write_bytes(b"version 1")
+
+    # The same on every instance, regardless of download time.
+    assert stockdice.dice.snapshot_version(path) == ("sha256", sha256)
+
+
+def test_manifest_is_json(tmp_path):
+    bucket = FakeBucket()
+    replica = tmp_path / "stockdice_backup.sqlite"
+    replica.write_bytes(b"version 1")
+    stockdice.manifest.publish(bucket, replica)
+
+    manifest = json.loads(bucket.objects[stockdice.manifest.MANIFEST_NAME])
+    assert set(manifest) == {"version", "object", "sha256", "size", "published"}
+
+
+class FakeStorageClient:
+    def __init__(self, bucket: FakeBucket):
+        self._bucket = bucket
+
+    def bucket(self, bucket_name):
+        return self._bucket
+
+
+def test_config_follows_manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(stockdice.config, "DB_REPLICA_PATH", tmp_path / "missing")
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    bucket = FakeBucket()
+    replica = tmp_path / "stockdice_backup.sqlite"
+    replica.write_bytes(b"version 1")
+    first = stockdice.manifest.publish(bucket, replica)
+    config = stockdice.config.Config({"bucket": "test"})
+    config._storage_client = FakeStorageClient(bucket)
+
+    first_path = config.replica_db_path
+    assert first_path.read_bytes() == b"version 1"
+    assert config.replica_version == first["version"]
+
+    # Polling an unchanged manifest doesn't download the replica again.
+    config._refresh_replica()
+    assert config.replica_db_path == first_path
+    assert bucket.uploads.count(first["object"]) == 1
+
+    replica.write_bytes(b"version 2")
+    second = stockdice.manifest.publish(bucket, replica)
+    config._refresh_replica()
+
+    assert config.replica_version == second["version"]
+    assert config.replica_db_path.read_bytes() == b"version 2"
+    assert not first_path.exists()
+
+
+def test_snapshot_version_without_manifest_uses_content_hash(tmp_path):
+    bucket = FakeBucket()
+    bucket.blob("stockdice_backup.sqlite").upload_from_string(b"version 1")
+    client = FakeStorageClient(bucket)
+
+    # Each process downloads its own copy, such as on a cold start.
+    first = stockdice.config.load_replica_from_gcs(client, "bucket", tmp_path)
+    second = stockdice.config.load_replica_from_gcs(client, "bucket", tmp_path)
+
+    assert first == second
+    assert first.read_bytes() == b"version 1"
+    assert stockdice.dice.snapshot_version(first) == (
+        "sha256",
+        _sha256(b"version 1"),
+    )
+    assert [path.name for path in tmp_path.iterdir()] == [first.name]
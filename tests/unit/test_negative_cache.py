@@ -0,0 +1,178 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import datetime
+import sqlite3
+
+import httpx
+import pytest
+
+import stockdice.config
+import stockdice.db
+import stockdice.income
+import stockdice.negative_cache
+import stockdice.ratelimits
+
+
+DAY_US = 24 * 60 * 60 * 1_000_000
+NOW_US = 1_750_000_000_000_000
+
+
+@pytest.fixture()
+def db():
+    db = sqlite3.connect(":memory:")
+    stockdice.db.create_all_tables(db, reset=False)
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize(
+    ("misses", "expected_days"),
+    (
+        pytest.param(0, 0, id="none"),
+        pytest.param(1, 1, id="first"),
+        pytest.param(2, 2, id="second"),
+        pytest.param(4, 8, id="fourth"),
+        pytest.param(7, 64, id="max"),
+        pytest.param(1000, 64, id="capped"),
+    ),
+)
+def test_retry_interval(misses, expected_days):
+    assert stockdice.negative_cache.retry_interval(misses) == datetime.timedelta(
+        days=expected_days
+    )
+
+
+def test_misses_back_off_exponentially(db):
+    def is_suppressed(now_us):
+        return stockdice.negative_cache.is_suppressed(
+            db, "income", symbol="DEAD", now_us=now_us
+        )
+
+    assert not is_suppressed(NOW_US)
+
+    stockdice.negative_cache.record_miss(db, "income", symbol="DEAD", now_us=NOW_US)
+    assert is_suppressed(NOW_US + DAY_US - 1)
+    assert not is_suppressed(NOW_US + DAY_US)
+
+    now_us = NOW_US + DAY_US
+    stockdice.negative_cache.record_miss(db, "income", symbol="DEAD", now_us=now_us)
+    assert is_suppressed(now_us + 2 * DAY_US - 1)
+    assert not is_suppressed(now_us + 2 * DAY_US)
+
+    stockdice.negative_cache.record_hit(db, "income", symbol="DEAD")
+    assert not is_suppressed(now_us)
+
+
+def test_prune_clears_symbols_with_newer_data(db):
+    for symbol in ("AAPL", "DEAD", "OLD"):
+        stockdice.negative_cache.record_miss(db, "income", symbol=symbol, now_us=NOW_US)
+    db.executemany(
+        """
+        INSERT INTO income (symbol, fiscalYear, period, last_updated_us)
+        VALUES (?, 2024, 'FY', ?);
+        """,
+        [("AAPL", NOW_US + 1), ("OLD", NOW_US - 1)],
+    )
+
+    assert stockdice.negative_cache.prune(db, "income") == 1
+    assert db.execute(
+        "SELECT symbol FROM income_missing ORDER BY symbol;"
+    ).fetchall() == [("DEAD",), ("OLD",)]
+
+
+@pytest.mark.parametrize(
+    "autocommit",
+    (
+        pytest.param(sqlite3.LEGACY_TRANSACTION_CONTROL, id="legacy"),
+        # How stockdice.config.Config.db opens the database.
+        pytest.param(False, id="autocommit-false"),
+    ),
+)
+def test_migration_compacts_placeholders(tmp_path, autocommit):
+    db = sqlite3.connect(tmp_path / "stockdice.sqlite", autocommit=autocommit)
+    stockdice.db.create_all_tables(db, reset=False)
+    db.execute("DROP TABLE income_missing;")
+    db.execute("PRAGMA user_version = 5;")
+    db.executemany(
+        """
+        INSERT INTO income (symbol, fiscalYear, period, revenue, last_updated_us)
+        VALUES (?, ?, ?, ?, ?);
+        """,
+        [
+            # Every request for a symbol without data added a placeholder.
+            ("DEAD", None, None, None, NOW_US - 2 * DAY_US),
+            ("DEAD", None, None, None, NOW_US - DAY_US),
+            ("DEAD", None, None, None, NOW_US),
+            # Data was found after the placeholder was written.
+            ("AAPL", None, None, None, NOW_US - DAY_US),
+            ("AAPL", 2024, "FY", 100, NOW_US),
+        ],
+    )
+    db.commit()
+
+    stockdice.db.migrate(db)
+
+    assert stockdice.db.schema_version(db) == len(stockdice.db.MIGRATIONS)
+    assert db.autocommit == autocommit
+    assert db.execute(
+        "SELECT symbol, fiscalYear, revenue FROM income ORDER BY symbol;"
+    ).fetchall() == [("AAPL", 2024, 100)]
+    assert db.execute(
+        "SELECT symbol, misses, last_updated_us, retry_after_us FROM income_missing;"
+    ).fetchall() == [("DEAD", 3, NOW_US, NOW_US + 4 * DAY_US)]
+    assert db.execute(
+        "SELECT symbol, fiscalYear, revenue FROM latest_fy_income;"
+    ).fetchall() == [("AAPL", 2024, 100)]
+
+
+def test_download_skips_suppressed_symbol(tmp_path, monkeypatch):
+    config = stockdice.config.Config({"FMP_API_KEY": "key-a"})
+    config.db_path = tmp_path / "stockdice.sqlite"
+    monkeypatch.setattr(stockdice.config, "_config", config)
+    stockdice.ratelimits.use_key_pool(
+        stockdice.ratelimits.KeyPool(
+            [stockdice.ratelimits.ApiKey("key-a", seconds_between_requests=0.0)]
+        )
+    )
+    db = config.db
+    stockdice.db.migrate(db)
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.params["symbol"])
+        return httpx.Response(200, json=[])
+
+    async def download():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(3):
+                await stockdice.income.download_income(
+                    client=client,
+                    symbol="DEAD",
+                    max_age=datetime.timedelta(hours=1),
+                )
+
+    try:
+        asyncio.run(download())
+    finally:
+        stockdice.ratelimits.use_key_pool(None)
+
+    assert requested == ["DEAD"]
+    assert db.execute("SELECT COUNT(*) FROM income;").fetchone() == (0,)
+    assert db.execute("SELECT symbol, misses FROM income_missing;").fetchall() == [
+        ("DEAD", 1)
+    ]
+    db.close()
@@ -0,0 +1,66 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+
+import polars
+import polars.testing
+import pyarrow.parquet
+import pytest
+
+import stockdice.output
+
+
+CHUNKS = (
+    polars.DataFrame({"symbol": ["AAPL", "MSFT"], "marketCapUSD": [3.0e12, 3.1e12]}),
+    polars.DataFrame({"symbol": ["XOM"], "marketCapUSD": [5.0e11]}),
+)
+
+
+def test_write_chunks_csv():
+    output = io.BytesIO()
+    assert stockdice.output.write_chunks(iter(CHUNKS), output, "csv") == 3
+    # Only one header.
+    assert output.getvalue().decode("utf-8").splitlines() == [
+        "symbol,marketCapUSD",
+        "AAPL,3000000000000.0",
+        "MSFT,3100000000000.0",
+        "XOM,500000000000.0",
+    ]
+
+
+def test_write_chunks_ndjson():
+    output = io.BytesIO()
+    assert stockdice.output.write_chunks(iter(CHUNKS), output, "ndjson") == 3
+    rows = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [row["symbol"] for row in rows] == ["AAPL", "MSFT", "XOM"]
+
+
+def test_write_chunks_parquet():
+    output = io.BytesIO()
+    assert stockdice.output.write_chunks(iter(CHUNKS), output, "parquet") == 3
+
+    output.seek(0)
+    parquet_file = pyarrow.parquet.ParquetFile(output)
+    # One row group per chunk.
+    assert parquet_file.num_row_groups == 2
+    polars.testing.assert_frame_equal(
+        polars.from_arrow(parquet_file.read()), polars.concat(CHUNKS)
+    )
+
+
+def test_write_chunks_unsupported_format():
+    with pytest.raises(ValueError, match="Unsupported format"):
+        stockdice.output.write_chunks(iter(CHUNKS), io.BytesIO(), "xlsx")
@@ -0,0 +1,218 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import pickle
+import sqlite3
+
+import pytest
+
+import stockdice.balance_sheet
+import stockdice.company_profile
+import stockdice.db
+import stockdice.income
+import stockdice.pipeline
+import stockdice.ratelimits
+
+
+INCOME = [
+    {
+        "symbol": "AAPL",
+        "fiscalYear": "2024",
+        "period": "FY",
+        "date": "2024-09-28",
+        "revenue": 391035000000,
+        "eps": "6.11",
+        "cik": "",
+    },
+    {
+        "symbol": "AAPL",
+        "fiscalYear": "2023",
+        "period": "FY",
+        "date": "2023-09-30",
+        "revenue": 383285000000.0,
+        "eps": 6.16,
+        "cik": "",
+    },
+]
+
+
+@pytest.fixture()
+def db_path(tmp_path):
+    path = tmp_path / "stockdice.sqlite"
+    db = sqlite3.connect(path)
+    stockdice.db.create_all_tables(db, reset=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.commit()
+    db.close()
+    return path
+
+
+def _income_content(db, symbol="AAPL") -> bytes:
+    # Responses include every field, even if empty.
+    empty = dict.fromkeys(stockdice.db.table_column_types(db, "income"))
+    del empty["last_updated_us"]
+    return json.dumps([{**empty, **row, "symbol": symbol} for row in INCOME]).encode()
+
+
+def _income(db):
+    return db.execute(
+        """
+        SELECT symbol, fiscalYear, revenue, eps, last_updated_us
+        FROM income
+        ORDER BY symbol, fiscalYear;
+        """
+    ).fetchall()
+
+
+def test_rate_limit_error_pickles():
+    error = pickle.loads(pickle.dumps(stockdice.ratelimits.RateLimitError(3.0, 500.0)))
+    assert (error.seconds, error.millis) == (3.0, 500.0)
+
+
+def test_parse_json_raises_rate_limit_error():
+    with pytest.raises(stockdice.ratelimits.RateLimitError):
+        stockdice.ratelimits.parse_json(
+            json.dumps({stockdice.ratelimits.RATE_LIMIT_SECONDS: "2"}).encode()
+        )
+
+
+@pytest.mark.parametrize(
+    ("module", "name"),
+    (
+        pytest.param(
+            stockdice.company_profile, "company_profile", id="company_profile"
+        ),
+        pytest.param(stockdice.income, "income", id="income"),
+        pytest.param(stockdice.balance_sheet, "balance_sheet", id="balance_sheet"),
+    ),
+)
+def test_write_empty_records_miss(db_path, module, name):
+    db = sqlite3.connect(db_path)
+    parse = getattr(module, f"parse_{name}")
+    write = getattr(module, f"write_{name}")
+    column_types = stockdice.db.table_column_types(db, name)
+
+    rows = parse(b"[]", column_types=column_types)
+    write(db, rows, symbol="AAPL", now_us=123)
+
+    assert rows == []
+    assert db.execute(f"SELECT COUNT(*) FROM {name};").fetchone() == (0,)
+    assert db.execute(
+        f"SELECT symbol, misses, last_updated_us FROM {name}_missing;"
+    ).fetchall() == [("AAPL", 1, 123)]
+
+
+def test_in_process_sink(db_path):
+    db = sqlite3.connect(db_path)
+    sink = stockdice.pipeline.InProcessSink(db)
+
+    got = asyncio.run(
+        sink.parse_and_write(
+            parse=stockdice.income.parse_income,
+            write=stockdice.income.write_income,
+            table="income",
+            content=_income_content(db),
+            symbol="AAPL",
+            now_us=123,
+        )
+    )
+
+    assert got == 2
+    assert _income(db) == [
+        ("AAPL", 2023, 383285000000, 6.16, 123),
+        ("AAPL", 2024, 391035000000, 6.11, 123),
+    ]
+
+
+def test_process_pool_sink(db_path):
+    db = sqlite3.connect(db_path)
+
+    async def download(sink):
+        return await asyncio.gather(
+            *[
+                sink.parse_and_write(
+                    parse=stockdice.income.parse_income,
+                    write=stockdice.income.write_income,
+                    table="income",
+                    content=_income_content(db, symbol),
+                    symbol=symbol,
+                    now_us=123,
+                )
+                for symbol in ("AAPL", "MSFT")
+            ]
+        )
+
+    with stockdice.pipeline.ProcessPoolSink(db, db_path, processes=2) as sink:
+        got = asyncio.run(download(sink))
+        sink.write(stockdice.income.write_income, [], symbol="SPY", now_us=456)
+
+    assert got == [2, 2]
+    assert _income(db) == [
+        ("AAPL", 2023, 383285000000, 6.16, 123),
+        ("AAPL", 2024, 391035000000, 6.11, 123),
+        ("MSFT", 2023, 383285000000, 6.16, 123),
+        ("MSFT", 2024, 391035000000, 6.11, 123),
+    ]
+    assert db.execute("SELECT symbol, misses FROM income_missing;").fetchall() == [
+        ("SPY", 1)
+    ]
+
+
+def _write_then_fail(db, rows, *, symbol, now_us):
+    stockdice.income.write_income(db, rows, symbol=symbol, now_us=now_us)
+    raise sqlite3.IntegrityError("write failed")
+
+
+def test_process_pool_sink_raises_write_errors(db_path):
+    db = sqlite3.connect(db_path)
+    column_types = stockdice.db.table_column_types(db, "income")
+    rows = {
+        symbol: stockdice.income.parse_income(
+            _income_content(db, symbol), column_types=column_types
+        )
+        for symbol in ("AAPL", "MSFT")
+    }
+
+    with pytest.raises(RuntimeError, match="unable to write 1 responses"):
+        with stockdice.pipeline.ProcessPoolSink(db, db_path, processes=1) as sink:
+            sink.write(_write_then_fail, rows["MSFT"], symbol="MSFT", now_us=123)
+            sink.write(
+                stockdice.income.write_income, rows["AAPL"], symbol="AAPL", now_us=456
+            )
+
+    # The failed write was undone, but the rest of the batch was kept.
+    assert _income(db) == [
+        ("AAPL", 2023, 383285000000, 6.16, 456),
+        ("AAPL", 2024, 391035000000, 6.11, 456),
+    ]
+
+
+def test_process_pool_sink_raises_rate_limit_error(db_path):
+    db = sqlite3.connect(db_path)
+    content = json.dumps({stockdice.ratelimits.RATE_LIMIT_SECONDS: "2"}).encode()
+
+    with stockdice.pipeline.ProcessPoolSink(db, db_path, processes=1) as sink:
+        with pytest.raises(stockdice.ratelimits.RateLimitError):
+            asyncio.run(
+                sink.parse_and_write(
+                    parse=stockdice.income.parse_income,
+                    write=stockdice.income.write_income,
+                    table="income",
+                    content=content,
+                    symbol="AAPL",
+                    now_us=123,
+                )
+            )
@@ -0,0 +1,180 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import datetime
+
+import httpx
+import pytest
+
+import stockdice.config
+import stockdice.db
+import stockdice.quotes
+import stockdice.ratelimits
+
+
+NOW_US = 1_750_000_000_000_000
+HOUR_US = 60 * 60 * 1_000_000
+
+
+@pytest.fixture()
+def db(tmp_path, monkeypatch):
+    config = stockdice.config.Config({"FMP_API_KEY": "key-a"})
+    config.db_path = tmp_path / "stockdice.sqlite"
+    monkeypatch.setattr(stockdice.config, "_config", config)
+    stockdice.ratelimits.use_key_pool(
+        stockdice.ratelimits.KeyPool(
+            [stockdice.ratelimits.ApiKey("key-a", seconds_between_requests=0.0)]
+        )
+    )
+
+    db = config.db
+    stockdice.db.migrate(db)
+    yield db
+    db.close()
+    stockdice.ratelimits.use_key_pool(None)
+
+
+def _insert_profile(db, symbol, *, last_updated_us, is_etf=False):
+    db.execute(
+        """
+        INSERT INTO symbol (symbol, company_name, trading_currency)
+        VALUES (:symbol, :symbol, 'USD');
+        """,
+        {"symbol": symbol},
+    )
+    db.execute(
+        """
+        INSERT INTO company_profile (
+            symbol, price, marketCap, description, isEtf, isFund, last_updated_us
+        ) VALUES (
+            :symbol, 1.0, 100, 'A company.', :is_etf, false, :last_updated_us
+        );
+        """,
+        {"symbol": symbol, "is_etf": is_etf, "last_updated_us": last_updated_us},
+    )
+    db.commit()
+
+
+def _profiles(db):
+    return db.execute(
+        """
+        SELECT
+            symbol, price, marketCap, changePercentage, description,
+            last_updated_us, quote_last_updated_us
+        FROM company_profile
+        ORDER BY symbol;
+        """
+    ).fetchall()
+
+
+def test_write_quotes_only_updates_quote_columns(db):
+    _insert_profile(db, "AAPL", last_updated_us=0)
+
+    stockdice.quotes.write_quotes(
+        db,
+        [
+            {
+                "symbol": "AAPL",
+                "price": 201.5,
+                "marketCap": 3.0e12,
+                "changePercentage": "1.5",
+                "name": "Apple Inc.",
+            },
+            # No profile yet, so nothing to update.
+            {"symbol": "MSFT", "price": 400.0},
+        ],
+        now_us=NOW_US,
+    )
+
+    assert _profiles(db) == [
+        ("AAPL", 201.5, 3_000_000_000_000, 1.5, "A company.", 0, NOW_US)
+    ]
+
+
+def test_symbols_due(db):
+    _insert_profile(db, "AAPL", last_updated_us=NOW_US - 2 * HOUR_US)
+    _insert_profile(db, "MSFT", last_updated_us=NOW_US)
+    _insert_profile(db, "SPY", last_updated_us=0, is_etf=True)
+    _insert_profile(db, "GOOG", last_updated_us=0)
+    stockdice.quotes.write_quotes(db, [{"symbol": "GOOG"}], now_us=NOW_US)
+
+    assert stockdice.quotes.symbols_due(
+        db, max_age=datetime.timedelta(hours=1), now_us=NOW_US
+    ) == ["AAPL"]
+
+
+def test_symbols_due_oldest_first(db):
+    _insert_profile(db, "AAPL", last_updated_us=NOW_US - 2 * HOUR_US)
+    _insert_profile(db, "MSFT", last_updated_us=NOW_US - 3 * HOUR_US)
+    _insert_profile(db, "GOOG", last_updated_us=NOW_US - 4 * HOUR_US)
+
+    assert stockdice.quotes.symbols_due(
+        db, max_age=datetime.timedelta(hours=1), now_us=NOW_US, limit=2
+    ) == ["GOOG", "MSFT"]
+
+
+def test_download_all_batches_quotes(db):
+    symbols = [f"S{i:03d}" for i in range(250)]
+    for symbol in symbols:
+        _insert_profile(db, symbol, last_updated_us=0)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(
+            200,
+            json=[
+                {"symbol": symbol, "price": 2.0, "marketCap": 200}
+                for symbol in request.url.params["symbols"].split(",")
+            ],
+        )
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await stockdice.quotes.download_all(
+                max_age=datetime.timedelta(minutes=5), client=client
+            )
+
+    assert asyncio.run(run()) == 250
+    assert len(requests) == 3
+    assert all(row[1:3] == (2.0, 200) for row in _profiles(db))
+
+
+def test_download_all_keeps_quotes_from_successful_batches(db):
+    symbols = [f"S{i:03d}" for i in range(150)]
+    for symbol in symbols:
+        _insert_profile(db, symbol, last_updated_us=0)
+
+    def handler(request):
+        batch = request.url.params["symbols"].split(",")
+        if "S000" in batch:
+            return httpx.Response(500)
+        return httpx.Response(
+            200,
+            json=[
+                {"symbol": symbol, "price": 2.0, "marketCap": 200} for symbol in batch
+            ],
+        )
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await stockdice.quotes.download_all(
+                max_age=datetime.timedelta(minutes=5), client=client
+            )
+
+    # The first batch of 100 failed, but the second was still written.
+    assert asyncio.run(run()) == 50
+    updated = [row[0] for row in _profiles(db) if row[1:3] == (2.0, 200)]
+    assert updated == symbols[100:]
@@ -0,0 +1,147 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import stockdice.config
+import stockdice.ratelimits
+
+
+@pytest.fixture()
+def key_pool():
+    pool = stockdice.ratelimits.KeyPool(
+        stockdice.ratelimits.ApiKey(key, seconds_between_requests=0.0)
+        for key in ("key-a", "key-b")
+    )
+    stockdice.ratelimits.use_key_pool(pool)
+    yield pool
+    stockdice.ratelimits.use_key_pool(None)
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    (
+        pytest.param("key-a", ("key-a",), id="single"),
+        pytest.param("key-a, key-b,", ("key-a", "key-b"), id="comma-separated"),
+        pytest.param(["key-a", "key-b"], ("key-a", "key-b"), id="list"),
+    ),
+)
+def test_config_fmp_api_keys(value, expected):
+    config = stockdice.config.Config({"FMP_API_KEY": value})
+    assert config.fmp_api_keys == expected
+    assert config.fmp_api_key == expected[0]
+
+
+def test_get_spreads_requests_across_keys(key_pool):
+    used = []
+
+    async def handler(request):
+        assert request.url.params["symbol"] == "A"
+        used.append(request.url.params["apikey"])
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=[])
+
+    async def get_all():
+        async with _client(handler) as client:
+            await asyncio.gather(
+                *[
+                    stockdice.ratelimits.get(client, "https://example.com/?symbol=A")
+                    for _ in range(4)
+                ]
+            )
+
+    asyncio.run(get_all())
+    assert sorted(used) == ["key-a", "key-a", "key-b", "key-b"]
+
+
+def test_request_slots_limit_waiting_requests(key_pool):
+    in_flight = []
+    most_in_flight = 0
+
+    async def handler(request):
+        nonlocal most_in_flight
+        in_flight.append(request)
+        most_in_flight = max(most_in_flight, len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(request)
+        return httpx.Response(200, json=[])
+
+    async def background():
+        stockdice.ratelimits.request_slots.set(asyncio.Semaphore(1))
+        async with _client(handler) as client:
+            await asyncio.gather(
+                *[
+                    stockdice.ratelimits.get(client, "https://example.com/")
+                    for _ in range(4)
+                ]
+            )
+
+    asyncio.run(background())
+    # Two keys are available, but only one request at a time can use them.
+    assert most_in_flight == 1
+    assert stockdice.ratelimits.request_slots.get() is None
+
+
+def test_back_off_quarantines_key(key_pool):
+    key_a, key_b = key_pool.keys
+    for _ in range(stockdice.ratelimits.QUARANTINE_STRIKES):
+        key_a.back_off(0.0)
+
+    assert key_a.quarantined_until > time.monotonic()
+    assert key_a.strikes == 0
+
+    async def acquire():
+        key = await key_pool.acquire()
+        await key_pool.release(key)
+        return key
+
+    # Even though key-a was used least recently.
+    key_b.next_request_time = time.monotonic() + 0.01
+    assert asyncio.run(acquire()) is key_b
+
+
+def test_retry_fmp_backs_off_rate_limited_key(key_pool):
+    key_a, key_b = key_pool.keys
+    # Make key-a the first choice.
+    key_b.next_request_time = time.monotonic() + 0.01
+
+    async def handler(request):
+        if request.url.params["apikey"] == "key-a":
+            return httpx.Response(stockdice.ratelimits.RATE_LIMIT_STATUS)
+        return httpx.Response(200, json=[{"symbol": "A"}])
+
+    @stockdice.ratelimits.retry_fmp
+    async def download(client):
+        resp = await stockdice.ratelimits.get(client, "https://example.com/")
+        return stockdice.ratelimits.check_status(resp)
+
+    async def run():
+        async with _client(handler) as client:
+            return await download(client)
+
+    start = time.monotonic()
+    assert asyncio.run(run()) == [{"symbol": "A"}]
+    # Retried with the other key, rather than waiting for key-a.
+    assert time.monotonic() - start < stockdice.ratelimits.RATE_LIMIT_MINIMUM_SECONDS
+    assert key_a.strikes == 1
+    assert key_a.next_request_time > time.monotonic()
+    assert key_b.strikes == 0
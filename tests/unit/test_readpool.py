@@ -0,0 +1,141 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pathlib
+import sqlite3
+import threading
+
+import pytest
+
+import stockdice.readpool
+
+
+def _create_replica(path, value):
+    path.unlink(missing_ok=True)
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE t (value INTEGER);")
+    db.execute("INSERT INTO t VALUES (?);", (value,))
+    db.commit()
+    db.close()
+
+
+@pytest.fixture()
+def replica(tmp_path):
+    path = tmp_path / "replica.sqlite"
+    _create_replica(path, 1)
+    yield path
+    stockdice.readpool.close()
+
+
+def test_get_reuses_connection(replica):
+    db = stockdice.readpool.get(replica)
+    assert stockdice.readpool.get(replica) is db
+    assert db.execute("SELECT value FROM t;").fetchall() == [(1,)]
+    assert db.execute("PRAGMA query_only;").fetchone() == (1,)
+
+
+def test_get_is_read_only(replica):
+    db = stockdice.readpool.get(replica)
+    with pytest.raises(sqlite3.OperationalError):
+        db.execute("INSERT INTO t VALUES (2);")
+
+
+def test_get_one_connection_per_thread(replica):
+    db = stockdice.readpool.get(replica)
+    other = []
+
+    def get_in_thread():
+        other.append(stockdice.readpool.get(replica))
+        stockdice.readpool.close()
+
+    thread = threading.Thread(target=get_in_thread)
+    thread.start()
+    thread.join()
+
+    assert other[0] is not db
+
+
+def test_get_recycles_replaced_replica(replica):
+    db = stockdice.readpool.get(replica)
+    stat = os.stat(replica)
+
+    _create_replica(replica, 2)
+    os.utime(replica, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    new_db = stockdice.readpool.get(replica)
+    assert new_db is not db
+    assert new_db.execute("SELECT value FROM t;").fetchall() == [(2,)]
+    with pytest.raises(sqlite3.ProgrammingError):
+        db.execute("SELECT 1;")
+
+
+def _open_files(path) -> int:
+    fds = pathlib.Path("/proc/self/fd")
+    if not fds.exists():
+        pytest.skip("Requires /proc to list open files.")
+    count = 0
+    for fd in fds.iterdir():
+        try:
+            count += os.readlink(fd) == str(path)
+        except OSError:
+            # Closed while listing, such as the directory itself.
+            pass
+    return count
+
+
+def test_close_replica_closes_idle_threads(replica):
+    opened = threading.Event()
+    done = threading.Event()
+    other = []
+
+    def idle_thread():
+        other.append(stockdice.readpool.get(replica))
+        opened.set()
+        # Doesn't query again, like an idle web server thread.
+        done.wait()
+
+    thread = threading.Thread(target=idle_thread)
+    thread.start()
+    opened.wait()
+    assert _open_files(replica) == 1
+
+    stockdice.readpool.close_replica(replica)
+
+    assert _open_files(replica) == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        other[0].execute("SELECT 1;")
+    done.set()
+    thread.join()
+
+
+def test_close_replica_waits_for_queries(replica):
+    closed = threading.Event()
+
+    with stockdice.readpool.connection(replica) as db:
+        thread = threading.Thread(
+            target=lambda: (stockdice.readpool.close_replica(replica), closed.set())
+        )
+        thread.start()
+        # The query in progress isn't interrupted.
+        assert not closed.wait(0.1)
+        assert db.execute("SELECT value FROM t;").fetchall() == [(1,)]
+
+    thread.join()
+    assert closed.is_set()
+
+    # The next use reconnects.
+    with stockdice.readpool.connection(replica) as new_db:
+        assert new_db is not db
+        assert new_db.execute("SELECT value FROM t;").fetchall() == [(1,)]
@@ -0,0 +1,88 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import polars
+import pytest
+
+import stockdice.dice
+import stockdice.rollpool
+
+
+UNIVERSE = polars.DataFrame(
+    {
+        "symbol": ["AAPL", "MSFT", "PENNY", "LOSS"],
+        "companyName": ["Apple", "Microsoft", "Penny Stock", "Loss Maker"],
+        "marketCapUSD": [3.0e12, 1.0e12, 0.0, 1.0e9],
+        "netIncomeUSD": [1.0e11, None, 1.0e3, -5.0e8],
+    }
+).with_row_index("idx")
+
+
+def _snapshot(version=("test", 0, 0)):
+    return stockdice.dice.Snapshot.from_universe(version, UNIVERSE)
+
+
+def test_roll_pool_refills_in_background():
+    pool = stockdice.rollpool.RollPool(
+        _snapshot(), "marketCapUSD", block_size=100, low_water_mark=50, seed=0
+    )
+    try:
+        assert len(pool) == 200
+
+        idxs = [pool.pop() for _ in range(175)]
+        assert set(idxs) <= {0, 1, 3}
+
+        deadline = time.monotonic() + 5
+        while len(pool) < 50 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(pool) >= 50
+    finally:
+        pool.close()
+
+
+def test_roll_pool_samples_when_empty():
+    pool = stockdice.rollpool.RollPool(
+        _snapshot(), None, block_size=1, low_water_mark=0, seed=0
+    )
+    pool.close()
+    assert {pool.pop() for _ in range(10)} <= {0, 1, 2, 3}
+
+
+def test_get_pool_replaced_on_new_snapshot(monkeypatch):
+    snapshots = [_snapshot(("a", 1, 1))]
+    monkeypatch.setattr(
+        stockdice.dice, "current_snapshot", lambda replica_db_path=None: snapshots[-1]
+    )
+    monkeypatch.setattr(stockdice.rollpool, "_pools", {})
+
+    pool = stockdice.rollpool.get_pool("marketCapUSD")
+    assert stockdice.rollpool.get_pool("marketCapUSD") is pool
+    assert stockdice.rollpool.roll_one("marketCapUSD")["symbol"] in {
+        "AAPL",
+        "MSFT",
+        "LOSS",
+    }
+
+    snapshots.append(_snapshot(("a", 2, 1)))
+    new_pool = stockdice.rollpool.get_pool("marketCapUSD")
+    assert new_pool is not pool
+    assert new_pool.snapshot is snapshots[-1]
+    new_pool.close()
+
+
+def test_get_pool_unknown_weights():
+    with pytest.raises(ValueError, match="Unsupported weights"):
+        stockdice.rollpool.get_pool("dividendYield")
@@ -0,0 +1,274 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import datetime
+
+import httpx
+import pytest
+
+import stockdice.config
+import stockdice.db
+import stockdice.ratelimits
+import stockdice.scheduler
+import stockdice.trading_hours
+
+
+def _new_york(*args):
+    return datetime.datetime(*args, tzinfo=stockdice.trading_hours.NEW_YORK)
+
+
+@pytest.mark.parametrize(
+    ("now", "expected_phase", "expected_end"),
+    (
+        pytest.param(
+            _new_york(2025, 5, 13, 3, 59),
+            "closed",
+            _new_york(2025, 5, 13, 4, 0),
+            id="overnight",
+        ),
+        pytest.param(
+            _new_york(2025, 5, 13, 4, 0),
+            "pre_market",
+            _new_york(2025, 5, 13, 9, 30),
+            id="pre-market",
+        ),
+        pytest.param(
+            _new_york(2025, 5, 13, 9, 30),
+            "open",
+            _new_york(2025, 5, 13, 10, 30),
+            id="open",
+        ),
+        pytest.param(
+            _new_york(2025, 5, 13, 12, 0),
+            "midday",
+            _new_york(2025, 5, 13, 15, 0),
+            id="midday",
+        ),
+        pytest.param(
+            _new_york(2025, 5, 13, 15, 0),
+            "close",
+            _new_york(2025, 5, 13, 16, 0),
+            id="close",
+        ),
+        pytest.param(
+            _new_york(2025, 5, 13, 16, 1),
+            "closed",
+            _new_york(2025, 5, 14, 4, 0),
+            id="after-close",
+        ),
+        pytest.param(
+            _new_york(2025, 11, 28, 12, 30),
+            "close",
+            _new_york(2025, 11, 28, 13, 0),
+            id="early-close",
+        ),
+        pytest.param(
+            _new_york(2025, 5, 16, 17, 0),
+            "closed",
+            _new_york(2025, 5, 19, 4, 0),
+            id="weekend",
+        ),
+        pytest.param(
+            _new_york(2025, 5, 26, 12, 0),
+            "closed",
+            _new_york(2025, 5, 27, 4, 0),
+            id="holiday",
+        ),
+    ),
+)
+def test_phase(now, expected_phase, expected_end):
+    assert stockdice.scheduler.phase(now) == (expected_phase, expected_end)
+
+
+def test_target_staleness_covers_every_phase():
+    for dataset, targets in stockdice.scheduler.TARGET_STALENESS.items():
+        assert set(targets) == set(stockdice.scheduler.PHASES), dataset
+
+
+@pytest.mark.parametrize(
+    ("dataset", "now", "expected"),
+    (
+        pytest.param(
+            "quotes",
+            _new_york(2025, 5, 13, 9, 45),
+            stockdice.scheduler.Pass(
+                max_age=datetime.timedelta(seconds=108),
+                next_pass=_new_york(2025, 5, 13, 9, 45, 12),
+            ),
+            id="quotes-in-slices",
+        ),
+        pytest.param(
+            "quotes",
+            _new_york(2025, 5, 13, 8, 0),
+            stockdice.scheduler.Pass(
+                max_age=None, next_pass=_new_york(2025, 5, 13, 9, 30)
+            ),
+            id="quotes-before-open",
+        ),
+        pytest.param(
+            "income",
+            _new_york(2025, 5, 13, 15, 30),
+            stockdice.scheduler.Pass(
+                max_age=None, next_pass=_new_york(2025, 5, 13, 16, 0)
+            ),
+            id="statements-wait-for-close",
+        ),
+        pytest.param(
+            "company_profile",
+            _new_york(2025, 5, 13, 12, 0),
+            stockdice.scheduler.Pass(
+                max_age=datetime.timedelta(hours=21, minutes=36),
+                next_pass=_new_york(2025, 5, 13, 15, 0),
+            ),
+            id="until-phase-ends",
+        ),
+    ),
+)
+def test_plan(dataset, now, expected):
+    assert stockdice.scheduler.plan(dataset, now) == expected
+
+
+def test_refresh_symbol_list_only_when_stale(tmp_path, monkeypatch):
+    config = stockdice.config.Config({"FMP_API_KEY": "key-a"})
+    config.db_path = tmp_path / "stockdice.sqlite"
+    monkeypatch.setattr(stockdice.config, "_config", config)
+    stockdice.ratelimits.use_key_pool(
+        stockdice.ratelimits.KeyPool(
+            [stockdice.ratelimits.ApiKey("key-a", seconds_between_requests=0.0)]
+        )
+    )
+    stockdice.db.migrate(config.db)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(
+            200,
+            json=[
+                {
+                    "symbol": "AAPL",
+                    "companyName": "Apple Inc.",
+                    "tradingCurrency": "USD",
+                    "reportingCurrency": "USD",
+                }
+            ],
+        )
+
+    async def refresh_twice():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            for _ in range(2):
+                await stockdice.scheduler.refresh_symbol_list(
+                    max_age=datetime.timedelta(days=1), client=client
+                )
+
+    try:
+        asyncio.run(refresh_twice())
+    finally:
+        stockdice.ratelimits.use_key_pool(None)
+        config.db.close()
+
+    assert len(requests) == 1
+
+
+def test_run_refreshes_each_dataset(monkeypatch):
+    stockdice.ratelimits.use_key_pool(
+        stockdice.ratelimits.KeyPool(
+            [stockdice.ratelimits.ApiKey("key-a", seconds_between_requests=0.0)]
+        )
+    )
+    now = _new_york(2025, 5, 13, 12, 0)
+    monkeypatch.setattr(
+        stockdice.scheduler,
+        "plan",
+        lambda dataset, _: stockdice.scheduler.Pass(
+            max_age=datetime.timedelta(minutes=1), next_pass=now
+        ),
+    )
+    monkeypatch.setattr(stockdice.scheduler, "MIN_SLEEP_SECONDS", 0.01)
+    calls = []
+
+    def refresher(dataset):
+        async def refresh(*, max_age, client, shard):
+            slots = stockdice.ratelimits.request_slots.get()
+            calls.append((dataset, max_age, slots is not None))
+
+        return refresh
+
+    async def run():
+        jobs = {
+            dataset: refresher(dataset)
+            for dataset in ("symbol_list", "quotes", "income")
+        }
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(
+                stockdice.scheduler.run(client=None, jobs=jobs), timeout=0.05
+            )
+
+    try:
+        asyncio.run(run())
+    finally:
+        stockdice.ratelimits.use_key_pool(None)
+
+    # The symbol list is refreshed before anything else.
+    assert calls[0] == ("symbol_list", datetime.timedelta(minutes=1), False)
+    # Each dataset keeps refreshing, and only background datasets are limited.
+    assert set(calls) == {
+        ("symbol_list", datetime.timedelta(minutes=1), False),
+        ("quotes", datetime.timedelta(minutes=1), False),
+        ("income", datetime.timedelta(minutes=1), True),
+    }
+    assert sum(call[0] == "quotes" for call in calls) > 1
+
+
+def test_run_continues_when_symbol_list_fails(monkeypatch):
+    stockdice.ratelimits.use_key_pool(
+        stockdice.ratelimits.KeyPool(
+            [stockdice.ratelimits.ApiKey("key-a", seconds_between_requests=0.0)]
+        )
+    )
+    now = _new_york(2025, 5, 13, 12, 0)
+    monkeypatch.setattr(
+        stockdice.scheduler,
+        "plan",
+        lambda dataset, _: stockdice.scheduler.Pass(
+            max_age=datetime.timedelta(minutes=1), next_pass=now
+        ),
+    )
+    monkeypatch.setattr(stockdice.scheduler, "MIN_SLEEP_SECONDS", 0.01)
+    calls = []
+
+    async def refresh_symbol_list(*, max_age, client, shard):
+        calls.append("symbol_list")
+        raise httpx.ConnectError("unable to connect")
+
+    async def refresh_quotes(*, max_age, client, shard):
+        calls.append("quotes")
+
+    async def run():
+        jobs = {"symbol_list": refresh_symbol_list, "quotes": refresh_quotes}
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(
+                stockdice.scheduler.run(client=None, jobs=jobs), timeout=0.05
+            )
+
+    try:
+        asyncio.run(run())
+    finally:
+        stockdice.ratelimits.use_key_pool(None)
+
+    # The symbol list keeps retrying, and the other datasets still refresh.
+    assert calls[0] == "symbol_list"
+    assert calls.count("symbol_list") > 1
+    assert calls.count("quotes") > 1
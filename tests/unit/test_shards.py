@@ -0,0 +1,154 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+
+import pytest
+
+import stockdice.db
+import stockdice.negative_cache
+import stockdice.ratebudget
+import stockdice.shards
+
+
+def _create_db(path):
+    db = sqlite3.connect(path)
+    stockdice.db.create_all_tables(db, reset=False)
+    db.commit()
+    return db
+
+
+def _insert_income(db, symbol, fiscal_year, revenue, last_updated_us, period="FY"):
+    db.execute(
+        """
+        INSERT INTO income (symbol, fiscalYear, period, revenue, last_updated_us)
+        VALUES (?, ?, ?, ?, ?);
+        """,
+        (symbol, fiscal_year, period, revenue, last_updated_us),
+    )
+    db.commit()
+
+
+def _income(db):
+    return db.execute(
+        """
+        SELECT symbol, fiscalYear, revenue, last_updated_us
+        FROM income
+        ORDER BY symbol, fiscalYear;
+        """
+    ).fetchall()
+
+
+def test_shards_partition_symbols():
+    symbols = [f"S{i:04d}" for i in range(1000)]
+    shards = [stockdice.shards.Shard(index, 4) for index in range(4)]
+
+    for symbol in symbols:
+        assert sum(shard.contains(symbol) for shard in shards) == 1
+    for shard in shards:
+        # Roughly balanced.
+        assert 200 < sum(shard.contains(symbol) for symbol in symbols) < 300
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    (
+        pytest.param("0/1", stockdice.shards.Shard(0, 1), id="single"),
+        pytest.param("3/4", stockdice.shards.Shard(3, 4), id="last"),
+    ),
+)
+def test_parse_shard(value, expected):
+    assert stockdice.shards.parse_shard(value) == expected
+
+
+@pytest.mark.parametrize("value", ("4/4", "-1/4", "1/0", "1", "a/b"))
+def test_parse_shard_invalid(value):
+    with pytest.raises(ValueError):
+        stockdice.shards.parse_shard(value)
+
+
+def test_merge(tmp_path):
+    main_db = _create_db(tmp_path / "main.sqlite")
+    shard_db = _create_db(tmp_path / "shard.sqlite")
+
+    _insert_income(main_db, "AAPL", 2024, 100, last_updated_us=10)
+    _insert_income(main_db, "MSFT", 2024, 300, last_updated_us=30)
+    _insert_income(main_db, "SPY", None, None, last_updated_us=10, period=None)
+    # Newer than the main database.
+    _insert_income(shard_db, "AAPL", 2024, 200, last_updated_us=20)
+    _insert_income(shard_db, "GOOG", 2024, 400, last_updated_us=20)
+    _insert_income(shard_db, "SPY", None, None, last_updated_us=20, period=None)
+    # Older than the main database.
+    _insert_income(shard_db, "MSFT", 2024, 250, last_updated_us=20)
+
+    assert stockdice.shards.merge(tmp_path / "main.sqlite", tmp_path / "shard.sqlite")
+    expected = [
+        ("AAPL", 2024, 200, 20),
+        ("GOOG", 2024, 400, 20),
+        ("MSFT", 2024, 300, 30),
+        ("SPY", None, None, 20),
+    ]
+    assert _income(main_db) == expected
+    assert main_db.execute(
+        "SELECT symbol, revenue FROM latest_fy_income ORDER BY symbol;"
+    ).fetchall() == [("AAPL", 200), ("GOOG", 400), ("MSFT", 300)]
+
+    # Nothing is newer, so merging again doesn't write anything.
+    assert (
+        stockdice.shards.merge(tmp_path / "main.sqlite", tmp_path / "shard.sqlite") == 0
+    )
+    assert _income(main_db) == expected
+
+
+def test_merge_negative_cache(tmp_path):
+    main_db = _create_db(tmp_path / "main.sqlite")
+    shard_db = _create_db(tmp_path / "shard.sqlite")
+
+    stockdice.negative_cache.record_miss(main_db, "income", symbol="AAPL", now_us=10)
+    main_db.commit()
+    # The shard found data for a symbol the main database recorded as missing.
+    _insert_income(shard_db, "AAPL", 2024, 200, last_updated_us=20)
+    stockdice.negative_cache.record_miss(shard_db, "income", symbol="DEAD", now_us=20)
+    shard_db.commit()
+
+    stockdice.shards.merge(tmp_path / "main.sqlite", tmp_path / "shard.sqlite")
+
+    assert _income(main_db) == [("AAPL", 2024, 200, 20)]
+    assert main_db.execute("SELECT symbol FROM income_missing;").fetchall() == [
+        ("DEAD",)
+    ]
+
+
+def test_merge_missing_shard(tmp_path):
+    _create_db(tmp_path / "main.sqlite")
+    assert (
+        stockdice.shards.merge(tmp_path / "main.sqlite", tmp_path / "missing.sqlite")
+        == 0
+    )
+
+
+def test_shared_token_bucket(tmp_path):
+    path = tmp_path / "rate_budget.sqlite"
+    # Two processes drawing from the same budget.
+    first = stockdice.ratebudget.SharedTokenBucket(path, requests_per_minute=60)
+    second = stockdice.ratebudget.SharedTokenBucket(path, requests_per_minute=60)
+
+    assert first.try_acquire() == 0
+    assert 0.9 < second.try_acquire() <= 1.0
+
+    second.pause(30)
+    assert 29.9 < first.try_acquire() <= 31.0
+
+    first.close()
+    second.close()
@@ -0,0 +1,154 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import flask.testing
+import polars
+import polars.testing
+import pytest
+
+import stockdice.dice
+import stockdice.simulate
+
+
+UNIVERSE = polars.DataFrame(
+    {
+        "symbol": ["AAPL", "MSFT", "XOM", "JNJ", "PENNY"],
+        "companyName": ["Apple", "Microsoft", "Exxon", "J&J", "Penny Stock"],
+        "sector": ["Technology", "Technology", "Energy", "Healthcare", None],
+        "marketCapUSD": [3.0e12, 3.0e12, 0.5e12, 0.5e12, 1.0],
+    }
+).with_row_index("idx")
+
+
+@pytest.fixture()
+def snapshot(monkeypatch):
+    snapshot = stockdice.dice.Snapshot.from_universe(("test", 0, 0), UNIVERSE)
+    monkeypatch.setattr(
+        stockdice.dice, "current_snapshot", lambda replica_db_path=None: snapshot
+    )
+    monkeypatch.setattr(
+        stockdice.simulate, "_summaries", type(stockdice.simulate._summaries)()
+    )
+    return snapshot
+
+
+def test_simulate_runs_single_stock():
+    universe = UNIVERSE.with_columns(
+        marketCapUSD=polars.Series([1.0, 0.0, 0.0, 0.0, 0.0])
+    )
+    snapshot = stockdice.dice.Snapshot.from_universe(("test", 0, 0), universe)
+
+    got = stockdice.simulate.simulate_runs(
+        snapshot, weights="marketCapUSD", k=5, runs=3
+    )
+
+    # Every roll is the only stock in the index, so the portfolio is the index.
+    assert got.to_dict(as_series=False) == {
+        "hhi": [1.0] * 3,
+        "effective_holdings": [1.0] * 3,
+        "sector_overlap": [1.0] * 3,
+        "active_share": [0.0] * 3,
+    }
+
+
+@pytest.mark.parametrize(
+    "weights",
+    (
+        pytest.param(None, id="uniform"),
+        pytest.param("marketCapUSD", id="market-cap"),
+    ),
+)
+def test_simulate_runs_bounds(snapshot, weights):
+    got = stockdice.simulate.simulate_runs(snapshot, weights=weights, k=4, runs=500)
+
+    assert got.height == 500
+    assert got["hhi"].min() >= 1 / 4
+    assert got["hhi"].max() <= 1
+    assert got["sector_overlap"].min() >= 0
+    assert got["sector_overlap"].max() <= 1 + 1e-9
+    assert got["active_share"].min() >= 0
+    assert got["active_share"].max() <= 1 + 1e-9
+
+
+def test_simulate_runs_more_rolls_tracks_index_better(snapshot):
+    few = stockdice.simulate.simulate_runs(
+        snapshot, weights="marketCapUSD", k=2, runs=2_000
+    )
+    many = stockdice.simulate.simulate_runs(
+        snapshot, weights="marketCapUSD", k=50, runs=2_000
+    )
+    assert many["active_share"].mean() < few["active_share"].mean()
+    assert many["sector_overlap"].mean() > few["sector_overlap"].mean()
+
+
+def test_simulate_runs_same_with_process_pool(snapshot, monkeypatch):
+    monkeypatch.setattr(stockdice.simulate, "CHUNK_ROLLS", 100)
+
+    serial = stockdice.simulate.simulate_runs(
+        snapshot, weights="marketCapUSD", k=10, runs=50, seed=7, processes=1
+    )
+    pooled = stockdice.simulate.simulate_runs(
+        snapshot, weights="marketCapUSD", k=10, runs=50, seed=7, processes=2
+    )
+    polars.testing.assert_frame_equal(serial, pooled)
+
+
+def test_simulate_cached(snapshot, monkeypatch):
+    first = stockdice.simulate.simulate(weights=None, k=3, runs=10)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("expected a cached result")
+
+    monkeypatch.setattr(stockdice.simulate, "simulate_runs", fail)
+    assert stockdice.simulate.simulate(weights=None, k=3, runs=10) is first
+    assert first["metric"].to_list() == list(stockdice.simulate.METRICS)
+
+
+def test_api_simulate(snapshot, client: flask.testing.FlaskClient):
+    response = client.get("/api/v1/simulate?weights=marketCapUSD&k=5&runs=100")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["k"] == 5
+    assert [row["metric"] for row in body["metrics"]] == list(
+        stockdice.simulate.METRICS
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    (
+        pytest.param("weights=dividendYield", id="unknown-weights"),
+        pytest.param("k=ten", id="not-integer"),
+        pytest.param("k=0", id="not-positive"),
+        pytest.param("k=1000&runs=1000000", id="too-large"),
+    ),
+)
+def test_api_simulate_bad_request(snapshot, client, query):
+    response = client.get(f"/api/v1/simulate?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_api_simulate_etag(snapshot, client):
+    response = client.get("/api/v1/simulate?k=5&runs=10")
+    etag, _ = response.get_etag()
+    assert etag
+
+    cached = client.get(
+        "/api/v1/simulate?k=5&runs=10", headers={"If-None-Match": f'"{etag}"'}
+    )
+    assert cached.status_code == 304
+
+    other = client.get("/api/v1/simulate?k=6&runs=10")
+    assert other.get_etag()[0] != etag
@@ -0,0 +1,97 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import polars
+import polars.testing
+import pytest
+
+import stockdice.dice
+import stockdice.snapshot_cache
+
+
+UNIVERSE = polars.DataFrame(
+    {
+        "symbol": ["AAPL", "MSFT"],
+        "companyName": ["Apple", "Microsoft"],
+        "marketCapUSD": [3.0e12, 1.0e12],
+    }
+).with_row_index("idx")
+
+
+def test_read_write(tmp_path):
+    version = ("replica.sqlite", 1, 2)
+    assert stockdice.snapshot_cache.read(tmp_path, version) is None
+
+    stockdice.snapshot_cache.write(tmp_path, version, UNIVERSE)
+
+    polars.testing.assert_frame_equal(
+        stockdice.snapshot_cache.read(tmp_path, version), UNIVERSE
+    )
+    assert stockdice.snapshot_cache.read(tmp_path, ("replica.sqlite", 1, 3)) is None
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_write_removes_temporary_file_on_error(tmp_path, monkeypatch):
+    def write_ipc(self, file):
+        file.write(b"partial")
+        raise polars.exceptions.ComputeError("unable to write")
+
+    monkeypatch.setattr(polars.DataFrame, "write_ipc", write_ipc)
+
+    with pytest.raises(polars.exceptions.ComputeError):
+        stockdice.snapshot_cache.write(tmp_path, ("replica.sqlite", 1, 2), UNIVERSE)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_keeps_newest_files(tmp_path):
+    for mtime in range(stockdice.snapshot_cache.MAX_FILES + 2):
+        version = ("replica.sqlite", mtime, 0)
+        stockdice.snapshot_cache.write(tmp_path, version, UNIVERSE)
+        path = stockdice.snapshot_cache.cache_path(tmp_path, version)
+        os.utime(path, ns=(mtime * 1_000_000_000, mtime * 1_000_000_000))
+
+    # Pruning happens on the next write.
+    stockdice.snapshot_cache.write(tmp_path, ("replica.sqlite", 99, 0), UNIVERSE)
+    assert len(list(tmp_path.glob("*.arrow"))) == stockdice.snapshot_cache.MAX_FILES
+
+
+def test_load_snapshot_skips_sql_when_cached(tmp_path, monkeypatch):
+    replica = tmp_path / "replica.sqlite"
+    replica.write_bytes(b"not really a database")
+    cache_dir = tmp_path / "cache"
+
+    calls = []
+
+    def load_dfs(replica_db_path):
+        calls.append(replica_db_path)
+        return None
+
+    monkeypatch.setattr(stockdice.dice, "_load_dfs", load_dfs)
+    monkeypatch.setattr(stockdice.dice, "_universe", lambda dfs: UNIVERSE)
+
+    first = stockdice.dice.load_snapshot(replica, cache_dir=cache_dir)
+    second = stockdice.dice.load_snapshot(replica, cache_dir=cache_dir)
+
+    assert calls == [replica]
+    assert first.version == second.version
+    polars.testing.assert_frame_equal(second.universe, UNIVERSE)
+    assert second.cdfs["marketCapUSD"] == pytest.approx([0.75, 1.0])
+
+    # A changed replica isn't served from the cache.
+    replica.write_bytes(b"a different database")
+    stockdice.dice.load_snapshot(replica, cache_dir=cache_dir)
+    assert calls == [replica, replica]
@@ -0,0 +1,165 @@
+# Copyright 2025 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+
+import pytest
+
+import stockdice.db
+import stockdice.stocklist
+
+
+NOW_US = 1_750_000_000_000_000
+
+
+@pytest.fixture()
+def db():
+    db = sqlite3.connect(":memory:")
+    stockdice.db.create_all_tables(db, reset=False)
+    yield db
+    db.close()
+
+
+def _item(symbol, name=None, currency="USD"):
+    return {
+        "symbol": symbol,
+        "companyName": name or symbol,
+        "tradingCurrency": currency,
+        "reportingCurrency": currency,
+    }
+
+
+def _symbols(db):
+    return db.execute(
+        """
+        SELECT symbol, company_name, reporting_currency, last_updated_us
+        FROM symbol
+        ORDER BY symbol;
+        """
+    ).fetchall()
+
+
+def _events(db):
+    return db.execute(
+        "SELECT symbol, event, company_name, event_us FROM symbol_event ORDER BY symbol;"
+    ).fetchall()
+
+
+def test_update_symbol_list_initial_load_has_no_events(db):
+    changes = stockdice.stocklist.update_symbol_list(
+        db, [_item("AAPL"), _item("MSFT")], now_us=NOW_US
+    )
+    assert changes == (["AAPL", "MSFT"], [], [])
+    assert _symbols(db) == [
+        ("AAPL", "AAPL", "USD", NOW_US),
+        ("MSFT", "MSFT", "USD", NOW_US),
+    ]
+    assert _events(db) == []
+
+
+def test_update_symbol_list_writes_only_changes(db):
+    stockdice.stocklist.update_symbol_list(
+        db, [_item("AAPL"), _item("MSFT"), _item("IBM")], now_us=NOW_US
+    )
+
+    changes = stockdice.stocklist.update_symbol_list(
+        db,
+        [
+            _item("AAPL"),
+            _item("MSFT", "Microsoft"),
+            _item("SAP.DE", "SAP", currency="EUR"),
+        ],
+        now_us=NOW_US + 1,
+        # With so few symbols, any delisting is a large fraction.
+        max_delisted_fraction=1.0,
+    )
+
+    assert changes == (["SAP.DE"], ["MSFT"], ["IBM"])
+    assert _symbols(db) == [
+        # Unchanged rows keep their timestamp.
+        ("AAPL", "AAPL", "USD", NOW_US),
+        ("MSFT", "Microsoft", "USD", NOW_US + 1),
+        ("SAP.DE", "SAP", "EUR", NOW_US + 1),
+    ]
+    assert _events(db) == [
+        ("IBM", "delisted", "IBM", NOW_US + 1),
+        ("SAP.DE", "listed", "SAP", NOW_US + 1),
+    ]
+
+
+def test_update_symbol_list_unchanged_writes_no_rows(db):
+    symbols = [_item("AAPL"), _item("MSFT")]
+    stockdice.stocklist.update_symbol_list(db, symbols, now_us=NOW_US)
+    changes_before = db.total_changes
+
+    changes = stockdice.stocklist.update_symbol_list(db, symbols, now_us=NOW_US + 1)
+
+    assert changes == ([], [], [])
+    # Only the download itself is recorded.
+    assert db.total_changes - changes_before == 1
+    assert stockdice.stocklist.last_updated_us(db) == NOW_US + 1
+
+
+def test_update_symbol_list_keeps_reporting_currency(db):
+    item = _item("BABA")
+    item["reportingCurrency"] = "CNY"
+    stockdice.stocklist.update_symbol_list(db, [item], now_us=NOW_US)
+    item["companyName"] = "Alibaba"
+    stockdice.stocklist.update_symbol_list(db, [item], now_us=NOW_US + 1)
+    assert _symbols(db) == [("BABA", "Alibaba", "CNY", NOW_US + 1)]
+
+
+@pytest.mark.parametrize(
+    "symbols",
+    (
+        pytest.param([], id="empty"),
+        pytest.param([_item("S0")], id="mostly-missing"),
+    ),
+)
+def test_update_symbol_list_refuses_mass_delisting(db, symbols):
+    stockdice.stocklist.update_symbol_list(
+        db, [_item(f"S{i}") for i in range(20)], now_us=NOW_US
+    )
+
+    with pytest.raises(ValueError, match="Refusing to delist"):
+        stockdice.stocklist.update_symbol_list(db, symbols, now_us=NOW_US + 1)
+
+    assert len(_symbols(db)) == 20
+    assert _events(db) == []
+    assert stockdice.stocklist.last_updated_us(db) == NOW_US
+
+
+def test_update_symbol_list_allows_mass_delisting(db):
+    stockdice.stocklist.update_symbol_list(
+        db, [_item(f"S{i}") for i in range(20)], now_us=NOW_US
+    )
+
+    changes = stockdice.stocklist.update_symbol_list(
+        db, [_item("S0")], now_us=NOW_US + 1, max_delisted_fraction=1.0
+    )
+
+    assert len(changes.delisted) == 19
+    assert _symbols(db) == [("S0", "S0", "USD", NOW_US)]
+
+
+def test_last_updated_us_falls_back_to_symbol_table(db):
+    assert stockdice.stocklist.last_updated_us(db) is None
+    db.execute(
+        """
+        INSERT INTO symbol (symbol, company_name, trading_currency, last_updated_us)
+        VALUES ('AAPL', 'Apple', 'USD', :now_us);
+        """,
+        {"now_us": NOW_US},
+    )
+    assert stockdice.stocklist.last_updated_us(db) == NOW_US
@@ -126,3 +126,104 @@ def test_seconds_to_next_new_york_trading_hours(fake_now, expected):
         assert (
             stockdice.trading_hours.seconds_to_next_new_york_trading_hours() == expected
         )
+
+
+def _new_york(*args):
+    return datetime.datetime(*args, tzinfo=stockdice.trading_hours.NEW_YORK)
+
+
+@pytest.mark.parametrize(
+    ("now", "expected"),
+    (
+        pytest.param(_new_york(2025, 4, 18, 12, 0), False, id="good-friday"),
+        pytest.param(_new_york(2025, 1, 9, 12, 0), False, id="special-closure"),
+        pytest.param(_new_york(2026, 7, 3, 12, 0), False, id="observed-on-friday"),
+        pytest.param(_new_york(2027, 7, 5, 12, 0), False, id="observed-on-monday"),
+        pytest.param(
+            _new_york(2021, 12, 31, 12, 0),
+            True,
+            id="new-years-on-saturday-not-observed",
+        ),
+        pytest.param(_new_york(2021, 6, 18, 12, 0), True, id="before-juneteenth"),
+        pytest.param(_new_york(2027, 6, 18, 12, 0), False, id="juneteenth-observed"),
+        pytest.param(_new_york(2025, 11, 28, 12, 59), True, id="early-close-open"),
+        pytest.param(_new_york(2025, 11, 28, 13, 1), False, id="early-close-closed"),
+        pytest.param(_new_york(2025, 12, 24, 13, 1), False, id="christmas-eve"),
+        pytest.param(_new_york(2025, 7, 3, 13, 1), False, id="before-independence-day"),
+        pytest.param(_new_york(2025, 12, 26, 15, 59), True, id="after-christmas"),
+        pytest.param(
+            datetime.datetime(2025, 3, 10, 13, 31, tzinfo=datetime.timezone.utc),
+            True,
+            id="utc-after-spring-forward",
+        ),
+        pytest.param(
+            datetime.datetime(2025, 11, 3, 14, 15, tzinfo=datetime.timezone.utc),
+            False,
+            id="utc-after-fall-back",
+        ),
+    ),
+)
+def test_holidays_and_early_closes(now, expected):
+    assert stockdice.trading_hours.is_new_york_regular_trading_hours(now) == expected
+
+
+@pytest.mark.parametrize(
+    ("year", "expected"),
+    (
+        pytest.param(2024, 252, id="2024"),
+        pytest.param(2025, 250, id="2025"),
+        pytest.param(2026, 251, id="2026"),
+    ),
+)
+def test_sessions_per_year(year, expected):
+    assert len(stockdice.trading_hours._sessions(year)) == expected
+
+
+@pytest.mark.parametrize(
+    ("now", "next_open"),
+    (
+        pytest.param(
+            _new_york(2025, 3, 7, 22, 2),
+            _new_york(2025, 3, 10, 9, 30),
+            id="spring-forward-weekend",
+        ),
+        pytest.param(
+            _new_york(2025, 10, 31, 22, 2),
+            _new_york(2025, 11, 3, 9, 30),
+            id="fall-back-weekend",
+        ),
+        pytest.param(
+            _new_york(2025, 1, 17, 16, 1),
+            _new_york(2025, 1, 21, 9, 30),
+            id="long-weekend",
+        ),
+        pytest.param(
+            _new_york(2025, 11, 28, 13, 1),
+            _new_york(2025, 12, 1, 9, 30),
+            id="after-early-close",
+        ),
+        pytest.param(
+            _new_york(2025, 12, 31, 16, 1),
+            _new_york(2026, 1, 2, 9, 30),
+            id="new-year",
+        ),
+    ),
+)
+def test_seconds_to_next_session(now, next_open):
+    utc = datetime.timezone.utc
+    expected = (next_open.astimezone(utc) - now.astimezone(utc)).total_seconds()
+    assert (
+        stockdice.trading_hours.seconds_to_next_new_york_trading_hours(now) == expected
+    )
+    assert stockdice.trading_hours.next_session(now).open == next_open
+
+
+def test_seconds_to_next_session_spring_forward_is_an_hour_shorter():
+    # 2 days, 11 hours, and 28 minutes on the clock, but one of those hours is
+    # skipped.
+    assert (
+        stockdice.trading_hours.seconds_to_next_new_york_trading_hours(
+            _new_york(2025, 3, 7, 22, 2)
+        )
+        == ((2 * 24 + 10) * 60 + 28) * 60.0
+    )